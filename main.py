@@ -1,3 +1,6 @@
+import multiprocessing
 from src.core.main import run
 
-run() if __name__ == "__main__"else 0
\ No newline at end of file
+if __name__ == "__main__":
+    multiprocessing.freeze_support() ## Worker processes in a frozen (PyInstaller) build must not start the app again
+    run()
@@ -10,6 +10,8 @@ import configparser
 import os
 import sys
 
+from src.lib.CalibrationCache import clearCalibrations
+
 # Constants
 defaultIniFile = os.path.relpath("settings.ini")
 
@@ -35,7 +37,8 @@ defaultValues = {
     'criteriaType': 'AIC Criteria',
     'stepwiseRegression': False,
     'conditionalSelection': 'Stochastic',
-    'months': [0] * 12
+    'months': [0] * 12,
+    'calibrationCache': False
 }
 
 # Global Variables
@@ -60,6 +63,7 @@ criteriaType = defaultValues['criteriaType']
 stepwiseRegression = defaultValues['stepwiseRegression']
 conditionalSelection = defaultValues['conditionalSelection']
 months = defaultValues['months'][:]
+calibrationCache = defaultValues['calibrationCache']
 
 
 class ContentWidget(QWidget):
@@ -165,6 +169,18 @@ class ContentWidget(QWidget):
 
         mainLayout.addWidget(optimGroupBox)
 
+        # Calibration cache (results stored under the user's home directory, off by default)
+        cacheGroupBox = QGroupBox("Calibration Cache")
+        cacheGroupBox.setStyleSheet("color: black;")
+        cacheLayout = QHBoxLayout()
+        cacheGroupBox.setLayout(cacheLayout)
+        self.calibrationCacheCheck = QCheckBox("Reuse results of identical calibrations")
+        self.clearCacheBtn = QPushButton("Clear Cache")
+        self.clearCacheBtn.clicked.connect(self.clearCache)
+        cacheLayout.addWidget(self.calibrationCacheCheck)
+        cacheLayout.addWidget(self.clearCacheBtn)
+        mainLayout.addWidget(cacheGroupBox)
+
         # Wet Day Percentage (months)
         wetDayGroupBox = QGroupBox("Wet Day Percentage Profile")
         wetDayGroupBox.setStyleSheet("color: black;")
@@ -249,7 +265,7 @@ class ContentWidget(QWidget):
     def resetSettings(self):
         global varianceInflation, biasCorrection, fixedThreshold
         global modelTransformation, optimizationAlgorithm, criteriaType
-        global stepwiseRegression, conditionalSelection, months
+        global stepwiseRegression, conditionalSelection, months, calibrationCache
 
         varianceInflation = defaultValues['varianceInflation']
         biasCorrection = defaultValues['biasCorrection']
@@ -260,6 +276,7 @@ class ContentWidget(QWidget):
         stepwiseRegression = defaultValues['stepwiseRegression']
         conditionalSelection = defaultValues['conditionalSelection']
         months = defaultValues['months'][:]
+        calibrationCache = defaultValues['calibrationCache']
 
         self.loadSettingsIntoUi()
 
@@ -287,13 +304,14 @@ class ContentWidget(QWidget):
             conditionalSelection == 'Fixed Threshold'
         )
         self.stepwiseRegressionCheck.setChecked(stepwiseRegression)
+        self.calibrationCacheCheck.setChecked(calibrationCache)
         for i, edit in enumerate(self.wetDayEdits):
             edit.setText(str(months[i]))
 
     def loadSettings(self, iniFile=defaultIniFile):
         global varianceInflation, biasCorrection, fixedThreshold
         global modelTransformation, optimizationAlgorithm, criteriaType
-        global stepwiseRegression, conditionalSelection, months, colourMode
+        global stepwiseRegression, conditionalSelection, months, colourMode, calibrationCache
 
         if not os.path.exists(iniFile):
             return
@@ -337,6 +355,10 @@ class ContentWidget(QWidget):
                 fallback=','.join(map(str, defaultValues['months']))
             ).split(',')
         ]
+        calibrationCache = cfg.getboolean(
+            'Settings', 'CalibrationCache',
+            fallback=defaultValues['calibrationCache']
+        )
         colourMode = cfg.get('Settings', 'ColourMode', fallback=defaultValues['colourMode'])
         self.changeColourMode(colourMode)
 
@@ -362,7 +384,7 @@ class ContentWidget(QWidget):
     def saveSettings(self, iniFile=None, silent=False):
         global varianceInflation, biasCorrection, fixedThreshold
         global modelTransformation, optimizationAlgorithm, criteriaType
-        global stepwiseRegression, conditionalSelection, months
+        global stepwiseRegression, conditionalSelection, months, calibrationCache
 
         # determine target INI path
         if iniFile is None:
@@ -390,6 +412,7 @@ class ContentWidget(QWidget):
         cfg['Settings']['StepwiseRegression']     = str(stepwiseRegression)
         cfg['Settings']['ConditionalSelection']   = conditionalSelection
         cfg['Settings']['Months']                 = ','.join(map(str, months))
+        cfg['Settings']['CalibrationCache']       = str(calibrationCache)
 
         # write it all back
         try:
@@ -422,7 +445,7 @@ class ContentWidget(QWidget):
 
         global varianceInflation, biasCorrection, fixedThreshold
         global modelTransformation, optimizationAlgorithm, criteriaType
-        global stepwiseRegression, conditionalSelection, months
+        global stepwiseRegression, conditionalSelection, months, calibrationCache
 
         varianceInflation       = vi
         biasCorrection          = bc
@@ -433,6 +456,7 @@ class ContentWidget(QWidget):
         stepwiseRegression      = self.stepwiseRegressionCheck.isChecked()
         conditionalSelection    = self.get_conditional_selection()
         months                  = [int(e.text()) for e in self.wetDayEdits]
+        calibrationCache        = self.calibrationCacheCheck.isChecked()
 
         self.saveSettings(iniFile=defaultIniFile, silent=False)
 
@@ -447,7 +471,7 @@ class ContentWidget(QWidget):
     def _gatherUiValues(self):
         global varianceInflation, biasCorrection, fixedThreshold
         global modelTransformation, optimizationAlgorithm, criteriaType
-        global stepwiseRegression, conditionalSelection, months
+        global stepwiseRegression, conditionalSelection, months, calibrationCache
 
         varianceInflation       = int(float(self.varianceInflationEdit.text()))
         biasCorrection          = int(float(self.biasCorrectionEdit.text()))
@@ -458,6 +482,12 @@ class ContentWidget(QWidget):
         stepwiseRegression      = self.stepwiseRegressionCheck.isChecked()
         conditionalSelection    = self.get_conditional_selection()
         months                  = [int(e.text()) for e in self.wetDayEdits]
+        calibrationCache        = self.calibrationCacheCheck.isChecked()
+
+    def clearCache(self):
+        """Empty the calibration cache on “Clear Cache” button"""
+        clearCalibrations()
+        QMessageBox.information(self, "Info", "Calibration cache cleared")
 
     def safeGetInt(self, cfg, section, option, fallback):
         try:
@@ -1,6 +1,8 @@
 import numpy as np
 from datetime import date as realdate
 from src.lib.utils import loadFilesIntoMemory, increaseDate, thirtyDate, getSettings, fSDateOK, fEDateOK
+from src.lib.CalibrationCache import calibrationKey, loadCalibration, storeCalibration
+from src.lib.ParModel import ParModel, swapSEAndAR
 from copy import deepcopy
 import src.core.data_settings
 from PyQt5.QtWidgets import QApplication, QMainWindow, QTextEdit, QTabWidget, QWidget, QMessageBox
@@ -86,7 +88,7 @@ def reloadGlobals():
         debugMsg("[Error]: Invalid Stepwise Criteria choice. Using 'AIC' option")
         _globalSettings['aicWanted'] = True
         
-def calibrateModel(fileList, PARfilePath, fsDate, feDate, modelType=2, parmOpt=False, autoRegression=False, includeChow=False, detrendOption=0, doCrossValidation=False, crossValFolds=2):
+def calibrateModel(fileList, PARfilePath, fsDate, feDate, modelType=2, parmOpt=False, autoRegression=False, includeChow=False, detrendOption=0, doCrossValidation=False, crossValFolds=2, chowScan=False, useCache=None, cacheDir=None, keepData=False):
     """
         Core Calibrate Model Function (v0.7.1)
         fileList -> Array of predictor file paths. First entry should be the predictand file
@@ -100,11 +102,20 @@ def calibrateModel(fileList, PARfilePath, fsDate, feDate, modelType=2, parmOpt=F
         detrendOption -> Detrend Options: 0-> None, 1-> Linear, 2-> Power function.
         doCrossValidation -> Cross Validation Tickbox
         crossValFolds -> Number of folds for CrossValidation
+        chowScan -> Chow Breakpoint Scan Tickbox - evaluates the Chow statistic at every year boundary in the fit period
+        useCache -> Reuse the stored results / PAR content when the same inputs have been calibrated before (see CalibrationCache)
+            None (default) follows the CalibrationCache setting, which is off unless turned on in the settings
+        cacheDir -> Calibration cache location, defaults to the shared per-user cache
+        keepData -> Also return the loaded predictand / predictor files (output['predictorData']), in the order of
+            the predictors the model uses (output['Predictors'], fewer than fileList after stepwise regression)
+                    so the weather generator can run straight from the result (see WeatherGenerator.generateFromCalibration)
+        The calibrated model itself is always in output['parModel'], the same ParModel that is written to the PAR file
         ----------------------------------------
         CalibrateModel also reads the following from the Global Setings:
         > globalStartDate & globalEndDate -> "Standard" start / end date
         > thresh -> Event Threshold
         > globalMissingCode -> "Missing Data Identifier"
+        > calibrationcache -> Calibration cache on / off (when useCache is None)
         And also reads the following from the Advanced Settings:
         > modelTrans -> Model transformation: 1-> none, 2-> 4th root, 3-> Nat log (ln), 4-> Inverse Normal, 5-> box cox
         > applyStepwise -> Stepwise Tickbox
@@ -124,6 +135,8 @@ def calibrateModel(fileList, PARfilePath, fsDate, feDate, modelType=2, parmOpt=F
     applyStepwise = _globalSettings['stepwiseregression']
     ## Location Unknown:
     countLeapYear = _globalSettings['leapYear']
+    if useCache is None:
+        useCache = _globalSettings.get('calibrationcache', False) is True
     ## End of Settings Imports (Default Values for now)
 
     NPredictors = len(fileList) - 1
@@ -162,6 +175,21 @@ def calibrateModel(fileList, PARfilePath, fsDate, feDate, modelType=2, parmOpt=F
         #----- SECTION #1.1 ----- Initialisation?
         #------------------------
 
+        ## Identical inputs -> reuse the previous results instead of recalibrating
+        if useCache:
+            cacheKey = calibrationKey(fileList, fsDate, feDate, {
+                "modelType": modelType, "parmOpt": parmOpt, "autoRegression": autoRegression,
+                "includeChow": includeChow, "detrendOption": detrendOption, "doCrossValidation": doCrossValidation,
+                "crossValFolds": crossValFolds, "chowScan": chowScan}, _globalSettings)
+            cached = loadCalibration(cacheKey, cacheDir)
+            if cached is not None:
+                output, PARfileOutput = cached
+                with open(PARfilePath, "w") as f:
+                    print(PARfileOutput, file=f)
+                if keepData:
+                    output['predictorData'] = loadFilesIntoMemory([output['Predictand']] + list(output['Predictors']))
+                return output
+
 
         ## Other Vars:
         #progValue = 0 ## Progress Bar
@@ -191,6 +219,7 @@ def calibrateModel(fileList, PARfilePath, fsDate, feDate, modelType=2, parmOpt=F
         ## Reading in data from files?
         ## FileList is the selected files from 
         loadedFiles = loadFilesIntoMemory(fileList) 
+        allFiles = list(fileList) ## Stepwise regression rebinds fileList to the predictors it keeps
 
         ## Season Code thingy
         ## Move and calculate in the widget later
@@ -246,6 +275,8 @@ def calibrateModel(fileList, PARfilePath, fsDate, feDate, modelType=2, parmOpt=F
             dataReadIn = np.zeros((12, NPredictors + 1, ((noOfDays2Fit // 12) + 100)))
 
         sizeOfDataArray = np.zeros((12), dtype=int)
+        yearReadIn = np.zeros((dataReadIn.shape[0], dataReadIn.shape[2]), dtype=int) ## Year of each row in dataReadIn, for the Chow breakpoint scan
+        dayReadIn = np.zeros(yearReadIn.shape, dtype=np.int32) ## Position in the loaded files of each row in dataReadIn, for the residual diagnostics
 
         totalNumbers = 0
         missingRows = 0
@@ -298,6 +329,8 @@ def calibrateModel(fileList, PARfilePath, fsDate, feDate, modelType=2, parmOpt=F
         sectionSizes = np.zeros((12, 200), dtype=int) #sectionSizes = np.zeros((12, max(noOfSections)))
         for i in range(NPredictors + 1):
             dataReadIn[currentPeriod, i, sizeOfDataArray[currentPeriod]] = loadedFiles[i][searchPos - 1]#tempReadin(i)
+        yearReadIn[currentPeriod, sizeOfDataArray[currentPeriod]] = workingDate.year
+        dayReadIn[currentPeriod, sizeOfDataArray[currentPeriod]] = searchPos - 1
         sizeOfDataArray[currentPeriod] += 1
         
         if seasonCode != 1:
@@ -337,6 +370,8 @@ def calibrateModel(fileList, PARfilePath, fsDate, feDate, modelType=2, parmOpt=F
             else: 
                 for i in range(NPredictors + 1):
                     dataReadIn[currentPeriod, i, sizeOfDataArray[currentPeriod]] = loadedFiles[i][searchPos] #tempReadin(i)
+                yearReadIn[currentPeriod, sizeOfDataArray[currentPeriod]] = workingDate.year
+                dayReadIn[currentPeriod, sizeOfDataArray[currentPeriod]] = searchPos
                 sizeOfDataArray[currentPeriod] += 1
             ####################################
             ## Revisit - Should be unnecesary ##
@@ -381,11 +416,9 @@ def calibrateModel(fileList, PARfilePath, fsDate, feDate, modelType=2, parmOpt=F
             xMatrix = None
             yMatrix = None
             yMatrixAboveThreshPos = None
-            residualArray = {
-                "predicted": np.zeros((totalNumbers)),
-                "residual": np.zeros((totalNumbers)),
-                "noOfResiduals": 0
-            }
+            residualArray = ResidualDiagnostics(fileList, loadedFiles, dayReadIn, thresh, parmOpt, autoRegression) ## Residuals are only worked out if the scatter / histogram views ask for them
+            residualColumns = None ## Columns of the full X matrix the fits use, set by stepwise regression
+            chowScanResults = {"Unconditional": {}, "Conditional": {}} ## Keyed by periodWorkingOn
             #------------------------
             #---- SECTION #3.1.0 ---- SeasonCode 1 -> Annuals
             #------------------------
@@ -414,9 +447,13 @@ def calibrateModel(fileList, PARfilePath, fsDate, feDate, modelType=2, parmOpt=F
                         xMatrix[i, 0] = 1 #loadedFiles[0]
                         for j in range(1, NPredictors + 1): #MODEL? ##+1 bc Range is not INCLUSIVE
                             xMatrix[i, j] = dataReadIn[0, j, i]
+                    rowYears = yearReadIn[0, :sizeOfDataArray[0]]
+                    rowIndex = np.arange(sizeOfDataArray[0])
                 else: ## Autoregression option
                     xMatrix = np.ndarray((sizeOfDataArray[0] - 1, NPredictors + 2))
                     yMatrix = np.ndarray((sizeOfDataArray[0] - 1))
+                    rowYears = yearReadIn[0, 1:sizeOfDataArray[0]]
+                    rowIndex = np.arange(1, sizeOfDataArray[0])
                     for i in range(sizeOfDataArray[0] - 1):
                         yMatrix[i] = dataReadIn[0, 0, i + 1]
                         xMatrix[i, 0] = 1
@@ -477,10 +514,14 @@ def calibrateModel(fileList, PARfilePath, fsDate, feDate, modelType=2, parmOpt=F
                     fileList = newFileList
                     NPredictors = stepAdjust['NPredictors']
                     xMatrix = stepAdjust['xMatrix']
+                    residualColumns = [0] + list(stepAdjust['newFileList'])
                 ##endif
                 
                 ##call CalculateParameters(parmOpt)
-                params = calculateParameters(xMatrix, yMatrix, NPredictors, includeChow, conditionalPart, parmOpt, not parmOpt, residualArray)   #betamatrix defined here
+                params = calculateParameters(xMatrix, yMatrix, NPredictors, includeChow, conditionalPart, parmOpt, not parmOpt, residualArray,
+                                             residualRows=(periodWorkingOn, rowIndex, residualColumns))   #betamatrix defined here
+                if chowScan:
+                    chowScanResults["Unconditional"][periodWorkingOn] = chowBreakpointScan(xMatrix, yMatrix, rowYears)
 
                 yMatrix = savedYMatrix
 
@@ -519,24 +560,11 @@ def calibrateModel(fileList, PARfilePath, fsDate, feDate, modelType=2, parmOpt=F
                     ##endif
 
                     #call PropogateConditional
-                    #propogateConditional(xMatrix, yMatrix, yMatrixAboveThreshPos, thresh, NPredictors) 
-                    
-                    ### propogateConditional Code ###
-
-                    rejectedIndex = []
-                    for i in range(len(yMatrix)):
-                        if yMatrix[i] <= thresh:
-                            ## NEW AND IMPROVED RESIZE CODE HERE:
-                            rejectedIndex.append(i)
-                        else:
-                            yMatrixAboveThreshPos[i] = i+1
-                        #End If
-                    #Next i
-                    xMatrix = np.delete(xMatrix, rejectedIndex, 0)
-                    yMatrix = np.delete(yMatrix, rejectedIndex)
-                    yMatrixAboveThreshPos = np.delete(yMatrixAboveThreshPos, rejectedIndex)
-
-                    ### End of propogateConditional Code ###
+                    pResults = propogateConditional(xMatrix, yMatrix, yMatrixAboveThreshPos, thresh, [rowYears, rowIndex])
+                    xMatrix = pResults['xMatrix']
+                    yMatrix = pResults['yMatrix']
+                    yMatrixAboveThreshPos = pResults['yMatrixAboveThreshPos']
+                    rowYears, rowIndex = pResults['extraArrays']
                     
                     if doCrossValidation:
                         #call xvalConditional
@@ -552,12 +580,12 @@ def calibrateModel(fileList, PARfilePath, fsDate, feDate, modelType=2, parmOpt=F
                                 xValidationOutput["Conditional"][months[i]] = xValResults
 
                     #call TransformData
-                    tResults = transformData(xMatrix, yMatrix, [yMatrixAboveThreshPos], modelTrans)
+                    tResults = transformData(xMatrix, yMatrix, [yMatrixAboveThreshPos, rowYears, rowIndex], modelTrans)
                     ##if errored then exit
                     if modelTrans != 1:
                         xMatrix = tResults['xMatrix']
                         yMatrix = tResults['yMatrix']
-                        yMatrixAboveThreshPos = tResults['extraArrays'][0]
+                        yMatrixAboveThreshPos, rowYears, rowIndex = tResults['extraArrays']
                         tResults = tResults['tResults'] 
                         #We don't need tResults to point to the other matricies 
                         # -> they have their own dedicated variables
@@ -578,7 +606,10 @@ def calibrateModel(fileList, PARfilePath, fsDate, feDate, modelType=2, parmOpt=F
                     ##Can we move the following above, to make it an elif?
                     conditionalPart = True
                     #call CalculateParameters(true)
-                    params = calculateParameters(xMatrix, yMatrix, NPredictors, includeChow, conditionalPart, parmOpt, True, residualArray, tResults) #betaMatrix defined here
+                    params = calculateParameters(xMatrix, yMatrix, NPredictors, includeChow, conditionalPart, parmOpt, True, residualArray, tResults,
+                                                 residualRows=(periodWorkingOn, rowIndex, residualColumns)) #betaMatrix defined here
+                    if chowScan:
+                        chowScanResults["Conditional"][periodWorkingOn] = chowBreakpointScan(xMatrix, yMatrix, rowYears)
 
                     if modelTrans == 4:
                         yDash = np.sum(np.matmul(xMatrix, params['betaMatrix']))
@@ -631,6 +662,8 @@ def calibrateModel(fileList, PARfilePath, fsDate, feDate, modelType=2, parmOpt=F
                             xMatrix[i, 0] = 1
                             for j in range(1, NPredictors + 1):
                                 xMatrix[i, j] = dataReadIn[periodWorkingOn, j, i]
+                        rowYears = yearReadIn[periodWorkingOn, :sizeOfDataArray[periodWorkingOn]]
+                        rowIndex = np.arange(sizeOfDataArray[periodWorkingOn])
                         ###### End of Sorta Copy ######
                     else: ## Autoregression option
                         NPredictors += 1
@@ -646,6 +679,8 @@ def calibrateModel(fileList, PARfilePath, fsDate, feDate, modelType=2, parmOpt=F
                         ##yMatrix resize
                         xMatrix = np.zeros((binsTotal, NPredictors + 1))
                         yMatrix = np.zeros((binsTotal))
+                        rowYears = np.zeros((binsTotal), dtype=int)
+                        rowIndex = np.zeros((binsTotal), dtype=int)
 
                         tempCounter = 0
                         progressThroughData = 0
@@ -653,6 +688,8 @@ def calibrateModel(fileList, PARfilePath, fsDate, feDate, modelType=2, parmOpt=F
                             if sectionSizes[periodWorkingOn, section] > 1:
                                 for i in range(sectionSizes[periodWorkingOn, section] - 1):
                                     yMatrix[tempCounter] = dataReadIn[periodWorkingOn, 0, i + progressThroughData + 1]
+                                    rowYears[tempCounter] = yearReadIn[periodWorkingOn, i + progressThroughData + 1]
+                                    rowIndex[tempCounter] = i + progressThroughData + 1
                                     xMatrix[tempCounter, 0] = 1
                                     for j in range(1, NPredictors):
                                         xMatrix[tempCounter, j] = dataReadIn[periodWorkingOn, j, i + progressThroughData + 1]
@@ -712,7 +749,10 @@ def calibrateModel(fileList, PARfilePath, fsDate, feDate, modelType=2, parmOpt=F
                     ###but is notably missing the ApplyStepwise condition for CalcualteParameters
 
                     ##call CalculateParameters(parmOpt) ##Adjust to make sure its correct...?
-                    params = calculateParameters(xMatrix, yMatrix, NPredictors, includeChow, conditionalPart, parmOpt, not parmOpt, residualArray)     #betaMatrix Defined Here
+                    params = calculateParameters(xMatrix, yMatrix, NPredictors, includeChow, conditionalPart, parmOpt, not parmOpt, residualArray,
+                                                 residualRows=(periodWorkingOn, rowIndex, residualColumns))     #betaMatrix Defined Here
+                    if chowScan:
+                        chowScanResults["Unconditional"][periodWorkingOn] = chowBreakpointScan(xMatrix, yMatrix, rowYears)
 
                     yMatrix = savedYMatrix
 
@@ -764,24 +804,11 @@ def calibrateModel(fileList, PARfilePath, fsDate, feDate, modelType=2, parmOpt=F
                         ##endif
 
                         #call PropogateConditional
-                        #propogateConditional(xMatrix, yMatrix, yMatrixAboveThreshPos, thresh, NPredictors) 
-
-                        ### propogateConditional Code ###
-
-                        rejectedIndex = []
-                        for i in range(len(yMatrix)):
-                            if yMatrix[i] <= thresh:
-                                ## NEW AND IMPROVED RESIZE CODE HERE:
-                                rejectedIndex.append(i)
-                            else:
-                                yMatrixAboveThreshPos[i] = i+1
-                            #End If
-                        #Next i
-                        xMatrix = np.delete(xMatrix, rejectedIndex, 0)
-                        yMatrix = np.delete(yMatrix, rejectedIndex)
-                        yMatrixAboveThreshPos = np.delete(yMatrixAboveThreshPos, rejectedIndex)
-
-                        ### End of propogateConditional Code ###
+                        pResults = propogateConditional(xMatrix, yMatrix, yMatrixAboveThreshPos, thresh, [rowYears, rowIndex])
+                        xMatrix = pResults['xMatrix']
+                        yMatrix = pResults['yMatrix']
+                        yMatrixAboveThreshPos = pResults['yMatrixAboveThreshPos']
+                        rowYears, rowIndex = pResults['extraArrays']
 
                         if doCrossValidation:
                             #call xValConditional
@@ -800,12 +827,12 @@ def calibrateModel(fileList, PARfilePath, fsDate, feDate, modelType=2, parmOpt=F
                                     xValidationOutput["Conditional"][months[periodWorkingOn]] = xValResults
                         
                         #call TransformData
-                        tResults = transformData(xMatrix, yMatrix, [yMatrixAboveThreshPos], modelTrans)
+                        tResults = transformData(xMatrix, yMatrix, [yMatrixAboveThreshPos, rowYears, rowIndex], modelTrans)
                         #if errored then exit
                         if modelTrans != 1:
                             xMatrix = tResults['xMatrix']
                             yMatrix = tResults['yMatrix']
-                            yMatrixAboveThreshPos = tResults['extraArrays'][0]
+                            yMatrixAboveThreshPos, rowYears, rowIndex = tResults['extraArrays']
                             tResults = tResults['tResults'] 
                             #We don't need tResults to point to the other matricies 
                             # -> they have their own dedicated variables
@@ -830,7 +857,10 @@ def calibrateModel(fileList, PARfilePath, fsDate, feDate, modelType=2, parmOpt=F
                         ##endif
                         conditionalPart = True
                         ##call CalculateParameters(true)
-                        params = calculateParameters(xMatrix, yMatrix, NPredictors, includeChow, conditionalPart, parmOpt, True, residualArray, tResults) #BetaMatrix defined here
+                        params = calculateParameters(xMatrix, yMatrix, NPredictors, includeChow, conditionalPart, parmOpt, True, residualArray, tResults,
+                                                     residualRows=(periodWorkingOn, rowIndex, residualColumns)) #BetaMatrix defined here
+                        if chowScan:
+                            chowScanResults["Conditional"][periodWorkingOn] = chowBreakpointScan(xMatrix, yMatrix, rowYears)
                         
                         if modelTrans == 4:
                             yDash = np.sum(np.matmul(xMatrix, params['betaMatrix']))
@@ -921,39 +951,31 @@ def calibrateModel(fileList, PARfilePath, fsDate, feDate, modelType=2, parmOpt=F
             #----- SECTION #4.0 ----- PARfile Output
             #------------------------
 
-            ##Vars "Written" to PAR file:
-            #print("GlobalSettings:")
-            #for i in _globalSettings:
-            #    print(f"{i}: {_globalSettings[i]}")
-            PARfileOutput = [
-                f"{NPredictors if detrendOption == 0 else -NPredictors}", #NPredictors
-                f"{seasonCode}", #Season Code
-                "360" if _globalSettings['thirtyDay'] else ("366" if countLeapYear else "365"), #"YearIndicator": 
-                f"{globalStartDate.day:02d}/{globalStartDate.month:02d}/{globalStartDate.year:04d}", #"Record Start Date": Needs dd/mm/YYYY format instead of YYYY-nn-dd for other SDSM Components it seems.
-                f"{nDaysR}", #"Record Length": 
-                f"{fsDate.day:02d}/{fsDate.month:02d}/{fsDate.year:04d}", #"Fit start date": 
-                f"{noOfDays2Fit}", #"No of days in fit": 
-                #f"{int(parmOpt)}", #"Set Rainfall Parameter": ?
-                f"#{parmOpt}#", #Hashes '#' were present in the original. Re-implemented for backwards compatibility
-                f"{modelTrans}", #"Model Transformation option": 
-                "1", #"Ensemble size set to 1":#Idk what to do with this
-                #f"{int(autoRegression)}", #"Autoregression": 
-                f"{autoRegression}",
-            ]
-
-            for file in fileList:    
-                #PARfileOutput.append(file) #Save predictand & predictor file names
-                name = path.split(file)[-1]
-                PARfileOutput.append(name)
-            PARfileOutput = "\n".join(PARfileOutput) + "\n"
-            #call PrintResults
-            PARfileOutput += printResults(parameterResultsArray, NPredictors, parmOpt, biasCorrection, autoRegression, modelTrans, lamdaArray)
-            PARfileOutput += fileList[0] + "\n"
-            #print PTandRoot
-            if detrendOption != 0:   ##Will need to double check and standardise this parameter
-                #call PrintTrendParms]
-                PARfileOutput += printTrendParms(detrendOption, betaTrend, seasonCode)
-            #call newProgressBar
+            ##Everything "Written" to the PAR file goes through ParModel, the same structure the weather generator reads
+            unconParms, conParms = parameterRows(parameterResultsArray, NPredictors, parmOpt, biasCorrection, autoRegression)
+            parModel = ParModel({
+                'nPredictors': NPredictors,
+                'seasonCode': seasonCode,
+                'yearLength': 360 if _globalSettings['thirtyDay'] else (366 if countLeapYear else 365), #"YearIndicator"
+                'startDate': globalStartDate, #"Record Start Date"
+                'recordLength': nDaysR,
+                'calStartDate': fsDate, #"Fit start date"
+                'calLength': noOfDays2Fit,
+                'rainYes': parmOpt,
+                'modelTrans': modelTrans,
+                'ensembleSize': 1, #"Ensemble size set to 1"
+                'autoRegression': autoRegression,
+                'ptandFilename': path.split(fileList[0])[-1],
+                'predictorFilenames': [path.split(file)[-1] for file in fileList], #Predictand & predictor file names
+                'unconParms': unconParms,
+                'conParms': conParms,
+                'lamdaArray': np.asarray(lamdaArray, dtype=float) if modelTrans == 5 else None,
+                'ptandFileRoot': fileList[0],
+                'deTrend': detrendOption != 0,
+                'deTrendType': detrendOption,
+                'betaTrend': trendParms(detrendOption, betaTrend, seasonCode) if detrendOption != 0 else None,
+            })
+            PARfileOutput = parModel.toText()
 
             #Write to file
             with open(PARfilePath, "w") as f:
@@ -1044,12 +1066,36 @@ def calibrateModel(fileList, PARfilePath, fsDate, feDate, modelType=2, parmOpt=F
             }
             output['autoregression'] = autoRegression
             output['ifXVal'] = doCrossValidation
+            output['parModel'] = parModel
+
+            if chowScan:
+                ##Map each month onto the period it was fitted in
+                output['chowScan'] = {}
+                for n in chowScanResults:
+                    if chowScanResults[n]:
+                        output['chowScan'][n] = {}
+                        for i in range(12):
+                            if seasonCode == 1:
+                                period = 0
+                            elif seasonCode == 4:
+                                period = getSeason(i + 1)
+                            else:
+                                period = i
+                            output['chowScan'][n][months[i]] = chowScanResults[n][period]
 
             #Plot Residual Graph?
             #if residualAnalysis == 1:
                 #Show Scatter:
             #plotScatter(residualArray)
-            output['residualArray'] = residualArray
+            output['residualDiagnostics'] = residualArray
+            if not keepData:
+                residualArray.release() ## The files are read again if the residuals are asked for
+
+            if useCache:
+                storeCalibration(cacheKey, output, PARfileOutput, cacheDir)
+            ## Not cached, the files are already part of the cache key
+            if keepData:
+                output['predictorData'] = [loadedFiles[allFiles.index(file)] for file in fileList]
 
             return output
 
@@ -1065,10 +1111,10 @@ def do_nothing():
 
 def detrendData(yMatrix: np.array, yMatrixAboveThreshPos: np.array, detrendOption: int, fsDateBaseline: int, conditional: bool):
     """"
-    Detrend Data Function v1.1
-    -- May or may not work - Find out soon!
+    Detrend Data Function v1.2
     DetrendOption: 0 = none, 1 = Linear, 2 = power function
     Requires yMatrixAboveThreshPos to be set (generally configured in TransformData)
+    -- Works on the whole yMatrix at once; yMatrix is updated in place when it is already a float array
     """
 
     #Dim BetaTrend(1 To 12, 1 To 3) As Double    
@@ -1076,31 +1122,23 @@ def detrendData(yMatrix: np.array, yMatrixAboveThreshPos: np.array, detrendOptio
     # '1 to 12 for each month or season; for linear model (y=mx+b) 1=intercept b, 2= gradient m
     # 'for power function (y=ax^b;log y = log a + b log x ) 1=a, 2=b , 3=minimum applied before logs could be applied
 
-    xValues = np.ndarray((len(yMatrix), 2))
-    #betaValues = np.array((2))
-    tempMatrix1 = np.ndarray
-    tempMatrix2 = np.ndarray
-    tempYMatrix = deepcopy(yMatrix)
-    for i in range(len(yMatrix)):
-        xValues[i, 0] = 1
-        if conditional:
-            xValues[i, 1] = yMatrixAboveThreshPos[i]
-        else:
-            xValues[i, 1] = i
-        ##endif
-        if detrendOption == 2:
-            xValues[i, 1] += fsDateBaseline
-        ##endif
-    ##next i
+    yMatrix = np.asarray(yMatrix, dtype=float) #TransformData can hand over a list
+    xValues = np.ones((len(yMatrix), 2))
+    if conditional:
+        xValues[:, 1] = yMatrixAboveThreshPos[:len(yMatrix)]
+    else:
+        xValues[:, 1] = np.arange(len(yMatrix))
+    ##endif
+    if detrendOption == 2:
+        xValues[:, 1] += fsDateBaseline
+    ##endif
 
     if detrendOption == 1: #linear regression
         xTransY = np.matmul(xValues.transpose(), yMatrix)
         xTransXInv = np.linalg.inv(np.matmul(xValues.transpose(), xValues))
         betaValues = np.matmul(xTransXInv, xTransY)
 
-        for i in range(len(yMatrix)):
-            yMatrix[i] -= (xValues[i,1] * betaValues[1]) #,0])
-        ##next i
+        yMatrix -= (xValues[:, 1] * betaValues[1])
 
         return {"betaValues": [betaValues[0], betaValues[1]],
                 "yMatrix": yMatrix}
@@ -1110,20 +1148,15 @@ def detrendData(yMatrix: np.array, yMatrixAboveThreshPos: np.array, detrendOptio
 
         minY = np.min(yMatrix)
         if minY > 0: minY = 0
-        for i in range(len(yMatrix)):
-            tempYMatrix[i] = yMatrix[i] + np.abs(minY) + 0.001
-
-        for i in range(len(yMatrix)):
-            tempYMatrix[i] = np.log(tempYMatrix[i])
-            xLogged[i, 1] = np.log(xValues[i, 1])
+        tempYMatrix = np.log(yMatrix + np.abs(minY) + 0.001)
+        xLogged[:, 1] = np.log(xValues[:, 1])
 
         xTransY = np.matmul(xLogged.transpose(), tempYMatrix)
         xTransXInv = np.linalg.inv(np.matmul(xLogged.transpose(), xLogged))
         betaValues = np.matmul(xTransXInv, xTransY)
         betaValues[0] = np.exp(betaValues[0]) 
 
-        for i in range(len(yMatrix)):
-            yMatrix[i] -= (betaValues[0] * (xValues[i][1] ** betaValues[1])) - np.abs(minY) - 0.001
+        yMatrix -= (betaValues[0] * np.float_power(xValues[:, 1], betaValues[1])) - np.abs(minY) - 0.001
 
         return {"betaValues": [betaValues[0], betaValues[1], minY],
                 "yMatrix": yMatrix}
@@ -1132,42 +1165,30 @@ def detrendData(yMatrix: np.array, yMatrixAboveThreshPos: np.array, detrendOptio
         raise ValueError("Invalid Detrend Option")
 
 def propogateUnconditional(yMatrix: np.array, thresh):
-    """Propogate: Unconditional Function v1.0
-    -- yMatrix is an array / Matrix of size (x, 1)
+    """Propogate: Unconditional Function v1.1
+    -- yMatrix is an array / Matrix of size (x, 1), thresholded in place to 1 (wet) / 0 (dry)
     -- Thresh is the Threshold Value (originally defined as Single)
     """
-    for i in range(len(yMatrix)):
-        if yMatrix[i] > thresh:
-            yMatrix[i] = 1
-        else:
-            yMatrix[i] = 0
+    yMatrix[:] = (yMatrix > thresh)
 
-def propogateConditional(xMatrix: np.ndarray, yMatrix: np.ndarray, yMatrixAboveThreshPos: np.ndarray, thresh, NPredictors: int):
+def propogateConditional(xMatrix: np.ndarray, yMatrix: np.ndarray, yMatrixAboveThreshPos: np.ndarray, thresh, extraArrays: list = None):
     """ 
-    Propogate: Conditional Function v1.1
+    Propogate: Conditional Function v1.2
     Reduces X and Y matrices into above threshold values only - adjusts size of X and Y too
+    -- Records the (1-based) position of each kept row in yMatrixAboveThreshPos before it is reduced
+    -- extraArrays are row-aligned arrays that get reduced alongside (same idea as TransformData)
     """
 
-    ### GLOBALS ###
-    #thresh = 0
-    #NPredictors = 21
-    #yMatrixAboveThreshPos = np.array()
-    #xMatrix = np.array()
-    ### ####### ###
+    if extraArrays is None:
+        extraArrays = []
 
-    #tempCounter = 0
-    rejectedIndex = []
-    for i in range(len(yMatrix)):
-        if yMatrix[i] > thresh:
-            ## NEW AND IMPROVED RESIZE CODE HERE:
-            rejectedIndex.append(i)
-        #End If
-    #Next i
-
-    xMatrix = np.delete(xMatrix, rejectedIndex, 0)
-    yMatrix = np.delete(yMatrix, rejectedIndex)
+    keep = ~(yMatrix <= thresh) #NaNs are kept, as in the original loop
+    yMatrixAboveThreshPos[keep] = np.flatnonzero(keep) + 1
 
-    return 
+    return {'xMatrix': xMatrix[keep],
+            'yMatrix': yMatrix[keep],
+            'yMatrixAboveThreshPos': yMatrixAboveThreshPos[keep],
+            'extraArrays': [np.asarray(array)[keep] for array in extraArrays]}
 
 ##XValidation + Helper functions
 def xValidation(xMatrix: np.ndarray, yMatrix: np.ndarray, noOfFolds, parmOpt, conditionalPart=False):
@@ -1520,11 +1541,12 @@ def determinePermutations(n: int):
 
     return THE_LIST
 
-def calculateParameters(xMatrix: np.ndarray, yMatrix: np.ndarray, NPredictors: int, includeChow: bool, conditionalPart: bool, parmOpt: bool, propResiduals: bool, residualArray: np.ndarray, lamdaValues = []):
+def calculateParameters(xMatrix: np.ndarray, yMatrix: np.ndarray, NPredictors: int, includeChow: bool, conditionalPart: bool, parmOpt: bool, propResiduals: bool, residualArray, lamdaValues = [], residualRows = None):
     """
     Calculate Parameters function v1.1
     -- Presumably calculates parameters
     -- LamdaValues and yMatrixAboveThreshPos are only necessary when modelTrans == 4 and ConditionalPart == True
+    -- residualRows is (period, rows of dataReadIn, X columns) for the fit, needed when propResiduals is True
     """
     ### GLOBALS ###
     globalMissingCode = _globalSettings['globalmissingcode']
@@ -1600,11 +1622,7 @@ def calculateParameters(xMatrix: np.ndarray, yMatrix: np.ndarray, NPredictors: i
     ## Aka RSquared
 
     if propResiduals:
-        nOfR = residualArray["noOfResiduals"]
-        for i in range(len(results["residualMatrix"])):
-            residualArray["predicted"][i + nOfR] = results["predictedMatrix"][i]
-            residualArray["residual"][i + nOfR] = results["residualMatrix"][i]
-        residualArray["noOfResiduals"] += len(results["residualMatrix"])
+        residualArray.addFit(*residualRows, yMatrix, results["betaMatrix"])
     #endif
 
 
@@ -1619,6 +1637,68 @@ def calculateParameters(xMatrix: np.ndarray, yMatrix: np.ndarray, NPredictors: i
             }
 
 
+def chowBreakpointScan(xMatrix: np.ndarray, yMatrix: np.ndarray, rowYears: np.ndarray, minSegment: int = 10):
+    """
+    Chow Breakpoint Scan v1.0
+    -- Evaluates the Chow statistic for a split at the first row of every year in rowYears
+    -- Builds prefix sums of XtX, Xty and yty once, so each candidate split costs a pair of
+       p x p solves rather than two refits over the data
+    -- Both halves need more than minSegment rows (same rule as the midpoint Chow test)
+    -- Returns {"years": [...], "chowStat": [...]}, with globalMissingCode where a split could not be evaluated
+    """
+    ### GLOBALS ###
+    globalMissingCode = _globalSettings['globalmissingcode']
+    ### ####### ###
+
+    xMatrix = np.asarray(xMatrix, dtype=float)
+    yMatrix = np.asarray(yMatrix, dtype=float)
+    rowYears = np.asarray(rowYears)
+    n, p = xMatrix.shape
+
+    ##Prefix sums: index k holds the sums over rows [0, k)
+    gramSums = np.zeros((n + 1, p, p))
+    np.cumsum(xMatrix[:, :, None] * xMatrix[:, None, :], axis=0, out=gramSums[1:])
+    xtySums = np.zeros((n + 1, p))
+    np.cumsum(xMatrix * yMatrix[:, None], axis=0, out=xtySums[1:])
+    ytySums = np.zeros((n + 1))
+    np.cumsum(yMatrix ** 2, out=ytySums[1:])
+
+    def segmentRSS(start, end):
+        xtx = gramSums[end] - gramSums[start]
+        xty = xtySums[end] - xtySums[start]
+        betaMatrix = np.linalg.solve(xtx, xty)
+        RSS = (ytySums[end] - ytySums[start]) - np.dot(betaMatrix, xty)
+        return max(RSS, 0.0001) #Same floor as calculateParameters2
+
+    years = []
+    chowStats = []
+    try:
+        RSSAll = segmentRSS(0, n)
+    except np.linalg.LinAlgError:
+        RSSAll = None
+
+    splitRows = np.flatnonzero(rowYears[1:] != rowYears[:-1]) + 1
+    for k in splitRows:
+        if k <= minSegment or (n - k) <= minSegment:
+            continue
+        years.append(int(rowYears[k]))
+        chowStat = globalMissingCode
+        if RSSAll is not None:
+            try:
+                RSS1 = segmentRSS(0, k)
+                RSS2 = segmentRSS(k, n)
+            except np.linalg.LinAlgError:
+                pass
+            else:
+                chowDenom = RSS1 + RSS2
+                if chowDenom > 0 and p > 1:
+                    chowStat = ((RSSAll - RSS1 - RSS2) / chowDenom)
+                    chowStat *= (n - (2 * (p - 1))) / (p - 1)
+        chowStats.append(chowStat)
+    #next k
+
+    return {"years": years, "chowStat": chowStats}
+
 def calculateParameters2(xMatrix: np.ndarray, yMatrix: np.ndarray, NPredictors: int):
     """
     Calculate Parameters #2 v1.1
@@ -1844,12 +1924,13 @@ def calculateParameters2(xMatrix: np.ndarray, yMatrix: np.ndarray, NPredictors:
 
     return {"fRatio":fRatio, "betaMatrix":betaMatrix, "residualMatrix":residualMatrix, "predictedMatrix":predictedMatrix, "RSS":RSS}
 
-def transformData(xMatrix: np.ndarray, yMatrix: np.ndarray, extraArrays: np.ndarray, modelTrans: int):
+def transformData(xMatrix: np.ndarray, yMatrix: np.ndarray, extraArrays: list, modelTrans: int):
     """
         Transform data v1.0
         transforms data in Y Matrix according to transformation required.  Amends (reduces) X matrix too if some values are missing
         modelTrans ->  Option from None (1), 4th Root (2), Natural Log (3), Inverse Normal (4), Box Con (5)
         yMatrix -> 'Y Matrix - X declared globally so registration code entered
+        extraArrays -> list of row-aligned arrays, reduced alongside X and Y
     """
     ##Calls FindMinLambda
 
@@ -2107,18 +2188,16 @@ def untransformData(matricies: np.ndarray, tResults):
         pass
     elif modelTrans == 2: #4th root
         for matrix in matricies:
-            for i in range(len(matrix)):
-                if matrix[i] != globalMissingCode:
-                    matrix[i] **= 4
-            #if yMatrix[i] != globalMissingCode:
-            #    yMatrix[i] **= 4
+            values = np.array(matrix, dtype=float)
+            valid = values != globalMissingCode
+            values[valid] = np.float_power(values[valid], 4) #float_power matches scalar ** bit for bit, np.power's SIMD loop does not
+            matrix[:] = values #Write back in place (matrix may be a view or a list)
     elif modelTrans == 3: #nat log
         for matrix in matricies:
-            for i in range(len(matrix)):
-                if matrix[i] != globalMissingCode:
-                    matrix[i] = np.exp(matrix[i])
-            #if yMatrix[i] != globalMissingCode:
-            #    yMatrix[i] = np.exp(yMatrix[i])
+            values = np.array(matrix, dtype=float)
+            valid = values != globalMissingCode
+            values[valid] = np.exp(values[valid])
+            matrix[:] = values
 
     elif modelTrans == 4: #inverse normal 
         #transformResults = reSampleMatrix -> unsorted data to take resampling from
@@ -2150,21 +2229,17 @@ def untransformData(matricies: np.ndarray, tResults):
         if error: #Untransform failed - inverse normal cannot be calculated
             debugMsg("[Error]: Inverse normal cannot be calculated")
             for matrix in matricies:
-                for i in range(len(matrix)):
-                    matrix[i] = globalMissingCode
-                #yMatrix[i] = globalMissingCode
+                matrix[:] = np.full(len(matrix), globalMissingCode)
         else:
             ## "Compute area between lower and each z-score"
             limit = fx
             totalArea = (1 - (2 * zStart))
 
-            for matrix in matricies:
-                for i in range(len(matrix)): #'now use translator to convert all values
-                    if matrix[i] != globalMissingCode:
-                        matrix[i] = translator(matrix[i] , limit, totalArea, rsMatrix)
-                #if yMatrix[i] != globalMissingCode:
-                #    yMatrix[i] = translator(yMatrix[i], limit, totalArea, tResults)
-            #next i
+            for matrix in matricies: #'now use translator to convert all values
+                values = np.array(matrix, dtype=float)
+                valid = values != globalMissingCode
+                values[valid] = translatorArray(values[valid], limit, totalArea, rsMatrix)
+                matrix[:] = values
         #endif
     
     elif modelTrans == 5: #Box Cox
@@ -2172,20 +2247,18 @@ def untransformData(matricies: np.ndarray, tResults):
         lamda = tResults['lamda']
         shift = tResults['shiftRight']
         for matrix in matricies:
-            for i in range(len(matrix)):
-                if matrix[i] != globalMissingCode:
-                    tempValue = matrix[i] + shift #shift right for current period
-                    if lamda == 0:
-                        tempValue = np.exp(tempValue) - shift #log transform
-                    else:
-                        tempValue = (lamda * tempValue) + 1
-                        if tempValue > 0:
-                            tempValue = np.log(tempValue) / lamda
-                            tempValue = np.exp(tempValue) - shift
-                        else:
-                            tempValue = globalMissingCode
-                    matrix[i] = tempValue
-           #next i
+            values = np.array(matrix, dtype=float)
+            valid = values != globalMissingCode
+            tempValues = values[valid] + shift #shift right for current period
+            if lamda == 0:
+                tempValues = np.exp(tempValues) - shift #log transform
+            else:
+                tempValues = (lamda * tempValues) + 1
+                positive = tempValues > 0
+                tempValues[positive] = np.exp(np.log(tempValues[positive]) / lamda) - shift
+                tempValues[~positive] = globalMissingCode
+            values[valid] = tempValues
+            matrix[:] = values
         #next matrix
     #endif
 
@@ -2225,75 +2298,62 @@ def translator(passedValue: float, limit: float, totalArea: float, reSampleMatri
             locateValue = min(locateValue, (len(reSampleMatrix) - 1))
             return reSampleMatrix[locateValue]
 
-def printResults(parameterResultsArray: np.ndarray, NPredictors: int, parmOpt: bool, biasCorrection, autoRegression: bool, modelTrans: int, tResults: list):
+def translatorArray(passedValues: np.ndarray, limit: float, totalArea: float, reSampleMatrix) -> np.ndarray:
+    """
+    Untransform Data: Inverse Normal helper function (array version of translator)
+    -- Runs the same 100 step trapezoidal integration for every value at once,
+       so each value gets the same arithmetic as translator() would give it
     """
-    Collects data from output arrays and merges it into
-     string form, ready to be written to the PARfile
+
+    passedValues = np.asarray(passedValues, dtype=float)
+    output = np.full(len(passedValues), reSampleMatrix[0], dtype=float)
+    aboveLimit = passedValues > limit
+    if not np.any(aboveLimit):
+        return output
+
+    interval = (passedValues[aboveLimit] - limit) / 100
+    area = np.zeros(len(interval))
+    fx = np.full(len(interval), limit, dtype=float)
+    fxOld = fxNormal(limit)
+    for i in range(100):
+        fx = fx + interval
+        fxNew = fxNormal(fx)
+        area += (interval * 0.5 * (fxOld + fxNew))
+        fxOld = fxNew
+    #next i
+    area = np.minimum(area, totalArea)
+    locateValue = (area * len(reSampleMatrix) / totalArea).astype(int)
+    locateValue = np.minimum(locateValue, (len(reSampleMatrix) - 1))
+    output[aboveLimit] = np.asarray(reSampleMatrix)[locateValue]
+    return output
+
+def parameterRows(parameterResultsArray: np.ndarray, NPredictors: int, parmOpt: bool, biasCorrection, autoRegression: bool):
+    """
+    Collects the PAR file parameter rows from the output arrays
+    Returns (unconParms, conParms) - conParms is None without the conditional part
+    Unconditional rows: parameters, SE, (autoregression), RSQR; conditional rows: intercept, bias correction, parameters, SE, RSQR
+    The autoregression coefficient is fitted as the last predictor, it goes after SE as in every ParModel
     """
-    #We want: parmOpt, parameterResultsArray, nPredictors, autoregrssion, lamdaArray, modelTrans, biascorrection
-    giga_array = ""
     if parmOpt:
         for i in range(12):
             parameterResultsArray[i, NPredictors + 1 + int(autoRegression)] = 0
-    for i in range(12):
-        for j in range(NPredictors + 3 + int(autoRegression)):
-            giga_array += f"{parameterResultsArray[i, j]:.3f}\t"
-        #next j
-        if modelTrans == 5:
-            #tResults is the LamdaArray
-            giga_array += f"{tResults[i, 0]:.3f}\t"
-            giga_array += f"{tResults[i, 1]:.3f}"
-        #endif
-        giga_array += "\n"
-    #next i
+    unconParms = np.array(parameterResultsArray[:12, :NPredictors + 3 + int(autoRegression)], dtype=float)
+    if autoRegression:
+        unconParms = swapSEAndAR(unconParms, NPredictors)
+    conParms = None
     if parmOpt:
-        for i in range(12, 24):
-            giga_array += f"{parameterResultsArray[i, 0]:.3f}\t"
-            giga_array += f"{biasCorrection[i - 12]:.3f}\t"
-            for j in range(1, NPredictors + 3):
-                giga_array += f"{parameterResultsArray[i, j]:.3f}\t"
-            #next j
-            giga_array += "\n"
-        #next i
-    #endif
-
-    return giga_array
+        conParms = np.column_stack([
+            parameterResultsArray[12:24, 0],
+            np.asarray(biasCorrection, dtype=float)[:12],
+            parameterResultsArray[12:24, 1:NPredictors + 3]])
+    return unconParms, conParms
 
-    #Write to file
-    #with open(parfile, "a") as f:
-    #    print(giga_array, file=f)
-    #    f.close()
-
-def printTrendParms(detrendOption: int, betaTrend, seasonCode: int):
+def trendParms(detrendOption: int, betaTrend, seasonCode: int):
     """
-    Collects data from the betaTrend array and returns it
-     in string form, ready to be written to the PARfile
+    Collects the detrend parameters of each period into a (seasonCode, 2 or 3) array
     """
-
-    giga_array = ""
-    if detrendOption == 1:
-        giga_array += "1\n"
-    else: #Assume option #2
-        giga_array += "2\n"
-    #endif
-
-    #if seasonCode == 1:
-    #    giga_array += f"{betaTrend[0,0]}\t{betaTrend[0,1]}"
-    #    if detrendOption == 2:
-    #        giga_array += f"\t{betaTrend[0,2]}\n"
-    #    else:
-    for i in range(seasonCode):
-        giga_array += f"{betaTrend[i][0]}\t{betaTrend[i][1]}"
-        if detrendOption == 2:
-            giga_array += f"\t{betaTrend[i][2]}"
-        giga_array += "\n"
-    
-    return giga_array
-
-    #Write to file
-    #with open(parfile, "a") as f:
-    #    print(giga_array, file=f)
-    #    f.close()
+    nParms = 2 if detrendOption == 1 else 3 #Assume option #2 otherwise
+    return np.array([[betaTrend[i][j] for j in range(nParms)] for i in range(seasonCode)], dtype=float)
                 
 
 def displayWarning(text):
@@ -2304,60 +2364,177 @@ def displayWarning(text):
     messageBox.exec_()
 
 
-def plotScatter(residualArray):
+class ResidualDiagnostics:
+    """
+    Residual diagnostics for calibrateModel, worked out on request
+    -- Each fit that propagates residuals adds its beta parameters and the rows it was fitted on, as
+       positions in dayReadIn (which day of the loaded files each row of dataReadIn came from)
+    -- X is rebuilt from the predictand / predictor files when the residuals are asked for, Y is only
+       kept when the fit changed it (thresholded, transformed or detrended)
+    -- Once released (or pickled, e.g. into the calibration cache) the files are read again on request,
+       as long as they haven't changed since the calibration
+    """
+
+    def __init__(self, fileList, loadedFiles, dayReadIn, thresh, parmOpt, autoRegression):
+        self.fileList = list(fileList)
+        self.fileStamps = [ParModel.sourceStamp(file) for file in fileList]
+        self.loadedFiles = loadedFiles
+        self.dayReadIn = dayReadIn
+        self.thresh = thresh
+        self.parmOpt = parmOpt
+        self.autoRegression = autoRegression
+        self.fits = [] #(period, rows, columns, betaMatrix, yMatrix) per fit, in calibration order
+        self.values = None #Cached {"predicted", "residual"} once worked out
+
+    def addFit(self, period, rows, columns, yMatrix, betaMatrix):
+        rows = np.array(rows, dtype=np.int32)
+        yMatrix = np.asarray(yMatrix, dtype=float)
+        predictand = self.loadedFiles[0][self.dayReadIn[period, rows]]
+        if np.array_equal(yMatrix, predictand):
+            yMatrix = None
+        elif np.array_equal(yMatrix, predictand > self.thresh):
+            yMatrix = "wet"
+        else:
+            yMatrix = yMatrix.copy()
+        self.fits.append((period, rows, columns, np.asarray(betaMatrix), yMatrix))
+        self.values = None
+
+    def release(self):
+        """
+        Drops the reference to the loaded files
+        """
+        self.loadedFiles = None
+
+    def data(self):
+        """
+        The loaded files, read again if released
+        Raises ValueError if a file has changed or gone since the calibration
+        """
+        if self.loadedFiles is not None:
+            return self.loadedFiles
+        try:
+            unchanged = [ParModel.sourceStamp(file) for file in self.fileList] == self.fileStamps
+        except OSError:
+            unchanged = False
+        if not unchanged:
+            raise ValueError("The predictand / predictor files have changed since calibrating, calibrate again to see the residuals")
+        return loadFilesIntoMemory(self.fileList)
+
+    def designMatrix(self, loadedFiles, period, rows, columns):
+        """
+        X matrix of a fit: a column of 1s, the predictors, then the lagged predictand (autoregression)
+        """
+        days = self.dayReadIn[period, rows]
+        xColumns = [np.ones(len(rows))] + [loadedFiles[j][days] for j in range(1, len(loadedFiles))]
+        if self.autoRegression:
+            lagged = loadedFiles[0][self.dayReadIn[period, rows - 1]] ## The previous row read in for the period
+            xColumns.append((lagged > self.thresh).astype(float) if self.parmOpt else lagged)
+        xMatrix = np.column_stack(xColumns)
+        return xMatrix if columns is None else xMatrix[:, columns]
+
+    def residuals(self):
+        """
+        Returns {"predicted": array, "residual": array} for every fitted row, fits in calibration order
+        """
+        if self.values is None:
+            loadedFiles = self.data() if self.fits else None
+            predicted = []
+            residual = []
+            for period, rows, columns, betaMatrix, yMatrix in self.fits:
+                predictand = loadedFiles[0][self.dayReadIn[period, rows]]
+                if yMatrix is None:
+                    yMatrix = predictand
+                elif isinstance(yMatrix, str):
+                    yMatrix = (predictand > self.thresh).astype(float)
+                predicted.append(np.matmul(self.designMatrix(loadedFiles, period, rows, columns), betaMatrix))
+                residual.append(np.subtract(yMatrix, predicted[-1]))
+            self.values = {
+                "predicted": np.concatenate(predicted) if predicted else np.zeros((0)),
+                "residual": np.concatenate(residual) if residual else np.zeros((0))}
+        return self.values
+
+    @property
+    def noOfResiduals(self):
+        return sum(len(fit[1]) for fit in self.fits)
+
+    def histogram(self, noOfHistCats: int):
+        """
+        Returns (bin edges, counts) of the residuals split into noOfHistCats equal width categories
+        """
+        residuals = self.residuals()["residual"]
+        if len(residuals) == 0:
+            return np.zeros((noOfHistCats + 1)), np.zeros((noOfHistCats), dtype=int)
+        counts, edges = np.histogram(residuals, bins=noOfHistCats)
+        return edges, counts
+
+    def scatterPoints(self, maxPoints: int = 5000):
+        """
+        Returns (predicted, residual) for the scatter plot, thinned to an even stride over
+        the record when there are more than maxPoints residuals
+        """
+        values = self.residuals()
+        stride = max(1, int(np.ceil(len(values["residual"]) / maxPoints)))
+        return values["predicted"][::stride], values["residual"][::stride]
+
+    def binnedScatter(self, noOfBins: int = 50):
+        """
+        Summarises the scatter by binning the predicted values
+        Returns {"centre", "count", "meanResidual", "minResidual", "maxResidual"} per non-empty bin
+        """
+        values = self.residuals()
+        predicted = values["predicted"]
+        residual = values["residual"]
+        if len(predicted) == 0:
+            return {"centre": np.zeros((0)), "count": np.zeros((0), dtype=int), "meanResidual": np.zeros((0)),
+                    "minResidual": np.zeros((0)), "maxResidual": np.zeros((0))}
+        edges = np.histogram_bin_edges(predicted, bins=noOfBins)
+        binIndex = np.clip(np.searchsorted(edges, predicted, side='right') - 1, 0, noOfBins - 1)
+        count = np.bincount(binIndex, minlength=noOfBins)
+        total = np.bincount(binIndex, weights=residual, minlength=noOfBins)
+        minResidual = np.full(noOfBins, np.inf)
+        maxResidual = np.full(noOfBins, -np.inf)
+        np.minimum.at(minResidual, binIndex, residual)
+        np.maximum.at(maxResidual, binIndex, residual)
+        used = count > 0
+        return {"centre": ((edges[:-1] + edges[1:]) / 2)[used],
+                "count": count[used],
+                "meanResidual": total[used] / count[used],
+                "minResidual": minResidual[used],
+                "maxResidual": maxResidual[used]}
+
+    def __getstate__(self):
+        ## Just the fits, the files and worked out residuals are left behind
+        state = dict(self.__dict__)
+        state["loadedFiles"] = None
+        state["values"] = None
+        return state
+
+def plotScatter(residualDiagnostics, maxPoints=5000):
+    """
+    Plots predicted values against residuals onto a PyQtGraph scatter plot
+    -- Long records are thinned to maxPoints so the plot stays responsive
+    """
     #mimicked from ScreenVariables
     import pyqtgraph as pg
 
-    #ResidualArray(1,i) is equivalent to residualArray['predicted'][i], and should go on the X axis
-    #ResidualArray(2,i) is equivalent to residualArray['residual'][i], and should go on the Y axis
-    #NoOfResiduals is equivalent to residualArray['noOfResiduals'] and should contain the length of the array
-
     plot = pg.plot()
     scatter = pg.ScatterPlotItem(size=10, brush=pg.mkBrush(255, 255, 255, 120))
 
-    outputData = residualArray
-    spots = [
-        {"pos": [residualArray['predicted'][i], residualArray['residual'][i]]}
-        for i in range(residualArray['noOfResiduals'])
-    ]
+    predicted, residual = residualDiagnostics.scatterPoints(maxPoints)
     plot.setWindowTitle("SDSM Residual Scatter plot") 
     plot.getPlotItem().setLabel("left","Residual")
     plot.getPlotItem().setLabel("bottom","Predicted Value")
-    scatter.addPoints(spots)
+    scatter.setData(x=predicted, y=residual)
     plot.addItem(scatter)
 
-def plotHistogram(residualArray, noOfHistCats):
+def plotHistogram(residualDiagnostics, noOfHistCats):
     """
     Plots residual data onto a PyQtGraph Histogram
     """
 
     import pyqtgraph as pg
 
-    residuals = residualArray['residual']
-
-    minVal = np.min(residuals)
-    maxVal = np.max(residuals)
-    sizeOfCategories = (maxVal - minVal) / noOfHistCats
-    
-    residualHistOccurances = np.zeros(noOfHistCats, dtype=int)
-    for i in range(noOfHistCats):
-        #???
-        catMin = minVal + (i * sizeOfCategories)
-        catMax = catMin + sizeOfCategories
-        for j in range(residualArray['noOfResiduals']):
-            if residualArray['residual'][j] >= catMin and residualArray['residual'][j] < catMax:
-                residualHistOccurances[i] += 1
-            #input()
-        #next j
-    #next i
-
-    
-    
-    residualHistLabels = [minVal]
-    for i in range(1, noOfHistCats):
-        residualHistLabels.append((minVal + (i * sizeOfCategories)))
-    
-    residualHistLabels.append(maxVal)
+    residualHistLabels, residualHistOccurances = residualDiagnostics.histogram(noOfHistCats)
 
     plot = pg.plot()
     bargraph = pg.PlotCurveItem(x = residualHistLabels, #range(noOfHistCats),
@@ -2607,6 +2784,21 @@ def formatCalibrateResults(results):
                             result += f"{str(round(float(xValidation),5)):{maxWidth}}"
                 output.append(result)
 
+    if "chowScan" in results:
+        #Summarise each month's breakpoint profile by its largest Chow statistic
+        for n in results['chowScan']:
+            output.append("")
+            output.append(f"{n} Chow Breakpoint Scan")
+            output.append("")
+            output.append(f"{'Month':{maxWidth}}{'Max Chow':{maxWidth}}{'Break Year':{maxWidth}}")
+            for month in results['chowScan'][n]:
+                scan = results['chowScan'][n][month]
+                if len(scan['chowStat']) > 0:
+                    best = int(np.argmax(scan['chowStat']))
+                    output.append(f"{month:{maxWidth}}{str(round(float(scan['chowStat'][best]),5)):{maxWidth}}{str(scan['years'][best]):{maxWidth}}")
+                else:
+                    output.append(f"{month:{maxWidth}}{'-':{maxWidth}}{'-':{maxWidth}}")
+
     '''
     # Cross-correlation matrix rows
     for j in range(nVariables):
@@ -0,0 +1,148 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import time
+
+## On-disk cache of calibrateModel results
+## Entries are keyed by a fingerprint of everything that can change the output:
+## the predictand / predictor file contents, fit dates, model options and the relevant settings.
+## The cache lives in the user's home directory so the GUI and batch runs share it.
+## It is off by default: calibrateModel only uses it when the CalibrationCache setting is on
+## (Settings screen, which can also clear it) or when asked to with useCache=True.
+
+cacheVersion = 5 ## Bump when calibrateModel output changes so old entries stop matching
+defaultCacheDir = os.path.join(os.path.expanduser("~"), ".sdsm", "cache", "calibration")
+defaultMaxBytes = 256 * 1024 * 1024 ## 256MB
+defaultMaxAge = 30 * 24 * 60 * 60 ## 30 days, in seconds
+
+debug = False
+def debugMsg(msg):
+    if debug == True:
+        print(msg)
+
+## Settings that feed into calibrateModel (everything else, e.g. colour mode, is ignored)
+settingsUsed = [
+    'thirtyDay', 'leapYear', 'globalsdate', 'globaledate', 'thresh', 'globalmissingcode',
+    'modeltransformation', 'optimizationalgorithm', 'criteriatype', 'stepwiseregression']
+
+def fileFingerprint(filePath, blockSize=1 << 20):
+    """
+    Hash of a file's contents (sha256 hex digest), read in blocks so large files are fine
+    """
+    digest = hashlib.sha256()
+    with open(filePath, "rb") as f:
+        for block in iter(lambda: f.read(blockSize), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def calibrationKey(fileList, fsDate, feDate, options, settings):
+    """
+    Builds the cache key for a calibration run
+    fileList -> predictand followed by predictors (as passed to calibrateModel)
+    options -> dict of calibrateModel options (modelType, parmOpt, ...)
+    settings -> settings dictionary from getSettings(); only settingsUsed are part of the key
+    """
+    digest = hashlib.sha256()
+    digest.update(f"v{cacheVersion}\n".encode())
+    for file in fileList:
+        ## The paths are part of the output (PAR file and results), so they are part of the key too
+        digest.update(f"{file}\n{fileFingerprint(file)}\n".encode())
+    digest.update(f"{fsDate}\n{feDate}\n".encode())
+    for key in sorted(options):
+        digest.update(f"{key}={options[key]!r}\n".encode())
+    for key in settingsUsed:
+        digest.update(f"{key}={settings.get(key)}\n".encode())
+    return digest.hexdigest()
+
+def loadCalibration(key, cacheDir=None):
+    """
+    Returns (results, PARContent) for a cached calibration, or None on a miss
+    A hit refreshes the entry's modified time so eviction is least-recently-used
+    """
+    entryPath = os.path.join(cacheDir or defaultCacheDir, key + ".pkl")
+    try:
+        with open(entryPath, "rb") as f:
+            entry = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception:
+        ## Unreadable / partial entry - drop it and treat as a miss
+        removeEntry(entryPath)
+        return None
+
+    if entry.get('version') != cacheVersion:
+        removeEntry(entryPath)
+        return None
+    try:
+        os.utime(entryPath)
+    except OSError:
+        pass
+    return entry['results'], entry['PAR']
+
+def storeCalibration(key, results, PARContent, cacheDir=None, maxBytes=defaultMaxBytes, maxAge=defaultMaxAge):
+    """
+    Saves a calibration to the cache, then evicts old entries
+    Written to a temporary file first so other processes never see a half-written entry
+    """
+    cacheDir = cacheDir or defaultCacheDir
+    tempPath = None
+    try:
+        os.makedirs(cacheDir, exist_ok=True)
+        fd, tempPath = tempfile.mkstemp(dir=cacheDir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump({'version': cacheVersion, 'results': results, 'PAR': PARContent}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tempPath, os.path.join(cacheDir, key + ".pkl"))
+    except Exception as e:
+        ## The cache is only an optimisation - never fail a calibration because of it
+        if tempPath is not None:
+            removeEntry(tempPath)
+        debugMsg(f"[WARNING]: Could not write calibration cache: {e}")
+        return False
+    evictCalibrations(cacheDir, maxBytes, maxAge)
+    return True
+
+def evictCalibrations(cacheDir=None, maxBytes=defaultMaxBytes, maxAge=defaultMaxAge):
+    """
+    Removes entries older than maxAge seconds, then the least recently used
+    entries until the cache is no bigger than maxBytes
+    """
+    cacheDir = cacheDir or defaultCacheDir
+    try:
+        names = os.listdir(cacheDir)
+    except OSError:
+        return
+
+    now = time.time()
+    entries = []
+    for name in names:
+        if not name.endswith(".pkl"):
+            continue
+        entryPath = os.path.join(cacheDir, name)
+        try:
+            stat = os.stat(entryPath)
+        except OSError:
+            continue
+        if now - stat.st_mtime > maxAge:
+            removeEntry(entryPath)
+        else:
+            entries.append((stat.st_mtime, stat.st_size, entryPath))
+
+    totalSize = sum(entry[1] for entry in entries)
+    for modified, size, entryPath in sorted(entries):
+        if totalSize <= maxBytes:
+            break
+        removeEntry(entryPath)
+        totalSize -= size
+
+def clearCalibrations(cacheDir=None):
+    """
+    Empties the calibration cache
+    """
+    evictCalibrations(cacheDir, maxBytes=0, maxAge=0)
+
+def removeEntry(entryPath):
+    try:
+        os.remove(entryPath)
+    except OSError:
+        pass
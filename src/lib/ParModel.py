@@ -0,0 +1,305 @@
+import datetime
+import json
+import os
+import tempfile
+import numpy as np
+
+## Parsed PAR (calibrated model parameter) file, shared by calibration, the weather generator and the scenario generator
+## A ParModel is a dictionary with the keys below, so it can be handed straight to the weather generator engine:
+##     nPredictors, seasonCode, yearLength, startDate (record start), recordLength, calStartDate, calLength,
+##     rainYes, modelTrans, ensembleSize, autoRegression, ptandFilename, predictorFilenames (predictand first),
+##     unconParms (12 x columns), conParms (12 x columns or None), lamdaArray (12 x 2 or None), ptandFileRoot,
+##     deTrend, deTrendType (0 = none, 1 = linear, 2 = power), betaTrend (seasonCode x 2 or 3, or None)
+## Parameter rows keep every column of the file (NaN padded). For Box-Cox the last two values of each
+## unconditional row are lamda and the right shift, and go to lamdaArray instead.
+## Unconditional rows are intercept, predictors, SE, (autoregression), anything else. In the file
+## calibrateModel writes the autoregression coefficient before SE (it is fitted as the last predictor),
+## fromText and toText swap the two so every user of a ParModel sees the one order above.
+## Rows can be tab separated (as calibrateModel writes them) or in fixed width columns of parFieldWidth.
+## A JSON sidecar next to the PAR file can hold the parsed model, so batch runs don't parse it again.
+
+parFieldWidth = 14
+sidecarVersion = 2
+sidecarExtension = ".json"
+dateFormats = ('%d/%m/%Y', '%m/%d/%Y', '%d-%b-%Y', '%m-%d-%Y')
+scalarKeys = ['nPredictors', 'seasonCode', 'yearLength', 'recordLength', 'calLength', 'rainYes', 'modelTrans',
+              'ensembleSize', 'autoRegression', 'ptandFilename', 'predictorFilenames', 'ptandFileRoot',
+              'deTrend', 'deTrendType']
+arrayKeys = ['unconParms', 'conParms', 'lamdaArray', 'betaTrend']
+
+debug = False
+def debugMsg(msg):
+    if debug == True:
+        print(msg)
+
+def parseFixedWidth(line, width=parFieldWidth):
+    """Numbers in fixed width columns, NaN for anything that is not a number (e.g. "---")"""
+    values = []
+    line = line.rstrip()
+    for i in range(0, len(line), width):
+        segment = line[i:i + width].strip()
+        if segment:
+            try:
+                values.append(float(segment))
+            except ValueError:
+                values.append(np.nan)
+    return values
+
+def parseParameterRow(line):
+    """Values of a parameter row, tab separated or fixed width"""
+    if "\t" not in line:
+        return parseFixedWidth(line)
+    values = []
+    for segment in line.split("\t"):
+        segment = segment.strip()
+        if segment:
+            try:
+                values.append(float(segment))
+            except ValueError:
+                values.append(np.nan)
+    return values
+
+def parseParDate(text):
+    """Date from a PAR file, dd/mm/yyyy as written, older files may use other formats"""
+    text = str(text).strip()
+    for dateFormat in dateFormats:
+        try:
+            return datetime.datetime.strptime(text, dateFormat).date()
+        except ValueError:
+            pass
+    raise ValueError(f"Date format not recognized: {text}")
+
+def formatParDate(day):
+    """dd/mm/yyyy, the format the other SDSM components read (works for thirty day dates too)"""
+    return f"{day.day:02d}/{day.month:02d}/{day.year:04d}"
+
+def rowsToArray(rows, minColumns):
+    """(rows, columns) array of parameter rows, NaN padded to the longest row and at least minColumns"""
+    columns = max([minColumns] + [len(row) for row in rows])
+    array = np.full((len(rows), columns), np.nan)
+    for i, row in enumerate(rows):
+        array[i, :len(row)] = row
+    return array
+
+def formatRow(row):
+    """Parameter row as calibrateModel has always written it, 3 decimal places each followed by a tab"""
+    return "".join(f"{value:.3f}\t" for value in row)
+
+def swapSEAndAR(parms, nPredictors):
+    """Unconditional rows with the SE and autoregression columns swapped, file order <-> model order"""
+    parms = np.array(parms, dtype=float)
+    parms[:, [nPredictors + 1, nPredictors + 2]] = parms[:, [nPredictors + 2, nPredictors + 1]]
+    return parms
+
+def formatTrendValue(value, column):
+    """ A detrend parameter as calibrateModel has always written it: the power function's minimum (column 2)
+        is a plain 0 when every value was positive, anything else is the float as Python prints it"""
+    if column == 2 and value == 0:
+        return "0"
+    return repr(float(value))
+
+def trimColumns(parms):
+    """parms without the trailing columns that are NaN in every row"""
+    parms = np.asarray(parms, dtype=float)
+    filled = np.flatnonzero(~np.isnan(parms).all(axis=0))
+    return parms[:, :filled[-1] + 1] if len(filled) > 0 else parms[:, :0]
+
+class ParModel(dict):
+    """
+    Calibrated model, as read from or written to a PAR file
+    See the top of this file for the keys
+    """
+
+    @classmethod
+    def fromText(cls, text):
+        """
+        Parses the contents of a PAR file
+        Raises EOFError if the file ends early and ValueError for values that can't be read
+        """
+        lines = iter([line.strip() for line in text.splitlines()])
+
+        def nextLine(allowEmpty=False):
+            ## Blank lines are skipped except where a value may be empty (predictor names)
+            for line in lines:
+                if line or allowEmpty:
+                    return line
+            raise EOFError("Unexpected end of PAR file.")
+
+        model = cls()
+        #Negative number of predictors means the model was detrended
+        nPredictorsRaw = int(nextLine())
+        nPredictors = abs(nPredictorsRaw)
+        model['nPredictors'] = nPredictors
+        model['deTrend'] = nPredictorsRaw < 0
+        model['seasonCode'] = int(nextLine())
+        model['yearLength'] = int(nextLine())
+        model['startDate'] = parseParDate(nextLine())
+        model['recordLength'] = int(nextLine())
+        model['calStartDate'] = parseParDate(nextLine())
+        model['calLength'] = int(nextLine())
+        model['rainYes'] = nextLine().strip('#" ').upper() == "TRUE"
+        model['modelTrans'] = int(nextLine())
+        model['ensembleSize'] = int(nextLine())
+
+        #Older files have no autoregression line, the predictand comes straight after the ensemble size
+        line = nextLine()
+        if line.upper() in ("TRUE", "FALSE"):
+            model['autoRegression'] = line.upper() == "TRUE"
+            line = nextLine()
+        else:
+            model['autoRegression'] = False
+        model['ptandFilename'] = line
+        model['predictorFilenames'] = [line] + [nextLine(allowEmpty=True).strip() for _ in range(nPredictors)]
+
+        #Unconditional rows: intercept, predictors, (autoregression), SE, anything else, (lamda, shift)
+        unconRows = [parseParameterRow(nextLine()) for _ in range(12)]
+        minUncon = nPredictors + 2 + int(model['autoRegression'])
+        model['lamdaArray'] = None
+        if model['modelTrans'] == 5:
+            model['lamdaArray'] = np.full((12, 2), np.nan)
+            for i, row in enumerate(unconRows):
+                if len(row) >= minUncon + 2:
+                    model['lamdaArray'][i] = row[-2:]
+                    unconRows[i] = row[:-2]
+        model['unconParms'] = rowsToArray(unconRows, minUncon)
+        if model['autoRegression']:
+            model['unconParms'] = swapSEAndAR(model['unconParms'], nPredictors)
+
+        #Conditional rows: intercept, variance inflation, predictors, SE, anything else
+        model['conParms'] = None
+        if model['rainYes']:
+            model['conParms'] = rowsToArray([parseParameterRow(nextLine()) for _ in range(12)], nPredictors + 3)
+
+        model['ptandFileRoot'] = nextLine()
+
+        model['deTrendType'] = 0
+        model['betaTrend'] = None
+        if model['deTrend']:
+            model['deTrendType'] = int(nextLine())
+            nTrendParms = 2 if model['deTrendType'] == 1 else 3
+            trendRows = model['seasonCode']
+            if trendRows not in (1, 4, 12):
+                raise ValueError(f"Unsupported SeasonCode for Detrend: {trendRows}")
+            ## One row per period, values may be on one line or a line each
+            values = []
+            while len(values) < trendRows * nTrendParms:
+                values += [float(value) for value in nextLine().split()]
+            model['betaTrend'] = np.array(values[:trendRows * nTrendParms]).reshape(trendRows, nTrendParms)
+        return model
+
+    @classmethod
+    def read(cls, filePath, useSidecar=False):
+        """
+        Reads a PAR file
+        useSidecar -> load from / save to the JSON sidecar, it is only used while the PAR file is unchanged
+        """
+        if useSidecar:
+            model = cls.loadSidecar(filePath)
+            if model is not None:
+                return model
+        with open(filePath, "r") as file:
+            model = cls.fromText(file.read())
+        if useSidecar:
+            model.saveSidecar(filePath)
+        return model
+
+    def toText(self):
+        """PAR file contents, in the layout calibrateModel writes"""
+        nPredictors = self['nPredictors']
+        lines = [
+            f"{-nPredictors if self['deTrend'] else nPredictors}",
+            f"{self['seasonCode']}",
+            f"{self['yearLength']}",
+            formatParDate(self['startDate']),
+            f"{self['recordLength']}",
+            formatParDate(self['calStartDate']),
+            f"{self['calLength']}",
+            f"#{bool(self['rainYes'])}#",
+            f"{self['modelTrans']}",
+            f"{self.get('ensembleSize', 1)}",
+            f"{bool(self['autoRegression'])}",
+        ]
+        lines += [os.path.basename(name) for name in self['predictorFilenames']]
+
+        ## Trailing columns that are empty in every row are padding, not part of the file
+        unconParms = self['unconParms']
+        if self['autoRegression']:
+            unconParms = swapSEAndAR(unconParms, nPredictors)
+        unconParms = trimColumns(unconParms)
+        for i in range(12):
+            row = formatRow(unconParms[i])
+            if self['modelTrans'] == 5 and self['lamdaArray'] is not None:
+                row += f"{self['lamdaArray'][i, 0]:.3f}\t{self['lamdaArray'][i, 1]:.3f}"
+            lines.append(row)
+        if self['rainYes'] and self['conParms'] is not None:
+            conParms = trimColumns(self['conParms'])
+            lines += [formatRow(conParms[i]) for i in range(12)]
+        lines.append(self['ptandFileRoot'])
+
+        if self['deTrend'] and self['betaTrend'] is not None:
+            lines.append(f"{self['deTrendType']}")
+            nTrendParms = 2 if self['deTrendType'] == 1 else 3
+            for row in self['betaTrend']:
+                lines.append("\t".join(formatTrendValue(value, column) for column, value in enumerate(row[:nTrendParms])))
+        return "\n".join(lines) + "\n"
+
+    def write(self, filePath):
+        with open(filePath, "w") as file:
+            file.write(self.toText())
+
+    @staticmethod
+    def sidecarPath(filePath):
+        return filePath + sidecarExtension
+
+    @staticmethod
+    def sourceStamp(filePath):
+        ## Modified time and size of the PAR file, a sidecar is only used while these match
+        stat = os.stat(filePath)
+        return [stat.st_mtime_ns, stat.st_size]
+
+    @classmethod
+    def loadSidecar(cls, filePath):
+        """
+        The model saved by saveSidecar, or None if there is no sidecar or the PAR file has changed since
+        """
+        try:
+            with open(cls.sidecarPath(filePath), "r") as file:
+                sidecar = json.load(file)
+            if sidecar.get('version') != sidecarVersion or sidecar.get('source') != cls.sourceStamp(filePath):
+                return None
+            model = cls({key: sidecar[key] for key in scalarKeys})
+            model['startDate'] = datetime.date.fromisoformat(sidecar['startDate'])
+            model['calStartDate'] = datetime.date.fromisoformat(sidecar['calStartDate'])
+            for key in arrayKeys:
+                model[key] = np.array(sidecar[key], dtype=float) if sidecar[key] is not None else None
+            return model
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def saveSidecar(self, filePath):
+        """
+        Saves the model next to its PAR file for a quicker reload
+        Written to a temporary file first so other processes never see a half-written sidecar
+        """
+        ## Arrays are nested lists, NaN is written as JSON's NaN extension which json reads back
+        sidecar = {key: self[key] for key in scalarKeys}
+        sidecar['startDate'] = self['startDate'].isoformat()
+        sidecar['calStartDate'] = self['calStartDate'].isoformat()
+        for key in arrayKeys:
+            sidecar[key] = np.asarray(self[key], dtype=float).tolist() if self[key] is not None else None
+        sidecar['version'] = sidecarVersion
+        tempPath = None
+        try:
+            sidecar['source'] = self.sourceStamp(filePath)
+            fd, tempPath = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filePath)), suffix=".tmp")
+            with os.fdopen(fd, "w") as file:
+                json.dump(sidecar, file)
+            os.replace(tempPath, self.sidecarPath(filePath))
+        except Exception as e:
+            ## The sidecar is only an optimisation - never fail a load because of it
+            if tempPath is not None and os.path.exists(tempPath):
+                os.remove(tempPath)
+            debugMsg(f"[WARNING]: Could not write PAR sidecar: {e}")
+            return False
+        return True
+
@@ -1,53 +1,68 @@
 import calendar
+import csv
 import datetime
+import json
 import math
+import os
+from itertools import islice
 import numpy as np
+import scipy as sci
 try:
-    from src.lib.utils import loadFilesIntoMemory, selectFile, getSettings, increaseDate
+    from src.lib.utils import loadFilesIntoMemory, selectFile, getSettings
+    from src.lib.SummaryStatistics import mergeMoments
 except ModuleNotFoundError:
-    from utils import loadFilesIntoMemory, selectFile, getSettings, increaseDate
+    from utils import loadFilesIntoMemory, selectFile, getSettings
+    from SummaryStatistics import mergeMoments
 
 def valueIsValid(value, applyThresh, missingCode, thresh):
     return value != missingCode and (not applyThresh or value > thresh)
 
+def validMask(data, applyThresh, missingCode, thresh):
+    """Array version of valueIsValid"""
+    mask = data != missingCode
+    if applyThresh:
+        mask &= data > thresh
+    return mask
+
+def sequentialSum(values):
+    """Sum added up in order, so it rounds exactly like sum() over the values one at a time"""
+    return np.cumsum(values)[-1] if len(values) > 0 else 0
+
 def dailyMeans(filePath, applyThresh):
     settings = getSettings()
-    missingCode = settings["globalmissingcode"]
-    thresh = settings["fixedthreshold"]
-    globalSDate = settings["globalsdate"]
-
     data = loadFilesIntoMemory(filePath)[0]
+    dailyStats = dailyStatistics(data, applyThresh, settings["globalmissingcode"], settings["fixedthreshold"], settings["globalsdate"])
+
+    #Output as string to be displayed in textbox
+    output = ""
+    for i in range(7):
+        output += str(calendar.day_name[i]) + ": Mean: " + str(round(dailyStats[i][2], 2)) + " SD: " + str(round(dailyStats[i][3], 2)) + "\n"
+
+    return output
+
+def dailyStatistics(data, applyThresh, missingCode, thresh, globalSDate):
     dailyStats = np.zeros((7, 4), float)
     #[i][0]: sum, [i][1]: count, [i][2]: mean, [i][3] standard deviation
     #i represents the day
 
-    #Calculate Mean
-    day = globalSDate.weekday()
-    for value in data:
-        if valueIsValid(value, applyThresh, missingCode, thresh):
-            dailyStats[day][0] += value
-            dailyStats[day][1] += 1
-        day = (day + 1) % 7
+    #Day of the week of every value
+    days = (globalSDate.weekday() + np.arange(len(data))) % 7
+    valid = validMask(data, applyThresh, missingCode, thresh)
 
-    for stat in dailyStats:
-        stat[2] = stat[0] / stat[1] if stat[1] > 0 else missingCode
+    #Calculate Mean (bincount adds in order, the same as a running total)
+    dailyStats[:, 0] = np.bincount(days[valid], weights=data[valid], minlength=7)
+    dailyStats[:, 1] = np.bincount(days[valid], minlength=7)
+    hasData = dailyStats[:, 1] > 0
+    dailyStats[:, 2] = missingCode
+    dailyStats[hasData, 2] = dailyStats[hasData, 0] / dailyStats[hasData, 1]
 
     #Calculate Standard Deviation
-    day = globalSDate.weekday()
-    for value in data:
-        if dailyStats[day][2] != missingCode and valueIsValid(value, applyThresh, missingCode, thresh):
-            dailyStats[day][3] += (value - dailyStats[day][2]) ** 2
-        day = (day + 1) % 7
+    sdValid = valid & (dailyStats[days, 2] != missingCode)
+    squaredSum = np.bincount(days[sdValid], weights=(data[sdValid] - dailyStats[days[sdValid], 2]) ** 2, minlength=7)
+    dailyStats[:, 3] = missingCode
+    dailyStats[hasData, 3] = np.sqrt(squaredSum[hasData] / dailyStats[hasData, 1])
 
-    for stat in dailyStats:
-        stat[3] = math.sqrt(stat[3] / stat[1]) if stat[1] > 0 else missingCode
-
-    #Output as string to be displayed in textbox
-    output = ""
-    for i in range(7):
-        output += str(calendar.day_name[i]) + ": Mean: " + str(round(dailyStats[i][2], 2)) + " SD: " + str(round(dailyStats[i][3], 2)) + "\n"
-
-    return output
+    return dailyStats
 
 def getOutliers(filePath, outlierFile, sdFilterValue, applyThresh):
     settings = getSettings()
@@ -55,35 +70,36 @@ def getOutliers(filePath, outlierFile, sdFilterValue, applyThresh):
     thresh = settings["fixedthreshold"]
 
     data = loadFilesIntoMemory(filePath)[0]
-    workingData = [value for value in data if valueIsValid(value, applyThresh, missingCode, thresh)]
-    #Filter data to only include valid values
+    index, outliers = findOutliers(data, sdFilterValue, applyThresh, missingCode, thresh)
 
-    #Calculate standard deviation
-    if len(workingData) > 0:
-            mean = sum(workingData) / len(workingData)
-            sd = 0
-            for value in workingData:
-                sd += np.power((value - mean), 2)
-            sd = np.sqrt(sd / len(workingData))
-            sdFilter = sd * sdFilterValue
+    #Write both index and outlier to the file path provided
+    with open(outlierFile, "w") as file:
+        file.write("".join(str(index[i]) + (" " * (30 - len(str(index[i])))) + str(outliers[i]) + "\n" for i in range(len(outliers))))
+
+    return str(len(outliers)) + " outliers identified and written to file."
+
+def findOutliers(data, sdFilterValue, applyThresh, missingCode, thresh):
+    """Returns the row numbers (1 based) and values of entries more than sdFilterValue standard deviations from the mean"""
+    #Filter data to only include valid values
+    valid = validMask(data, applyThresh, missingCode, thresh)
+    workingData = data[valid]
 
     #Index contains the row number the entry is from in the original file
     #Outliers contains the entry's numerical value
     index = []
     outliers = []
-    for i in range(len(data)):
-        if valueIsValid(data[i], applyThresh, missingCode, thresh) and (data[i] > (mean + sdFilter) or data[i] < (mean - sdFilter)):
-            index.append(i + 1)
-            outliers.append(data[i])
 
-    #Write both index and outlier to the file path provided
-    file = open(outlierFile, "w")
-    for i in range(len(outliers)):
-        whitespaceCount = 30 - len(str(index[i]))
-        file.write(str(index[i]) + (" " * whitespaceCount) + str(outliers[i]) + "\n")
-    file.close()
+    #Calculate standard deviation
+    if len(workingData) > 0:
+        mean = sequentialSum(workingData) / len(workingData)
+        sd = np.sqrt(sequentialSum((workingData - mean) ** 2) / len(workingData))
+        sdFilter = sd * sdFilterValue
 
-    return str(len(outliers)) + " outliers identified and written to file."
+        outlierMask = valid & ((data > (mean + sdFilter)) | (data < (mean - sdFilter)))
+        index = (np.flatnonzero(outlierMask) + 1).tolist()
+        outliers = data[outlierMask].tolist()
+
+    return index, outliers
 
 def qualityCheck(filePath, applyThresh, ptPercent):
     settings = getSettings()
@@ -91,30 +107,41 @@ def qualityCheck(filePath, applyThresh, ptPercent):
     thresh = settings["fixedthreshold"]
 
     data = loadFilesIntoMemory(filePath)[0]
+    return checkData(data, applyThresh, ptPercent, missingCode, thresh)
+
+def checkData(data, applyThresh, ptPercent, missingCode, thresh):
     totalCount = len(data) #Count of all values, including those missing or below threshold
-    missingCount = sum(1 if entry == missingCode else 0 for entry in data) #Count of missing values
+    missingCount = int(np.count_nonzero(data == missingCode)) #Count of missing values
     okCount = totalCount - missingCount #Count of values not missing
-    threshCount = sum(1 if valueIsValid(entry, True, missingCode, thresh) else 0 for entry in data) #Count of values not missing and above threshold
+    threshCount = int(np.count_nonzero(validMask(data, True, missingCode, thresh))) #Count of values not missing and above threshold
     
-    validData = [entry for entry in data if valueIsValid(entry, applyThresh, missingCode, thresh)]
-    dataSum = sum(validData)
-    dataMax = max(validData)
-    dataMin = min(validData)
+    valid = validMask(data, applyThresh, missingCode, thresh)
+    validData = data[valid]
+    dataSum = sequentialSum(validData)
+    dataMax = validData.max()
+    dataMin = validData.min()
 
     #Calculate the largest difference between two adjacent rows
-    prevValue = missingCode
+    #Each value is compared with the last value kept before it (all values, or only those above threshold)
+    kept = data > thresh if applyThresh else np.ones(totalCount, dtype=bool)
+    lastKept = np.maximum.accumulate(np.where(kept, np.arange(totalCount), -1))
+    prevIndex = np.empty(totalCount, dtype=int)
+    prevIndex[0] = -1
+    prevIndex[1:] = lastKept[:-1]
+    prevValue = np.where(prevIndex >= 0, data[prevIndex], missingCode)
+    compared = np.flatnonzero((prevValue != missingCode) & valid)
+    differences = np.abs(prevValue[compared] - data[compared])
+
     maxDifference = -9999
-    for i in range(len(data)):
-        if prevValue != missingCode:
-            if (valueIsValid(data[i], applyThresh, missingCode, thresh)):
-                difference = abs(prevValue - data[i])
-                if difference > maxDifference:
-                    maxDifference = round(difference, 4) #Floating point calc
-                    maxDiffVal1 = prevValue
-                    maxDiffVal2 = data[i]
-        
-        if (applyThresh and data[i] > thresh) or (not applyThresh):
-            prevValue = data[i]
+    maxDiffVal1 = maxDiffVal2 = missingCode
+    if len(compared) > 0:
+        #The running maximum is rounded, so repeat the original comparison over the values near the largest
+        #Anything further below can never be the final answer
+        for i in np.flatnonzero(differences >= differences.max() - 0.001):
+            if differences[i] > maxDifference:
+                maxDifference = round(differences[i], 4) #Floating point calc
+                maxDiffVal1 = prevValue[compared[i]]
+                maxDiffVal2 = data[compared[i]]
 
     #Calculate mean
     if applyThresh and threshCount > 0:
@@ -128,88 +155,410 @@ def qualityCheck(filePath, applyThresh, ptPercent):
 
     return dataMin, dataMax, mean, totalCount, missingCount, okCount, maxDifference, maxDiffVal1, maxDiffVal2, threshCount, pettitVal, pettittMax, missingCode, thresh
 
+def calendarIndex(length, startDate):
+    """Calendar year and month (1-12) of each of length consecutive days from startDate"""
+    dates = np.datetime64(startDate, 'D') + np.arange(length)
+    years = dates.astype('datetime64[Y]').astype(int) + 1970
+    months = dates.astype('datetime64[M]').astype(int) % 12 + 1
+    return years, months
+
 def pettittTest(data, ptPercent, applyThresh):
     settings = getSettings()
     missingCode = settings["globalmissingcode"]
     thresh = settings["fixedthreshold"]
     globalSDate = settings["globalsdate"]
 
-    date = globalSDate
-    startYear = date.year
+    startYear = globalSDate.year
 
-    if startYear % 4 == 0:
-        leapYear = True
-    else:
-        leapYear = False
-
-    annualTotal = [0]
-    annualCount = [0]
-    yearIndex = 0
-
-    for i in range(len(data)):
-        if valueIsValid(data[i], applyThresh, missingCode, thresh):
-            annualTotal[yearIndex] += data[i]
-            annualCount[yearIndex] += 1
-        
-        date = increaseDate(date, 1, leapYear)
-        yearIndex = date.year - startYear
-
-        if date.day == 1 and date.month == 1:
-            #New Year, add another field to annual arrays
-            annualTotal.append(0)
-            annualCount.append(0)
-
-            #Check if leap year
-            if date.year % 4 == 0:
-                leapYear = True
-            else:
-                leapYear = False
-
-    annualMeans = []
-    for i in range(len(annualTotal)):
-        if annualCount[i] >= (ptPercent * 3.65) and annualCount[i] > 0:
-            annualMeans.append(annualTotal[i] / annualCount[i])
+    #Annual totals, bincount adds in order so these match a running total
+    years = calendarIndex(len(data), globalSDate)[0] - startYear
+    valid = validMask(data, applyThresh, missingCode, thresh)
+    annualTotal = np.bincount(years[valid], weights=data[valid], minlength=years[-1] + 1 if len(data) > 0 else 0)
+    annualCount = np.bincount(years[valid], minlength=len(annualTotal))
+
+    return pettittAnnual(annualTotal, annualCount, ptPercent, startYear, missingCode)
+
+def pettittAnnual(annualTotal, annualCount, ptPercent, startYear, missingCode):
+    """ Pettitt test on the means of the years with at least ptPercent % of their values
+        The change year is a calendar year, years left out for too few values are skipped over"""
+    keep = (annualCount >= (ptPercent * 3.65)) & (annualCount > 0)
+    annualMeans = (annualTotal[keep] / annualCount[keep]).tolist()
 
     if len(annualMeans) < 5:
-        return settings["globalmissingcode"], settings["globalmissingcode"]
+        return missingCode, missingCode
     else:
-        return pettittCalc(annualMeans, startYear)
+        return pettittCalc(annualMeans, startYear, missingCode, years=np.flatnonzero(keep) + startYear)
+
+def pettittStatistic(data):
+    """ Pettitt change point statistic of a series.
+        Returns (significance, position of the largest |U| before the last value, 0 based)
+        A constant series (e.g. a month that is always dry) has no change point: (1.0, None)"""
+    data = np.asarray(data, dtype=float)
+    n = len(data)
+    if n < 2 or np.all(data == data[0]):
+        return 1.0, None
+    #Tied values all take the lowest rank, as the original rank matching loop did
+    ranks = sci.stats.rankdata(data, method='min')
+    U = np.abs((2 * np.cumsum(ranks)) - (np.arange(1, n + 1) * (n + 1)))
+    maxU = U.max()
+    pettittVal = round(2 * np.e ** ((-6 * maxU ** 2) / ((n ** 3) + (n ** 2))), 5)
+    ## With tied ranks U is not 0 at the last value, but there is no year after it to change to
+    return pettittVal, int(np.argmax(U[:-1]))
+
+def pettittCalc(data, startYear, missingCode=None, years=None):
+    """ Pettitt test of a yearly series, returns (significance, first year after the change or missingCode
+        if not significant at 5%)
+        years -> calendar year of each value, when some are left out; otherwise they run on from startYear"""
+    if missingCode is None:
+        missingCode = getSettings()["globalmissingcode"]
+
+    pettittVal, maxPos = pettittStatistic(data)
+    pettittMax = missingCode
 
-def pettittCalc(data, startYear):
-    petMatrix = np.zeros((len(data), 4), float)
+    if pettittVal < 0.05 and maxPos is not None:
+        pettittMax = np.float64(years[maxPos + 1] if years is not None else maxPos + 1 + startYear)
 
-    petMatrix[:, 0] = [i for i in range(1, len(data) + 1)]
-    petMatrix[:, 1] = data
+    return pettittVal, pettittMax
 
-    data.sort()
+def pettittSeasonal(data, ptPercent, applyThresh, period="seasonal"):
+    """ Pettitt test on the yearly series of each season ("seasonal") or calendar month ("monthly"),
+        or on annual means ("annual").
+        A year only counts for a season/month if at least ptPercent % of its days are valid.
+        Winter is December with the January and February after it, and belongs to the year of that
+        January (so the first winter of a record starting in January has no December).
+        Returns a list with one dictionary per season/month:
+            name, pettitt (significance), changeYear (first year after the change, missing code
+            if not significant at 5%) and years (the years in the series)"""
+    settings = getSettings()
+    missingCode = settings["globalmissingcode"]
+    thresh = settings["fixedthreshold"]
+    globalSDate = settings["globalsdate"]
 
-    for i in range(len(data)):
-        for j in range(len(data)):
-            if petMatrix[j][1] == data[i] and petMatrix[j][2] == 0:
-                petMatrix[j][2] = i + 1
+    if period == "annual":
+        groups = [("Annual", range(1, 13))]
+        nominalDays = 365
+    elif period == "seasonal":
+        groups = [("Winter", (12, 1, 2)), ("Spring", (3, 4, 5)), ("Summer", (6, 7, 8)), ("Autumn", (9, 10, 11))]
+        nominalDays = 365 / 4
+    elif period == "monthly":
+        groups = [(calendar.month_name[month], (month,)) for month in range(1, 13)]
+        nominalDays = 365 / 12
+    else:
+        raise ValueError("period must be 'annual', 'seasonal' or 'monthly'")
+
+    data = np.asarray(data, dtype=float)
+    years, months = calendarIndex(len(data), globalSDate)
+    valid = validMask(data, applyThresh, missingCode, thresh)
+    startYear = years[0] if len(data) > 0 else globalSDate.year
+    ## December counts towards the following year's winter
+    seasonYears = years + (months == 12) if period == "seasonal" else years
+    nYears = (seasonYears.max() - startYear + 1) if len(data) > 0 else 0
+
+    results = []
+    for name, groupMonths in groups:
+        inGroup = valid & np.isin(months, groupMonths)
+        yearIndex = seasonYears[inGroup] - startYear
+        total = np.bincount(yearIndex, weights=data[inGroup], minlength=nYears)
+        count = np.bincount(yearIndex, minlength=nYears)
+        keep = (count >= ptPercent / 100 * nominalDays) & (count > 0)
+        seriesYears = (np.flatnonzero(keep) + startYear).tolist()
+
+        result = {"name": name, "pettitt": missingCode, "changeYear": missingCode, "years": seriesYears}
+        if len(seriesYears) >= 5:
+            pettittVal, maxPos = pettittStatistic(total[keep] / count[keep])
+            result["pettitt"] = pettittVal
+            if pettittVal < 0.05 and maxPos is not None:
+                result["changeYear"] = seriesYears[maxPos + 1]
+        results.append(result)
+
+    return results
+
+## Streaming quality control
+## The functions below read the file a chunk at a time and keep running totals, so memory use
+## does not grow with the file (useful for very long concatenated ensemble outputs).
+## Results match the in-memory functions above, apart from rounding in the last decimal places.
+
+defaultChunkSize = 1 << 20 ## Values read at a time
+
+def readChunks(filePath, chunkSize=defaultChunkSize):
+    """Yields the values of a single column data file as arrays of at most chunkSize values"""
+    with open(filePath, "r") as file:
+        while True:
+            lines = list(islice(file, chunkSize))
+            if len(lines) == 0:
+                return
+            #Blank lines are skipped, as np.loadtxt does
+            lines = [line for line in lines if line.strip() != ""]
+            if len(lines) > 0:
+                yield np.loadtxt(lines, ndmin=1)
+
+def streamStatistics(filePath, applyThresh, chunkSize=defaultChunkSize):
+    """ Single pass over the file keeping online accumulators.
+        Returns a dictionary with the counts, sum, Welford mean and variance (population), min, max,
+        largest adjacent difference, per weekday sums / counts / means / standard deviations and
+        annual totals / counts for the Pettitt test"""
+    settings = getSettings()
+    missingCode = settings["globalmissingcode"]
+    thresh = settings["fixedthreshold"]
+    globalSDate = settings["globalsdate"]
 
-    sum = 0
-    for i in range(len(data)):
-        sum += petMatrix[i][2]
-        petMatrix[i][3] = (2 * sum) - ((i + 1) * (len(data) + 1))
+    totalCount = missingCount = threshCount = 0
+    dataSum = 0.0
+    count, mean, M2 = 0, 0.0, 0.0
+    dataMin = np.inf
+    dataMax = -np.inf
+    dayCount, dayMean, dayM2 = np.zeros(7), np.zeros(7), np.zeros(7)
+    daySum = np.zeros(7)
+    annualTotal = np.zeros(0)
+    annualCount = np.zeros(0, dtype=int)
+    ## Largest adjacent difference, carried over chunk boundaries
+    lastKeptValue = missingCode
+    maxDifference = -9999
+    maxDiffVal1 = maxDiffVal2 = missingCode
+
+    for data in readChunks(filePath, chunkSize):
+        n = len(data)
+        missingCount += int(np.count_nonzero(data == missingCode))
+        threshCount += int(np.count_nonzero(validMask(data, True, missingCode, thresh)))
+        valid = validMask(data, applyThresh, missingCode, thresh)
+        validData = data[valid]
+
+        if len(validData) > 0:
+            ## Running total added in order, so the mean is the same as qualityCheck's
+            dataSum = np.cumsum(np.concatenate(([dataSum], validData)))[-1]
+            count, mean, M2 = mergeMoments(count, mean, M2, len(validData), validData.mean(), ((validData - validData.mean()) ** 2).sum())
+            dataMin = min(dataMin, validData.min())
+            dataMax = max(dataMax, validData.max())
+
+        ## Weekday accumulators
+        days = (globalSDate.weekday() + totalCount + np.arange(n)) % 7
+        chunkDayCount = np.bincount(days[valid], minlength=7)
+        chunkDaySum = np.bincount(days[valid], weights=validData, minlength=7)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            chunkDayMean = np.where(chunkDayCount > 0, chunkDaySum / np.maximum(chunkDayCount, 1), 0.0)
+        chunkDayM2 = np.bincount(days[valid], weights=(validData - chunkDayMean[days[valid]]) ** 2, minlength=7)
+        daySum += chunkDaySum
+        dayCount, dayMean, dayM2 = mergeMoments(dayCount, dayMean, dayM2, chunkDayCount, chunkDayMean, chunkDayM2)
+
+        ## Annual accumulators
+        years = calendarIndex(n, np.datetime64(globalSDate, 'D') + totalCount)[0] - globalSDate.year
+        chunkTotal = np.bincount(years[valid], weights=validData, minlength=years[-1] + 1)
+        chunkCount = np.bincount(years[valid], minlength=years[-1] + 1)
+        if len(chunkTotal) > len(annualTotal):
+            annualTotal = np.concatenate((annualTotal, np.zeros(len(chunkTotal) - len(annualTotal))))
+            annualCount = np.concatenate((annualCount, np.zeros(len(chunkCount) - len(annualCount), dtype=int)))
+        annualTotal[:len(chunkTotal)] += chunkTotal
+        annualCount[:len(chunkCount)] += chunkCount
+
+        ## Largest adjacent difference, as in checkData but starting from the last value kept in the previous chunk
+        kept = data > thresh if applyThresh else np.ones(n, dtype=bool)
+        lastKept = np.maximum.accumulate(np.where(kept, np.arange(n), -1))
+        prevIndex = np.empty(n, dtype=int)
+        prevIndex[0] = -1
+        prevIndex[1:] = lastKept[:-1]
+        prevValue = np.where(prevIndex >= 0, data[prevIndex], lastKeptValue)
+        compared = np.flatnonzero((prevValue != missingCode) & valid)
+        differences = np.abs(prevValue[compared] - data[compared])
+        if len(compared) > 0:
+            for i in np.flatnonzero(differences >= differences.max() - 0.001):
+                if differences[i] > maxDifference:
+                    maxDifference = round(differences[i], 4) #Floating point calc
+                    maxDiffVal1 = prevValue[compared[i]]
+                    maxDiffVal2 = data[compared[i]]
+        if lastKept[-1] >= 0:
+            lastKeptValue = data[lastKept[-1]]
+
+        totalCount += n
+
+    hasDays = dayCount > 0
+    return {
+        "missingCode": missingCode,
+        "thresh": thresh,
+        "totalCount": totalCount,
+        "missingCount": missingCount,
+        "okCount": totalCount - missingCount,
+        "threshCount": threshCount,
+        "count": int(count),
+        "sum": dataSum,
+        "mean": float(mean) if count > 0 else missingCode,
+        "variance": float(M2 / count) if count > 0 else missingCode,
+        "min": dataMin if count > 0 else missingCode,
+        "max": dataMax if count > 0 else missingCode,
+        "maxDifference": maxDifference,
+        "maxDiffVal1": maxDiffVal1,
+        "maxDiffVal2": maxDiffVal2,
+        "daySums": daySum,
+        "dayCounts": dayCount.astype(int),
+        "dayMeans": np.where(hasDays, dayMean, missingCode),
+        "daySD": np.where(hasDays, np.sqrt(dayM2 / np.maximum(dayCount, 1)), missingCode),
+        "annualTotals": annualTotal,
+        "annualCounts": annualCount,
+    }
+
+def streamingQualityCheck(filePath, applyThresh, ptPercent, chunkSize=defaultChunkSize):
+    """qualityCheck for a file too big to load, returns the same values in the same order"""
+    stats = streamStatistics(filePath, applyThresh, chunkSize)
+    missingCode = stats["missingCode"]
 
-    petMatrix[:, 3] = np.abs(petMatrix[:, 3])
+    #Calculate mean
+    if applyThresh and stats["threshCount"] > 0:
+        mean = round(stats["sum"] / stats["threshCount"], 4)
+    elif stats["okCount"] > 0:
+        mean = round(stats["sum"] / stats["okCount"], 4)
+    else:
+        mean = missingCode
 
-    pettittVal = round(2 * np.e ** ((-6 * max(petMatrix[:, 3]) ** 2) / ((len(data) ** 3) + (len(data) ** 2))), 5)
-    
+    if len(stats["annualTotals"]) > 0:
+        startYear = getSettings()["globalsdate"].year
+        pettitVal, pettittMax = pettittAnnual(stats["annualTotals"], stats["annualCounts"], ptPercent, startYear, missingCode)
+    else:
+        pettitVal = pettittMax = missingCode
 
-    settings = getSettings()
-    missingCode = settings["globalmissingcode"]
-    pettittMax = missingCode
+    return (stats["min"], stats["max"], mean, stats["totalCount"], stats["missingCount"], stats["okCount"],
+            stats["maxDifference"], stats["maxDiffVal1"], stats["maxDiffVal2"], stats["threshCount"],
+            pettitVal, pettittMax, missingCode, stats["thresh"])
 
-    if pettittVal < 0.05:
-        for i in range(len(petMatrix[:, 3])):
-            if petMatrix[i, 3] == max(petMatrix[:, 3]):
-                maxPos = i
-                break
-        pettittMax = petMatrix[maxPos, 0] + startYear
+def streamingDailyMeans(filePath, applyThresh, chunkSize=defaultChunkSize):
+    """dailyMeans for a file too big to load"""
+    stats = streamStatistics(filePath, applyThresh, chunkSize)
+    output = ""
+    for i in range(7):
+        output += str(calendar.day_name[i]) + ": Mean: " + str(round(stats["dayMeans"][i], 2)) + " SD: " + str(round(stats["daySD"][i], 2)) + "\n"
+    return output
 
-    return pettittVal, pettittMax
+def streamingOutliers(filePath, outlierFile, sdFilterValue, applyThresh, chunkSize=defaultChunkSize):
+    """ getOutliers for a file too big to load. The first pass finds the mean and standard deviation,
+        the second writes out the outliers chunk by chunk"""
+    stats = streamStatistics(filePath, applyThresh, chunkSize)
+    missingCode = stats["missingCode"]
+    thresh = stats["thresh"]
+
+    outlierCount = 0
+    with open(outlierFile, "w") as file:
+        if stats["count"] > 0:
+            sdFilter = np.sqrt(stats["variance"]) * sdFilterValue
+            mean = stats["mean"]
+            offset = 0
+            for data in readChunks(filePath, chunkSize):
+                outlierMask = validMask(data, applyThresh, missingCode, thresh) & ((data > (mean + sdFilter)) | (data < (mean - sdFilter)))
+                index = (np.flatnonzero(outlierMask) + 1 + offset).tolist()
+                outliers = data[outlierMask].tolist()
+                file.write("".join(str(index[i]) + (" " * (30 - len(str(index[i])))) + str(outliers[i]) + "\n" for i in range(len(outliers))))
+                outlierCount += len(outliers)
+                offset += len(data)
+
+    return str(outlierCount) + " outliers identified and written to file."
+
+## Columns of the batch report, in order
+## Every ChangeYear is the calendar year the change is to (the first year after it), whichever years
+## are left out for too few values; a winter's year is that of its January
+seasonNames = ["Winter", "Spring", "Summer", "Autumn"]
+reportColumns = (["file", "totalCount", "missingCount", "missingPercent", "minimum", "maximum", "mean",
+                  "maxDifference", "maxDiffValue1", "maxDiffValue2", "thresholdCount", "pettitt", "pettittChangeYear"]
+                 + [season.lower() + column for season in seasonNames for column in ("Pettitt", "ChangeYear")]
+                 + ["outliers"] + [day.lower() + "Mean" for day in calendar.day_name] + ["error"])
+
+def qcSummary(job):
+    """ Quality control summary of one file as a report row (dictionary keyed by reportColumns).
+        job -> (filePath, applyThresh, ptPercent, sdFilterValue)
+        A file that cannot be checked gets a row with only its error filled in."""
+    filePath, applyThresh, ptPercent, sdFilterValue = job
+    row = dict.fromkeys(reportColumns)
+    row["file"] = os.path.basename(filePath)
+    try:
+        settings = getSettings()
+        missingCode = settings["globalmissingcode"]
+        thresh = settings["fixedthreshold"]
+        data = loadFilesIntoMemory([filePath])[0]
+
+        (dataMin, dataMax, mean, totalCount, missingCount, okCount, maxDifference, maxDiffVal1, maxDiffVal2,
+         threshCount, pettittVal, pettittMax, missingCode, thresh) = checkData(data, applyThresh, ptPercent, missingCode, thresh)
+        seasonal = pettittSeasonal(data, ptPercent, applyThresh, "seasonal")
+        dailyStats = dailyStatistics(data, applyThresh, missingCode, thresh, settings["globalsdate"])
+        outliers = findOutliers(data, sdFilterValue, applyThresh, missingCode, thresh)[1]
+    except Exception as e:
+        row["error"] = str(e) or type(e).__name__
+        return row
+
+    #Values that could not be calculated are left empty rather than given the missing code
+    available = lambda value: None if value == missingCode else float(value)
+    row.update({
+        "totalCount": totalCount,
+        "missingCount": missingCount,
+        "missingPercent": round(100 * missingCount / totalCount, 2),
+        "minimum": float(dataMin),
+        "maximum": float(dataMax),
+        "mean": available(mean),
+        "maxDifference": None if maxDifference == -9999 else float(maxDifference),
+        "maxDiffValue1": available(maxDiffVal1),
+        "maxDiffValue2": available(maxDiffVal2),
+        "thresholdCount": threshCount,
+        "pettitt": available(pettittVal),
+        "pettittChangeYear": None if pettittMax == missingCode else int(pettittMax),
+        "outliers": len(outliers),
+    })
+    for result in seasonal:
+        row[result["name"].lower() + "Pettitt"] = available(result["pettitt"])
+        row[result["name"].lower() + "ChangeYear"] = None if result["changeYear"] == missingCode else int(result["changeYear"])
+    for i, day in enumerate(calendar.day_name):
+        row[day.lower() + "Mean"] = available(round(float(dailyStats[i][2]), 4))
+    return row
+
+def sortReport(rows, sortBy="missingPercent", descending=True):
+    """ Sorts report rows on one column. Files that failed always come first so they are seen
+        straight away, rows with no value in the column come last"""
+    if sortBy not in reportColumns:
+        raise ValueError("Unknown report column: " + str(sortBy))
+    failed = [row for row in rows if row["error"] is not None]
+    checked = [row for row in rows if row["error"] is None and row[sortBy] is not None]
+    empty = [row for row in rows if row["error"] is None and row[sortBy] is None]
+    return failed + sorted(checked, key=lambda row: row[sortBy], reverse=descending) + empty
+
+def writeReport(rows, reportPath):
+    """Writes report rows as JSON if reportPath ends in .json, otherwise as CSV"""
+    if reportPath.lower().endswith(".json"):
+        with open(reportPath, "w") as f:
+            json.dump(rows, f, indent=2)
+    else:
+        with open(reportPath, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=reportColumns)
+            writer.writeheader()
+            writer.writerows(rows)
+
+def batchQualityCheck(inputDir, reportPath, applyThresh=False, ptPercent=90, sdFilterValue=3,
+                      extensions=(".dat",), processes=None, sortBy="missingPercent", descending=True):
+    """ Runs qualityCheck, the daily means, the annual and seasonal Pettitt tests and outlier detection on every file in inputDir
+        with one of the given extensions, spread over processes worker processes (default: one per CPU,
+        1 runs everything in this process).
+        One row per file is written to reportPath (CSV, or JSON for a .json path), sorted by sortBy."""
+    try:
+        inputFiles = sorted(os.path.join(inputDir, name) for name in os.listdir(inputDir)
+                            if name.lower().endswith(tuple(ext.lower() for ext in extensions)))
+    except OSError:
+        return {"error": "Input directory not found"}
+    if len(inputFiles) == 0:
+        return {"error": "No files to check"}
+    if sortBy not in reportColumns:
+        return {"error": "Unknown report column: " + str(sortBy)}
+
+    jobs = [(filePath, applyThresh, ptPercent, sdFilterValue) for filePath in inputFiles]
+    processes = min(processes or os.cpu_count() or 1, len(jobs))
+    if processes == 1:
+        rows = [qcSummary(job) for job in jobs]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            rows = list(executor.map(qcSummary, jobs))
+
+    rows = sortReport(rows, sortBy, descending)
+    writeReport(rows, reportPath)
+
+    return {
+        "error": None,
+        "rows": rows,
+        "failed": sum(1 for row in rows if row["error"] is not None),
+        "reportPath": reportPath
+    }
 
 if __name__ == '__main__':
     filePath = selectFile()
@@ -1,4 +1,5 @@
 import math
+import os
 import datetime
 import numpy as np
 import scipy.stats as stats                
@@ -53,13 +54,48 @@ def partialCorrelation(A, B, n, crossCorr, corrArrayList):
     else:
         return result / math.sqrt(denom)
 
-def correlation(predictandSelected, predictorSelected, inputs):
+def partialCorrelations(crossCorr):
+    """
+    Partial correlations between variable 0 (the predictand) and every other variable,
+    each controlling for all the remaining variables.
+    Worked out in one go from the inverse of the correlation matrix (precision matrix):
+        r0i.rest = -P[0][i] / sqrt(P[0][0] * P[i][i])
+    which gives the same answer as partialCorrelation without the exponential recursion.
+
+    Parameters:
+    - crossCorr: matrix of correlation coefficients
+
+    Returns:
+    - Array of partial correlations for variables 1..n-1, -1 where the calculation fails
+      (singular correlation matrix, e.g. a constant or duplicated variable)
+    """
+    crossCorr = np.asarray(crossCorr, dtype=float)
+    nVariables = crossCorr.shape[0]
+    if not np.all(np.isfinite(crossCorr)):
+        return np.full(nVariables - 1, -1.0)
+    try:
+        precision = np.linalg.inv(crossCorr)
+    except np.linalg.LinAlgError:
+        return np.full(nVariables - 1, -1.0)
+
+    diagonal = np.diag(precision)
+    denom = diagonal[0] * diagonal[1:]
+    result = np.full(nVariables - 1, -1.0)
+    valid = np.isfinite(denom) & (denom > 0) #Trap errors - -1 if a problem occurs
+    result[valid] = -precision[0, 1:][valid] / np.sqrt(denom[valid])
+    ## A near singular matrix can push the result just outside [-1, 1]
+    result[valid & (np.abs(result) > 1)] = -1
+    return result
+
+def correlation(predictandSelected, predictorSelected, inputs, rawData=True):
     """
     Calculates correlation and partial correlation between predictand and predictors.
     
     Parameters:
     - predictandSelected: name of the predictand file
     - predictorSelected: list of predictor file names
+    - rawData: what to return under 'rawData' - True for nested lists (as before),
+        "numpy" for the arrays themselves, False to leave the raw matrices out (lean result for the GUI)
     - settings: Dictionary containing all configuration parameters:
         - 'fSDate': Start date for analysis
         - 'fEDate': End date for analysis
@@ -114,8 +150,6 @@ def correlation(predictandSelected, predictorSelected, inputs):
         return {"error": "Predictand Error"}
     elif len(predictorSelected) < 1:
         return {"error": "Predictor Error"}
-    elif len(predictorSelected) > 12:
-        return {"error": "Predictor Error"}
     # Set up variables
     nVariables = len(predictorSelected) + 1
     
@@ -198,15 +232,14 @@ def correlation(predictandSelected, predictorSelected, inputs):
     sqresid = np.zeros(nVariables)
     prodresid = np.zeros((nVariables, nVariables))
     
-    # Calculate residuals and products
-    for i in range(totalNumbers):
-        row = inputData[i]
-        
-        if not (missingCode in row) and ((conditional and row[0] > threshold) or not conditional):
-            resid = row - xBar
-            sumresid += resid
-            sqresid += resid**2
-            prodresid += np.outer(resid, resid)
+    # Calculate residuals and products over the rows used for the means
+    validRows = ~np.any(inputData == missingCode, axis=1)
+    if conditional:
+        validRows &= inputData[:, 0] > threshold
+    resid = inputData[validRows] - xBar
+    sumresid += resid.sum(axis=0)
+    sqresid += (resid ** 2).sum(axis=0)
+    prodresid += resid.T @ resid
     
     # Calculate standard deviations
     sd = np.sqrt(sqresid / (effectiveSampleSize - 1))
@@ -220,15 +253,9 @@ def correlation(predictandSelected, predictorSelected, inputs):
     # Calculate partial correlations
     partial_correlations = []
     if nVariables >= 3:
+        allPartials = partialCorrelations(crossCorr)
         for i in range(1, nVariables):
-            corrArrayList = np.zeros(nVariables + 1)
-            arrayCount = 0
-            for j in range(1, nVariables):
-                if i != j:
-                    corrArrayList[arrayCount] = j
-                    arrayCount += 1
-            
-            tempResult = partialCorrelation(0, i, nVariables-2, crossCorr, corrArrayList)
+            tempResult = float(allPartials[i - 1])
             
             if abs(tempResult) < 0.999:
                 TTestValue = (tempResult * np.sqrt(totalNumbers - 2 - totalMissingRows - totalBelowThreshold)) / np.sqrt(1 - (tempResult ** 2))
@@ -274,14 +301,22 @@ def correlation(predictandSelected, predictorSelected, inputs):
         'crossCorrelation': crossCorr.tolist(),
         'partialCorrelations': partial_correlations,
         'means': xBar.tolist(),
-        'stddevs': sd.tolist(),
-        'rawData': {
+        'stddevs': sd.tolist()
+    }
+    if rawData == "numpy":
+        results['rawData'] = {
+            'inputData': inputData,
+            'sumResiduals': sumresid,
+            'squaredResiduals': sqresid,
+            'productResiduals': prodresid
+        }
+    elif rawData:
+        results['rawData'] = {
             'inputData': inputData.tolist(),
             'sumResiduals': sumresid.tolist(),
             'squaredResiduals': sqresid.tolist(),
             'productResiduals': prodresid.tolist()
         }
-    }
     
     return results
 
@@ -353,139 +388,92 @@ def analyseData(predictandSelected, predictorSelected, inputs):
         nVariables += 1
         predictorSelected.append("Autoregresion")
 
-    # Initialize working date to file start date
+    # Month (0-11) of every day in the fit period
+    nDays = (fEDate - fSDate).days
+    monthIndex = np.empty(nDays, dtype=int)
     workingDate = fSDate
-    lastMonth = workingDate.month - 1
-    totalNumbers = 0
-    totalFalseMissingCode = 0
+    for i in range(nDays):
+        monthIndex[i] = workingDate.month - 1
+        workingDate = increaseDate(workingDate, 1, leapYear)
 
-    # Initialize arrays for each month
-    months = [[] for _ in range(12)]
-    monthCount = np.zeros(12, dtype=int)
-    missing = np.zeros(12, dtype=int)
+    # Day by variable matrix, one column per file
+    dayData = np.column_stack([np.asarray(file[:nDays], dtype=float) for file in loadedFiles])
 
-    # Loop through each day in the date range
-    for i in range((fEDate - fSDate).days):
-        if lastMonth != workingDate.month - 1:
-            # If month changed, add missing code row for previous month
-            currentDay = np.full((1, nVariables), missingCode, dtype=float)
-            if len(months[lastMonth]) > 0:  # Only append if the month array exists
-                months[lastMonth] = np.concatenate((months[lastMonth], currentDay))
-                totalFalseMissingCode += 1
-            lastMonth = workingDate.month - 1
-        
-        totalNumbers += 1
-        monthCount[workingDate.month-1] += 1
-
-        # Extract data row for current day
-        currentDay = np.array([[file[i] for file in loadedFiles]], dtype=float)
-        
-        # If using autoregression and not the first day, add previous day's value
-        if autoRegressionTick:
-            if  i > 0:
-                # Add previous day's predictand value as an additional predictor
-                previousValue = np.array([[loadedFiles[0][i-1]]])
-                currentDay = np.concatenate((currentDay, previousValue), axis=1)
-            else:
-                currentDay = np.concatenate((currentDay, [[missingCode]]), axis=1)
-        
-        # Count missing values
-        missingCount = np.count_nonzero(currentDay == missingCode)
-        missing[workingDate.month-1] += missingCount
+    # If using autoregression, add previous day's predictand value as an additional predictor
+    if autoRegressionTick:
+        previousValue = np.empty(nDays)
+        previousValue[0] = missingCode
+        previousValue[1:] = dayData[:-1, 0]
+        dayData = np.column_stack((dayData, previousValue))
 
-        # Add row to appropriate month
-        if len(months[workingDate.month - 1]) == 0:
-            months[workingDate.month - 1] = currentDay
-        else:
-            months[workingDate.month - 1] = np.concatenate((months[workingDate.month-1], currentDay))
-        
-        # Increment the date
-        workingDate = increaseDate(workingDate, 1, leapYear)
+    # Count missing values for each month
+    missing = np.bincount(monthIndex, weights=np.count_nonzero(dayData == missingCode, axis=1), minlength=12).astype(int)
+    monthCount = np.bincount(monthIndex, minlength=12)
 
     # Apply conditional thresholding to predictand if needed
     if conditional:
-        for month in months:
-            if len(month) > 0:  # Make sure month array is not empty
-                month[:, 0] = np.where(month[:, 0] > threshold, 1, np.where(month[:, 0] != missingCode, 0, missingCode))
-        
+        dayData[:, 0] = np.where(dayData[:, 0] > threshold, 1, np.where(dayData[:, 0] != missingCode, 0, missingCode))
+
+    # Skip rows where predictand is missing, replace other missing values with zeros for calculations
+    validRows = dayData[:, 0] != missingCode
+    validMonths = monthIndex[validRows]
+    validData = np.where(dayData[validRows] == missingCode, 0, dayData[validRows])
+
+    # Grouped monthly sums, shape (12, nVariables)
+    nValid = np.bincount(validMonths, minlength=12)
+    sumData = np.zeros((12, nVariables))
+    sumDataSquared = np.zeros((12, nVariables))
+    sumDataPredictandPredictor = np.zeros((12, nVariables))
+    for i in range(nVariables):
+        sumData[:, i] = np.bincount(validMonths, weights=validData[:, i], minlength=12)
+        sumDataSquared[:, i] = np.bincount(validMonths, weights=validData[:, i] ** 2, minlength=12)
+        sumDataPredictandPredictor[:, i] = np.bincount(validMonths, weights=validData[:, i] * validData[:, 0], minlength=12)
+
     # Initialize return data array
     returnData = np.zeros((12, 4, nVariables), dtype=float)  # Changed dimensions to store stats for each variable
-    
-    # Process each month
-    for index, monthData in enumerate(months):
-        if len(monthData) == 0:
-            print("ERROR NO DATA")
-            continue  # Skip empty months
-            
-        # Initialize statistics arrays
-        sumData = np.zeros(nVariables)
-        sumDataSquared = np.zeros(nVariables)
-        sumDataPredictandPredictor = np.zeros(nVariables)
-        
-        validRows = 0
-        
-        # Calculate sums
-        for i in range(len(monthData)):
-            row = monthData[i].copy()  # Make a copy to avoid modifying original data
-            
-            # Skip rows where predictand is missing
-            if row[0] == missingCode:
-                continue
-                
-            # Replace missing values with zeros for calculations
-            row = np.array([0 if data == missingCode else data for data in row])
-            validRows += 1
-            
 
-            # Calculate sums
-            sumData += row
-            sumDataSquared += row**2
-            sumDataPredictandPredictor += row * row[0]
-        
-        # Skip month if no valid data
-        if validRows == 0:
-            continue
-            
-        # Skip calculations for the predictand itself (i=0) since it correlates perfectly with itself
-        returnData[index, 0, 0] = 1.0  # Correlation with self is 1
-        returnData[index, 1, 0] = 1.0  # R² with self is 1
-        returnData[index, 2, 0] = float('inf')  # T-statistic is infinite
-        returnData[index, 3, 0] = 0.0  # p-value is 0
-
-        denominatorY = (validRows * sumDataSquared[0]) - (sumData[0] ** 2)
-        # Calculate statistics for each variable
-        for i in range(1, nVariables):  
-            
-            # Calculate correlation coefficient
-            numerator = (validRows * sumDataPredictandPredictor[i]) - (sumData[i] * sumData[0])
-            denominatorX = (validRows * sumDataSquared[i]) - (sumData[i] ** 2)
-            
-            # Check if denominator is valid
-            if denominatorX <= 0 or denominatorY <= 0:
-                correlation = 0
-            else:
-                correlation = numerator / (np.sqrt(denominatorX) * np.sqrt(denominatorY))
-            
-            # Ensure correlation is within bounds
-            correlation = max(-1.0, min(1.0, correlation))
-            
-            # Calculate R-squared
-            Rsquared = correlation ** 2
-            
-            # Calculate T-statistic
-            if Rsquared > 0.999:
-                Tstat = 9999
-            else:
-                Tstat = (correlation * np.sqrt(validRows - 2)) / np.sqrt(1 - Rsquared)
-            
-            # Use scipy for accurate p-value calculation
-            pValue = 2 * (1 - stats.t.cdf(abs(Tstat), validRows - 2))
-            
-            # Store results
-            returnData[index, 0, i] = correlation
-            returnData[index, 1, i] = Rsquared
-            returnData[index, 2, i] = Tstat
-            returnData[index, 3, i] = pValue
+    for index in np.flatnonzero(monthCount == 0):
+        print("ERROR NO DATA")
+
+    # Skip months with no valid data
+    months = np.flatnonzero(nValid > 0)
+    n = nValid[months][:, None]
+
+    # Skip calculations for the predictand itself (i=0) since it correlates perfectly with itself
+    returnData[months, 0, 0] = 1.0  # Correlation with self is 1
+    returnData[months, 1, 0] = 1.0  # R² with self is 1
+    returnData[months, 2, 0] = float('inf')  # T-statistic is infinite
+    returnData[months, 3, 0] = 0.0  # p-value is 0
+
+    # Calculate statistics for every month and variable at once
+    sumX = sumData[months, 1:]
+    sumY = sumData[months, :1]
+    numerator = (n * sumDataPredictandPredictor[months, 1:]) - (sumX * sumY)
+    denominatorX = (n * sumDataSquared[months, 1:]) - (sumX ** 2)
+    denominatorY = (n * sumDataSquared[months, :1]) - (sumY ** 2)
+
+    # Check if denominator is valid
+    validDenominator = (denominatorX > 0) & (denominatorY > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        correlation = np.where(validDenominator, numerator / (np.sqrt(denominatorX) * np.sqrt(denominatorY)), 0.0)
+
+        # Ensure correlation is within bounds
+        correlation = np.clip(correlation, -1.0, 1.0)
+
+        # Calculate R-squared
+        Rsquared = correlation ** 2
+
+        # Calculate T-statistic
+        Tstat = np.where(Rsquared > 0.999, 9999, (correlation * np.sqrt(n - 2)) / np.sqrt(1 - Rsquared))
+
+        # Use scipy for accurate p-value calculation
+        pValue = 2 * (1 - stats.t.cdf(np.abs(Tstat), n - 2))
+
+    # Store results
+    returnData[months, 0, 1:] = correlation
+    returnData[months, 1, 1:] = Rsquared
+    returnData[months, 2, 1:] = Tstat
+    returnData[months, 3, 1:] = pValue
     
     #returnData is for every month of the year there is 4 values.
     # 0 is correlation
@@ -612,6 +600,298 @@ def scatterPlot(predictandSelected, predictorSelected, inputs):
     return {"error": "NA", "Data": inputData.T}
 
 
+def scatterRenderData(data, maxPoints=5000, mode="auto", bins=100):
+    """
+    Reduces scatterPlot output to something that draws quickly: long records are
+    either decimated to maxPoints or binned into a 2-D histogram before reaching the GUI.
+
+    Parameters:
+    - data: "Data" array from scatterPlot, row 0 predictand, row 1 predictor (or autoregression)
+    - maxPoints: point budget before the data is reduced
+    - mode: "points" (uniform decimation), "density" (2-D histogram) or "auto"
+        (every point when within the budget, density above it)
+    - bins: number of histogram bins along each axis for "density"
+
+    Returns:
+    - Dictionary with the mode used, the total number of points and either
+      x / y arrays or counts with their bin edges
+    """
+    data = np.asarray(data, dtype=float)
+    if data.ndim != 2 or data.shape[1] == 0:
+        return {"mode": "points", "x": np.empty(0), "y": np.empty(0), "total": 0, "shown": 0}
+    y = data[0]
+    x = data[-1]
+    total = len(x)
+
+    if mode == "auto":
+        mode = "points" if total <= maxPoints else "density"
+
+    if mode == "density":
+        counts, xEdges, yEdges = np.histogram2d(x, y, bins=bins)
+        return {"mode": "density", "counts": counts, "xEdges": xEdges, "yEdges": yEdges, "total": total}
+
+    # Uniform decimation, every n-th day keeps the spread across the whole record
+    step = max(1, int(np.ceil(total / maxPoints)))
+    return {"mode": "points", "x": x[::step], "y": y[::step], "total": total, "shown": len(x[::step])}
+
+def renderScatter(plotItem, renderData):
+    """
+    Draws scatterRenderData output on a pyqtgraph PlotItem, as one array scatter
+    or as a density image (log scaled counts, empty bins left transparent).
+    """
+    import pyqtgraph as pg
+    from PyQt5.QtCore import QRectF
+
+    if renderData["mode"] == "density":
+        counts = np.log1p(renderData["counts"])
+        xEdges = renderData["xEdges"]
+        yEdges = renderData["yEdges"]
+        lut = pg.colormap.get("viridis").getLookupTable(nPts=256, alpha=True)
+        lut[0, 3] = 0
+        image = pg.ImageItem(counts)
+        image.setLookupTable(lut)
+        image.setLevels((0, max(counts.max(), 1)))
+        image.setRect(QRectF(xEdges[0], yEdges[0], xEdges[-1] - xEdges[0], yEdges[-1] - yEdges[0]))
+        plotItem.addItem(image)
+        return image
+
+    scatter = pg.ScatterPlotItem(size=6, pen=None, brush=pg.mkBrush(255, 255, 255, 120))
+    scatter.setData(x=renderData["x"], y=renderData["y"])
+    plotItem.addItem(scatter)
+    return scatter
+
+def screenPredictors(predictandSelected, predictorDir, inputs, rankBy='meanRSQD', processes=1):
+    """
+    Screens every predictor file in a directory against the predictand in one batched pass
+    and returns them ranked, so predictors don't have to be picked by trial and error.
+
+    Parameters:
+    - predictandSelected: list holding the predictand file (as for correlation)
+    - predictorDir: directory of predictor .dat files
+    - inputs: same user choices as correlation / analyseData
+    - rankBy: column to rank on (largest absolute value first):
+        'meanRSQD', 'correlation' or 'partialCorrelation'
+    - processes: number of worker processes for the monthly explained variance, 1 runs in process
+
+    Returns:
+    - Dictionary with the ranked table in 'ranking', one row per predictor
+    """
+    try:
+        predictorFiles = sorted(path for path in (os.path.join(predictorDir, name) for name in os.listdir(predictorDir))
+                                if path.lower().endswith(".dat") and os.path.isfile(path))
+    except OSError:
+        return {"error": "Predictor directory not found"}
+    if len(predictorFiles) < 1:
+        return {"error": "No predictor files found"}
+
+    # Skip files that don't cover the fit period (e.g. stray test files) rather than failing the whole screen
+    settings = getSettings()
+    fEDate = inputs.get('fEDate')
+    if settings["thirtyDay"]:
+        fEDate = thirtyDate(fEDate.year, fEDate.month, fEDate.day)
+    requiredLength = (fEDate - settings["globalsdate"]).days
+    skipped = []
+    for file in list(predictorFiles):
+        with open(file) as f:
+            if sum(1 for line in f if line.strip()) < requiredLength:
+                skipped.append(file)
+                predictorFiles.remove(file)
+    if len(predictorFiles) < 1:
+        return {"error": "No predictor files found"}
+    if rankBy not in ('meanRSQD', 'correlation', 'partialCorrelation'):
+        return {"error": "Unknown ranking"}
+
+    # Correlation and partial correlation of every predictor, controlling for all the others
+    corrResults = correlation(predictandSelected, predictorFiles, inputs, rawData=False)
+    if corrResults["error"] != "NA":
+        return {"error": corrResults["error"]}
+
+    # Monthly explained variance, each predictor is independent so the pool can be split across processes
+    analysisInputs = dict(inputs, autoRegressionTick=False)
+    processes = max(1, min(processes, len(predictorFiles)))
+    chunks = [predictorFiles[i::processes] for i in range(processes)]
+    if processes == 1:
+        analysisResults = [analyseData(predictandSelected, chunks[0], analysisInputs)]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            analysisResults = list(executor.map(analyseData, [predictandSelected] * processes, chunks, [analysisInputs] * processes))
+    for result in analysisResults:
+        if result["error"] is not None:
+            return {"error": result["error"]}
+
+    sigLevel = inputs.get('sigLevelInput', 0.05)
+    RSQD = {}
+    pr = {}
+    for chunk, result in zip(chunks, analysisResults):
+        for i, file in enumerate(chunk):
+            RSQD[file] = [result["RSQD"][mm][i + 1] for mm in range(12)]
+            pr[file] = [result["pr"][mm][i + 1] for mm in range(12)]
+
+    partials = corrResults['partialCorrelations']
+    ranking = []
+    for i, file in enumerate(predictorFiles):
+        # Only significant months count towards the explained variance, as in the analysis table
+        significantRSQD = [RSQD[file][mm] if pr[file][mm] <= sigLevel else 0 for mm in range(12)]
+        ranking.append({
+            'file': file,
+            'name': os.path.basename(file),
+            'correlation': corrResults['crossCorrelation'][0][i + 1],
+            'partialCorrelation': partials[i]['correlation'] if partials else corrResults['crossCorrelation'][0][i + 1],
+            'partialPValue': partials[i]['p_value'] if partials else None,
+            'meanRSQD': sum(significantRSQD) / 12,
+            'significantMonths': sum(1 for mm in range(12) if pr[file][mm] <= sigLevel),
+            'RSQD': RSQD[file],
+            'pr': pr[file]
+        })
+    ranking.sort(key=lambda row: abs(row[rankBy]), reverse=True)
+    for rank, row in enumerate(ranking):
+        row['rank'] = rank + 1
+
+    return {
+        "error": None,
+        "PTandFile": predictandSelected,
+        "PredictorDir": predictorDir,
+        "FSDate": inputs.get('fSDate'),
+        "FEDate": inputs.get('fEDate'),
+        "SigLevel": sigLevel,
+        "RankBy": rankBy,
+        "periodName": corrResults['analysisPeriod']['periodName'],
+        "ranking": ranking,
+        "skipped": skipped
+    }
+
+
+def laggedCorrelationScan(predictandSelected, predictorSelected, inputs, maxLag=10, periods=(0, 1, 2, 3, 4)):
+    """
+    Correlation between the predictand and each predictor shifted by -maxLag ... +maxLag days,
+    for each analysis period, to find the lead / lag of a predictor that best explains the predictand.
+    A positive lag pairs the predictand on day t with the predictor on day t - lag (predictor leads).
+
+    Every lag comes from the same six masked cross-correlation sums (n, Sx, Sy, Sxx, Syy, Sxy),
+    worked out for all lags and all predictors at once with FFTs. Pairs where either value is the
+    missing code (or, for conditional, the predictand is at or below the threshold) are left out.
+
+    Parameters:
+    - predictandSelected: list holding the predictand file
+    - predictorSelected: list of predictor files
+    - inputs: same user choices as correlation ('fSDate', 'fEDate', 'conditional')
+    - maxLag: largest lag in days, in either direction
+    - periods: analysis period indices (0 annual, 1-4 seasons, 5-16 months)
+
+    Returns:
+    - Dictionary with the correlation at every lag and the best lag per predictor and period
+    """
+    settings = getSettings()
+    analysisPeriod = ["Annual", "Winter", "Spring", "Summer", "Autumn", "January", "February", "March", "April", "May", "June", "July", "August", "September", "October", "November", "December"]
+
+    #from settings
+    leapYear = settings["leapYear"]
+    thirtyDay = settings["thirtyDay"]
+    threshold = settings["fixedthreshold"]
+    missingCode = settings["globalmissingcode"]
+    globalSDate = settings["globalsdate"]
+
+    #from user choices
+    fSDate = inputs.get('fSDate')
+    fEDate = inputs.get('fEDate')
+    if thirtyDay:
+        fSDate = thirtyDate(fSDate.year, fSDate.month, fSDate.day)
+        fEDate = thirtyDate(fEDate.year, fEDate.month, fEDate.day)
+    conditional = inputs.get('conditional', False)
+
+    if not predictandSelected or not predictandSelected[0]:
+        return {"error": "Predictand Error"}
+    elif len(predictorSelected) < 1:
+        return {"error": "Predictor Error"}
+    elif maxLag < 0:
+        return {"error": "Lag Error"}
+
+    nDays = (fEDate - fSDate).days
+    if nDays <= maxLag:
+        return {"error": "No valid dates in time period choosen"}
+
+    loadedFiles = loadFilesIntoMemory(predictandSelected + predictorSelected)
+    loadedFiles = [np.asarray(file[(fSDate - globalSDate).days:], dtype=float)[:nDays] for file in loadedFiles]
+    if any(len(file) < nDays for file in loadedFiles):
+        return {"error": "File is too short for the time period choosen"}
+
+    # Month of every day, for the analysis period masks
+    months = np.empty(nDays, dtype=int)
+    workingDate = fSDate
+    for i in range(nDays):
+        months[i] = workingDate.month
+        workingDate = increaseDate(workingDate, 1, leapYear)
+    seasonMonths = {1: (12, 1, 2), 2: (3, 4, 5), 3: (6, 7, 8), 4: (9, 10, 11)}
+
+    y = loadedFiles[0]
+    x = np.array(loadedFiles[1:])
+    yValid = y != missingCode
+    if conditional:
+        yValid &= y > threshold
+    xValid = x != missingCode
+
+    # Centre on the valid means so the FFT sums don't lose precision to large offsets
+    yCentred = np.where(yValid, y - (y[yValid].mean() if yValid.any() else 0), 0)
+    xMeans = np.array([row[valid].mean() if valid.any() else 0 for row, valid in zip(x, xValid)])
+    xCentred = np.where(xValid, x - xMeans[:, None], 0)
+
+    # Zero padding stops the circular correlation wrapping round for lags up to maxLag
+    fftLength = 1 << int(np.ceil(np.log2(nDays + maxLag)))
+    xTerms = [np.fft.rfft(term, fftLength, axis=1) for term in (xValid.astype(float), xCentred, xCentred ** 2)]
+    lags = np.arange(-maxLag, maxLag + 1)
+
+    def crossSums(yTerm, xTerm):
+        # sum over t of yTerm[t] * xTerm[t - lag], for every lag at once
+        full = np.fft.irfft(np.fft.rfft(yTerm, fftLength)[None, :] * np.conj(xTerm), fftLength, axis=1)
+        return full[:, lags % fftLength]
+
+    nameOfFiles = displayFiles(predictorSelected)
+    correlations = {name: {} for name in nameOfFiles}
+    bestLag = {name: {} for name in nameOfFiles}
+    for period in periods:
+        if period == 0:
+            inPeriod = np.ones(nDays, dtype=bool)
+        elif period in seasonMonths:
+            inPeriod = np.isin(months, seasonMonths[period])
+        else:
+            inPeriod = months == period - 4
+        yMask = (yValid & inPeriod).astype(float)
+        yMasked = yCentred * yMask
+
+        n = np.rint(crossSums(yMask, xTerms[0]))  # counts are whole numbers
+        sumY = crossSums(yMasked, xTerms[0])
+        sumYY = crossSums(yMasked * yMasked, xTerms[0])
+        sumX = crossSums(yMask, xTerms[1])
+        sumXX = crossSums(yMask, xTerms[2])
+        sumXY = crossSums(yMasked, xTerms[1])
+
+        numerator = (n * sumXY) - (sumX * sumY)
+        denominatorX = (n * sumXX) - (sumX ** 2)
+        denominatorY = (n * sumYY) - (sumY ** 2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r = np.where((n > 2) & (denominatorX > 0) & (denominatorY > 0), numerator / np.sqrt(denominatorX * denominatorY), np.nan)
+        r = np.clip(r, -1.0, 1.0)
+
+        for i, name in enumerate(nameOfFiles):
+            correlations[name][analysisPeriod[period]] = r[i].tolist()
+            if np.all(np.isnan(r[i])):
+                bestLag[name][analysisPeriod[period]] = {"lag": None, "correlation": None, "n": 0}
+            else:
+                best = int(np.nanargmax(np.abs(r[i])))
+                bestLag[name][analysisPeriod[period]] = {"lag": int(lags[best]), "correlation": float(r[i, best]), "n": int(n[i, best])}
+
+    return {
+        "error": None,
+        "PTandFile": predictandSelected,
+        "FSDate": inputs.get('fSDate'),
+        "FEDate": inputs.get('fEDate'),
+        "lags": lags.tolist(),
+        "periods": [analysisPeriod[period] for period in periods],
+        "names": nameOfFiles,
+        "correlations": correlations,
+        "bestLag": bestLag
+    }
 
 
 def formatCorrelationResults(results):
@@ -977,6 +1257,83 @@ class AnalysisResultsApp(QMainWindow):
         tableWidget = createAnalysisResultsTableWidget(results)
         self.tabWidget.addTab(tableWidget, "Table View")
 
+def formatScreeningResults(data):
+    """
+    Format the ranked predictor table from screenPredictors.
+    """
+    results = []
+    results.append("RESULTS: PREDICTOR SCREENING")
+    results.append("")
+    results.append(f"Analysis Period: {data['FSDate']} - {data['FEDate']} ({data['periodName']})")
+    results.append(f"Significance level: {data['SigLevel']}")
+    results.append(f"Predictand: {displayFiles(data['PTandFile'])[0]}")
+    results.append(f"Predictor directory: {data['PredictorDir']}")
+    results.append(f"Ranked by: {data['RankBy']}")
+    if data['skipped']:
+        results.append(f"Skipped (too short for fit period): {', '.join(displayFiles(data['skipped']))}")
+    results.append("")
+
+    maxNameLength = max(len(row['name']) for row in data['ranking'] + [{'name': "Predictor"}])
+    results.append(f"{'Rank':<6}{'Predictor':<{maxNameLength + 2}}{'r':>9}{'Partial r':>11}{'P value':>10}{'Mean R²':>9}{'Sig months':>12}")
+    for row in data['ranking']:
+        pValue = f"{row['partialPValue']:.3f}" if row['partialPValue'] is not None else ""
+        results.append(f"{row['rank']:<6}{row['name']:<{maxNameLength + 2}}{row['correlation']:>9.3f}{row['partialCorrelation']:>11.3f}"
+                       f"{pValue:>10}{row['meanRSQD']:>9.3f}{row['significantMonths']:>12}")
+
+    return "\n".join(results)
+
+class ScreeningResultsApp(QMainWindow):
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("Predictor Screening")
+        self.resize(900, 600)
+
+        self.textWidget = QTextEdit()
+        self.textWidget.setReadOnly(True)
+        self.textWidget.setFont(QFont("Courier New", 10))
+        self.setCentralWidget(self.textWidget)
+
+    def loadResults(self, results):
+        self.textWidget.setPlainText(formatScreeningResults(results))
+
+def formatLaggedCorrelationResults(data):
+    """
+    Format the best lag per predictor and period from laggedCorrelationScan.
+    """
+    results = []
+    results.append("RESULTS: LAGGED CORRELATION")
+    results.append("")
+    results.append(f"Analysis Period: {data['FSDate']} - {data['FEDate']}")
+    results.append(f"Predictand: {displayFiles(data['PTandFile'])[0]}")
+    results.append(f"Lags: {data['lags'][0]} to {data['lags'][-1]} days (positive = predictor leads)")
+    results.append("")
+
+    maxNameLength = max(len(name) for name in data['names'] + ["Predictors:"])
+    results.append(f"{'Predictors:':<{maxNameLength + 2}}" + "".join(f"{period:>16}" for period in data['periods']))
+    for name in data['names']:
+        line = f"{name:<{maxNameLength + 2}}"
+        for period in data['periods']:
+            best = data['bestLag'][name][period]
+            cell = f"{best['lag']:+d} ({best['correlation']:.3f})" if best['lag'] is not None else "N/A"
+            line += f"{cell:>16}"
+        results.append(line)
+
+    return "\n".join(results)
+
+class LaggedCorrelationApp(QMainWindow):
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("Lagged Correlation")
+        self.resize(900, 600)
+
+        self.textWidget = QTextEdit()
+        self.textWidget.setReadOnly(True)
+        self.textWidget.setFont(QFont("Courier New", 10))
+        self.setCentralWidget(self.textWidget)
+
+    def loadResults(self, results):
+        self.textWidget.setPlainText(formatLaggedCorrelationResults(results))
+
 # Run the application
 """if __name__ == "__main__":
     app = QApplication(sys.argv)
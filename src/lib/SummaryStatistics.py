@@ -0,0 +1,537 @@
+import datetime
+import numpy as np
+
+## Summary statistics worked out while the weather generator runs
+## A StatisticsSink is fed the synthesised values a block of days at a time (see generateWeather) and
+## keeps running totals for every ensemble member and period, so the daily output does not have to be
+## written out and read back by the Summary Statistics screen.
+## The statistics, their order and the way each one is worked out follow calc_stats in the Summary
+## Statistics screen, including its quirks (e.g. POT / PBT count values over / under the pot / pbt
+## values themselves). Values are rounded to the 3 decimal places of the output file first.
+## Periods are Jan..Dec, Winter..Autumn, Annual; a period is split into sections (each January, each
+## winter, each year) wherever the month, season or year changes, as calc_stats marks them.
+## Everything is a running total except the median / percentile statistics (Median, IQR, Percentile,
+## PrecPOT, PrecPOTPercent), which need every value of the run: the rounded values are kept in memory
+## (8 bytes per day per member, about 29MB for 100 members over 100 years) only when one of them is
+## selected. They are not in defaultStatistics for that reason.
+
+statNames = [
+    "Mean", "Maximum", "Minimum", "Median", "Variance", "IQR", "POT", "PBT", "Percentile", "Sum",
+    "ACF", "Skewness", "MaxNDayTotal", "Count", "WetDayPercent", "MeanDrySpell", "MeanWetSpell",
+    "MaxDrySpell", "MaxWetSpell", "SDWetSpell", "SDDrySpell", "PrecPOT", "PrecPOTPercent",
+    "ExtremeRange", "MinRange", "MeanWetDayPers", "MeanDryDayPers", "CorrSpellLength",
+    "MedianWetSpell", "MedianDrySpell",
+]
+periodLabels = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec",
+                "Winter", "Spring", "Summer", "Autumn", "Annual"]
+defaultStatistics = ["Mean", "Maximum", "Minimum", "Variance"]
+defaultSettings = {"threshold": 0.1, "pot": 95, "pbt": 5, "percentile": 90, "precPot": 90, "nDayTotal": 5}
+
+nPeriods = 17
+annualPeriod = 16
+## Statistics (by position in statNames) that switch on wet day filtering, as in Summary Statistics
+rainStatistics = set(range(14, 24)) | set(range(26, 30))
+spellStatistics = set(range(15, 21)) | set(range(25, 30))
+percentileStatistics = {3, 5, 8, 21, 22}
+
+def columnSums(values):
+    """Sums down the columns, added up in order so they are the same however many members a sink has"""
+    return np.cumsum(values, axis=0)[-1] if len(values) > 0 else np.zeros(values.shape[1:])
+
+def mergeMoments(count, mean, M2, newCount, newMean, newM2, M3=None, newM3=None):
+    """ Combines two sets of (count, mean, sum of squared deviations) - Welford's update applied to
+        a whole chunk at once (Chan et al.). Works elementwise on arrays too.
+        With M3 / newM3 (sums of cubed deviations, Pebay's update) those are combined as well.
+        Returns (count, mean, M2) or (count, mean, M2, M3). Also used by QualityControl"""
+    total = count + newCount
+    safeTotal = np.maximum(total, 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        delta = newMean - mean
+        mergedMean = np.where(total > 0, mean + delta * newCount / safeTotal, 0.0)
+        mergedM2 = M2 + newM2 + np.where(total > 0, delta ** 2 * count * newCount / safeTotal, 0.0)
+        if M3 is None:
+            return total, mergedMean, mergedM2
+        mergedM3 = (M3 + newM3 + delta ** 3 * count * newCount * (count - newCount) / safeTotal ** 2
+                    + 3 * delta * (count * newM2 - newCount * M2) / safeTotal)
+    return total, mergedMean, mergedM2, mergedM3
+
+def maskedMoments(values, mask):
+    """Count, mean and sums of squared and cubed deviations of each column's values where mask is set"""
+    count = mask.sum(axis=0)
+    mean = columnSums(np.where(mask, values, 0.0)) / np.maximum(count, 1)
+    deviation = np.where(mask, values - mean, 0.0)
+    return count, mean, columnSums(deviation ** 2), columnSums(deviation ** 3)
+
+def vbaPercentile(sortedValues, count, ptile):
+    """ Percentile as Summary Statistics works it out, of each column's first count sorted values
+        (count > 0)"""
+    position = 1 + (ptile * (count - 1) / 100)
+    lower = position.astype(int)
+    upper = np.minimum(lower + 1, count)
+    proportion = position - lower
+    lowerValue = np.take_along_axis(sortedValues, np.minimum(lower, count)[None] - 1, axis=0)[0]
+    upperValue = np.take_along_axis(sortedValues, upper[None] - 1, axis=0)[0]
+    #Columns without values (infinity) come out as NaN
+    with np.errstate(invalid='ignore'):
+        return np.where(lower >= count, lowerValue, lowerValue + ((upperValue - lowerValue) * proportion))
+
+def periodDays(startDate, first, nDays):
+    """Period rows (months 0-11, seasons 12-15) and years of nDays consecutive days from day first of the run"""
+    dates = np.datetime64(startDate, 'D') + first + np.arange(nDays)
+    months = dates.astype('datetime64[M]').astype(int) % 12
+    years = dates.astype('datetime64[Y]').astype(int) + 1970
+    seasons = 12 + ((months + 1) % 12) // 3
+    return months, seasons, years
+
+class StatisticsSink:
+    """
+    Running summary statistics of a weather generator run, per ensemble member and period
+    statistics -> names (see statNames) to report, settings -> threshold, pot, pbt, percentile, precPot, nDayTotal
+    Selecting a median / percentile statistic keeps every value of the run in memory (see keepValues)
+    """
+
+    def __init__(self, startDate, ensembleSize, missingCode, statistics=None, settings=None):
+        self.startDate = startDate
+        self.ensembleSize = ensembleSize
+        self.missingCode = missingCode
+        self.statistics = list(defaultStatistics if statistics is None else statistics)
+        unknown = [name for name in self.statistics if name not in statNames]
+        if unknown:
+            raise ValueError(f"Unknown statistics: {', '.join(unknown)}")
+        self.settings = dict(defaultSettings, **(settings or {}))
+        if self.settings["nDayTotal"] < 1:
+            raise ValueError("N-Day Total must be at least 1.")
+        wanted = {statNames.index(name) for name in self.statistics}
+        self.rainYes = bool(wanted & rainStatistics)
+        self.doSpells = self.rainYes and bool(wanted & spellStatistics)
+        self.keepValues = bool(wanted & percentileStatistics)
+        self.nDays = 0
+        self.closed = False
+
+        shape = (ensembleSize, nPeriods)
+        self.anyValid = np.zeros(shape, dtype=bool)
+        self.total = np.zeros(shape)
+        self.minimum = np.full(shape, np.inf)
+        self.maximum = np.full(shape, -np.inf)
+        self.potCount = np.zeros(shape, dtype=int)
+        self.pbtCount = np.zeros(shape, dtype=int)
+        self.dryCount = np.zeros(shape, dtype=int)
+        self.moments = [np.zeros(shape, dtype=int), np.zeros(shape), np.zeros(shape), np.zeros(shape)]
+        self.extremeRange = np.full(shape, -np.inf)
+        self.minRange = np.full(shape, np.inf)
+        self.yearCount = np.zeros(shape, dtype=int)
+        self.nDayMax = np.zeros(shape)
+        ## Lag one pairs: count, x mean, y mean, sums of squared x and y deviations and of their products
+        self.pairs = [np.zeros(shape, dtype=int)] + [np.zeros(shape) for _ in range(5)]
+        ## Spell length counts, [member, period, length], grown as longer spells turn up
+        self.wetSpells = np.zeros(shape + (2,), dtype=int)
+        self.drySpells = np.zeros(shape + (2,), dtype=int)
+        self.storedValues = []
+
+        ## The section still open at the end of the last block, per period
+        self.lastDay = np.full(nPeriods, -2)
+        self.lastYear = np.zeros(nPeriods, dtype=int)
+        self.sectionMax = np.full(shape, -np.inf)
+        self.sectionMin = np.full(shape, np.inf)
+        self.sectionValid = np.zeros(shape, dtype=bool)
+        self.nDayTail = [None] * nPeriods
+        self.lastRow = [None] * nPeriods
+        self.spellCode = np.full(shape, -1)
+        self.spellLength = np.zeros(shape, dtype=int)
+
+        self.memberValues = None
+        self.memberYears = None
+
+    def forMembers(self, count):
+        """New, empty sink with the same settings for count members (e.g. for a worker process)"""
+        return StatisticsSink(self.startDate, count, self.missingCode, self.statistics, self.settings)
+
+    def runningTotals(self):
+        """ Everything but the kept values, for a checkpoint (see synthesiseMembers, which saves the kept
+            values to a side file as they come in)"""
+        return {key: value for key, value in vars(self).items() if key != "storedValues"}
+
+    def restore(self, totals, storedValues=()):
+        """Takes the running totals saved in a checkpoint and the values kept up to then"""
+        self.__dict__.update(totals)
+        self.storedValues = list(storedValues)
+
+    def add(self, first, values):
+        """Adds the values (days x members) of the days from day first of the run"""
+        if self.closed:
+            raise RuntimeError("Statistics sink is already closed.")
+        values = np.round(np.array(values, dtype=float), 3)
+        missing = np.isnan(values) | (np.abs(values - self.missingCode) < 1e-9)
+        values[missing] = self.missingCode
+        nDays = len(values)
+        if nDays == 0:
+            return
+        self.nDays = max(self.nDays, first + nDays)
+        if self.keepValues:
+            self.storedValues.append((first, values))
+
+        days = first + np.arange(nDays)
+        months, seasons, years = periodDays(self.startDate, first, nDays)
+        for period in range(nPeriods):
+            if period == annualPeriod:
+                rows = np.arange(nDays)
+            else:
+                rows = np.flatnonzero((months if period < 12 else seasons) == period)
+            if len(rows) > 0:
+                self.addPeriod(period, days[rows], years[rows], values[rows], missing[rows])
+
+    def addPeriod(self, period, days, years, values, missing):
+        settings = self.settings
+        threshold = settings["threshold"]
+        valid = ~missing
+        kept = valid & (values > threshold) if self.rainYes else valid
+        keptValues = np.where(kept, values, 0.0)
+
+        #A new section wherever the period's days aren't consecutive (or the year changes for Annual)
+        starts = np.zeros(len(days), dtype=bool)
+        starts[1:] = np.diff(days) != 1
+        if period == annualPeriod:
+            starts[1:] |= np.diff(years) != 0
+        continues = self.lastDay[period] == days[0] - 1 and (period != annualPeriod or self.lastYear[period] == years[0])
+        if not continues:
+            self.closeSection(period)
+            starts[0] = True
+        self.lastDay[period] = days[-1]
+        self.lastYear[period] = years[-1]
+        section = np.cumsum(starts)
+
+        ## Simple statistics, the sum is added up in order as Summary Statistics does
+        self.anyValid[:, period] |= valid.any(axis=0)
+        self.total[:, period] = np.cumsum(np.vstack((self.total[None, :, period], keptValues)), axis=0)[-1]
+        self.minimum[:, period] = np.minimum(self.minimum[:, period], np.where(kept, values, np.inf).min(axis=0))
+        self.maximum[:, period] = np.maximum(self.maximum[:, period], np.where(kept, values, -np.inf).max(axis=0))
+        self.potCount[:, period] += (kept & (values >= settings["pot"])).sum(axis=0)
+        self.pbtCount[:, period] += (kept & (values <= settings["pbt"])).sum(axis=0)
+        if self.rainYes:
+            self.dryCount[:, period] += (valid & (values <= threshold)).sum(axis=0)
+        count, mean, M2, M3 = [moment[:, period] for moment in self.moments]
+        newCount, newMean, newM2, newM3 = maskedMoments(values, kept)
+        merged = mergeMoments(count, mean, M2, newCount, newMean, newM2, M3, newM3)
+        for moment, value in zip(self.moments, merged):
+            moment[:, period] = value
+
+        ## Ranges and year counts are per section, the last one stays open for the next block
+        sectionStarts = np.flatnonzero(np.r_[True, section[1:] != section[:-1]])
+        sectionMax = np.maximum.reduceat(np.where(kept, values, -np.inf), sectionStarts, axis=0)
+        sectionMin = np.minimum.reduceat(np.where(kept, values, np.inf), sectionStarts, axis=0)
+        sectionValid = np.logical_or.reduceat(valid, sectionStarts, axis=0)
+        if continues:
+            sectionMax[0] = np.maximum(sectionMax[0], self.sectionMax[:, period])
+            sectionMin[0] = np.minimum(sectionMin[0], self.sectionMin[:, period])
+            sectionValid[0] |= self.sectionValid[:, period]
+        self.endSections(period, sectionMax[:-1], sectionMin[:-1], sectionValid[:-1])
+        self.sectionMax[:, period] = sectionMax[-1]
+        self.sectionMin[:, period] = sectionMin[-1]
+        self.sectionValid[:, period] = sectionValid[-1]
+
+        self.addNDayTotals(period, np.where(valid, values, 0.0), section, continues)
+        self.addPairs(period, values, valid, section, continues)
+        if self.doSpells:
+            codes = np.where(missing, -1, (values > threshold).astype(int))
+            self.addSpells(period, codes, starts)
+
+    def endSections(self, period, sectionMax, sectionMin, sectionValid):
+        """Adds finished sections to the range statistics and year counts"""
+        if len(sectionMax) == 0:
+            return
+        ranges = sectionMax - sectionMin
+        hasRange = np.isfinite(ranges)
+        self.extremeRange[:, period] = np.maximum(self.extremeRange[:, period], np.where(hasRange, ranges, -np.inf).max(axis=0))
+        self.minRange[:, period] = np.minimum(self.minRange[:, period], np.where(hasRange, ranges, np.inf).min(axis=0))
+        self.yearCount[:, period] += sectionValid.sum(axis=0)
+
+    def addNDayTotals(self, period, values, section, continues):
+        """Largest total of nDayTotal consecutive values (missing adding nothing) inside a section"""
+        nDay = self.settings["nDayTotal"]
+        tail = self.nDayTail[period]
+        if continues and tail is not None:
+            values = np.vstack((tail, values))
+            section = np.r_[np.full(len(tail), section[0]), section]
+        nWindows = len(values) - nDay + 1
+        if nWindows > 0:
+            #Added up in order, as running totals in Summary Statistics
+            totals = values[:nWindows].copy()
+            for offset in range(1, nDay):
+                totals += values[offset:offset + nWindows]
+            inSection = section[:nWindows] == section[nDay - 1:]
+            best = np.where(inSection[:, None], totals, -np.inf).max(axis=0)
+            self.nDayMax[:, period] = np.maximum(self.nDayMax[:, period], best)
+        #The open section's last nDayTotal - 1 values start the next block's windows
+        self.nDayTail[period] = values[section == section[-1]][-(nDay - 1):] if nDay > 1 else values[:0]
+
+    def addPairs(self, period, values, valid, section, continues):
+        """Lag one pairs of valid values inside a section, for the autocorrelation"""
+        last = self.lastRow[period]
+        if continues and last is not None:
+            values = np.vstack((last[0][None], values))
+            valid = np.vstack((last[1][None], valid))
+            section = np.r_[section[0], section]
+        self.lastRow[period] = (values[-1], valid[-1])
+        if len(values) < 2:
+            return
+        mask = (section[:-1] == section[1:])[:, None] & valid[:-1] & valid[1:]
+        x, y = values[:-1], values[1:]
+        count = mask.sum(axis=0)
+        safeCount = np.maximum(count, 1)
+        meanX = columnSums(np.where(mask, x, 0.0)) / safeCount
+        meanY = columnSums(np.where(mask, y, 0.0)) / safeCount
+        dx = np.where(mask, x - meanX, 0.0)
+        dy = np.where(mask, y - meanY, 0.0)
+
+        oldCount, oldX, oldY, oldXX, oldYY, oldXY = [pair[:, period] for pair in self.pairs]
+        total = oldCount + count
+        safeTotal = np.maximum(total, 1)
+        deltaX = meanX - oldX
+        deltaY = meanY - oldY
+        weight = oldCount * count / safeTotal
+        merged = [total,
+                  np.where(total > 0, oldX + deltaX * count / safeTotal, 0.0),
+                  np.where(total > 0, oldY + deltaY * count / safeTotal, 0.0),
+                  oldXX + columnSums(dx ** 2) + deltaX ** 2 * weight,
+                  oldYY + columnSums(dy ** 2) + deltaY ** 2 * weight,
+                  oldXY + columnSums(dx * dy) + deltaX * deltaY * weight]
+        for pair, value in zip(self.pairs, merged):
+            pair[:, period] = value
+
+    def addSpells(self, period, codes, starts):
+        """ Counts the wet (1) and dry (0) spells of codes (-1 missing), a spell ending at a section
+            end or a missing value. Each member's last spell is carried on to the next block."""
+        nDays, nMembers = codes.shape
+        carryCode = self.spellCode[:, period]
+        carryLength = self.spellLength[:, period]
+        change = np.empty(codes.shape, dtype=bool)
+        change[0] = codes[0] != carryCode
+        change[1:] = (codes[1:] != codes[:-1]) | starts[1:, None]
+        self.countSpells(period, np.flatnonzero(change[0]), carryCode[change[0]], carryLength[change[0]])
+
+        #Runs of each member's column, the first one joins on to the carried spell if that continues
+        change[0] = True
+        runStarts = np.flatnonzero(change.T.ravel())
+        lengths = np.diff(np.r_[runStarts, nDays * nMembers])
+        members = runStarts // nDays
+        runCodes = codes.T.ravel()[runStarts]
+        firstRun = runStarts % nDays == 0
+        joined = firstRun & (codes[0] == carryCode)[members]
+        lengths[joined] += carryLength[members[joined]]
+        lastRun = np.r_[members[1:] != members[:-1], True]
+        self.countSpells(period, members[~lastRun], runCodes[~lastRun], lengths[~lastRun])
+        self.spellCode[:, period] = runCodes[lastRun]
+        self.spellLength[:, period] = lengths[lastRun]
+
+    def countSpells(self, period, members, codes, lengths):
+        for code, counts in ((1, "wetSpells"), (0, "drySpells")):
+            chosen = codes == code
+            if not np.any(chosen):
+                continue
+            spells = getattr(self, counts)
+            longest = lengths[chosen].max()
+            if longest >= spells.shape[2]:
+                spells = np.concatenate((spells, np.zeros(spells.shape[:2] + (longest + 1 - spells.shape[2],), dtype=int)), axis=2)
+                setattr(self, counts, spells)
+            np.add.at(spells, (members[chosen], period, lengths[chosen]), 1)
+
+    def closeSection(self, period):
+        """Ends the open section of period"""
+        self.endSections(period, self.sectionMax[None, :, period], self.sectionMin[None, :, period], self.sectionValid[None, :, period])
+        self.sectionMax[:, period] = -np.inf
+        self.sectionMin[:, period] = np.inf
+        self.sectionValid[:, period] = False
+        self.nDayTail[period] = None
+        self.lastRow[period] = None
+        if self.doSpells:
+            members = np.arange(self.ensembleSize)
+            self.countSpells(period, members, self.spellCode[:, period], self.spellLength[:, period])
+        self.spellCode[:, period] = -1
+        self.spellLength[:, period] = 0
+
+    def close(self):
+        """ Ends the run and works out every member's statistics (memberValues: members x periods x
+            statistics, the Sum not yet divided by the number of years; memberYears: members x periods)"""
+        if self.closed:
+            return
+        for period in range(nPeriods):
+            self.closeSection(period)
+        missingCode = self.missingCode
+        values = np.full((self.ensembleSize, nPeriods, len(statNames)), float(missingCode))
+        hasData = self.anyValid
+        count = self.moments[0]
+        hasCount = hasData & (count > 0)
+        safeCount = np.maximum(count, 1)
+
+        values[..., 0] = np.where(hasCount, self.total / safeCount, missingCode)
+        values[..., 1] = np.where(hasCount, self.maximum, missingCode)
+        values[..., 2] = np.where(hasCount, self.minimum, missingCode)
+        variance = self.moments[2] / safeCount
+        with np.errstate(invalid='ignore', divide='ignore'):
+            skewness = np.where(variance > 0, (self.moments[3] / safeCount) / np.sqrt(variance) ** 3, 0.0)
+        values[..., 4] = np.where(hasData, np.where(count > 0, variance, 0.0), missingCode)
+        values[..., 11] = np.where(hasData, np.where(count > 0, skewness, 0.0), missingCode)
+        values[..., 6] = np.where(hasData, self.potCount, missingCode)
+        values[..., 7] = np.where(hasData, self.pbtCount, missingCode)
+        values[..., 9] = np.where(hasData, self.total, missingCode)
+        values[..., 12] = np.where(hasData, self.nDayMax, missingCode)
+        values[..., 13] = np.where(hasData, count, missingCode)
+        days = count + self.dryCount
+        values[..., 14] = np.where(hasData, count / np.maximum(days, 1), missingCode)
+        values[..., 23] = np.where(hasData & np.isfinite(self.extremeRange), self.extremeRange, missingCode)
+        values[..., 24] = np.where(hasData & np.isfinite(self.minRange), self.minRange, missingCode)
+
+        pairCount, _, _, pairXX, pairYY, pairXY = self.pairs
+        denominator = np.sqrt(pairXX * pairYY)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            autocorrelation = np.where(denominator == 0, 1.0, pairXY / denominator)
+        values[..., 10] = np.where(hasData & (pairCount > 2), autocorrelation, missingCode)
+
+        if self.doSpells:
+            self.spellStatistics(values, hasData)
+        if self.keepValues:
+            self.percentileStatistics(values, hasData)
+            self.storedValues = []
+
+        self.memberValues = values
+        self.memberYears = np.where(hasData, self.yearCount, 0)
+        self.closed = True
+
+    def spellStatistics(self, values, hasData):
+        missingCode = self.missingCode
+        statistics = {}
+        for name, spells in (("wet", self.wetSpells), ("dry", self.drySpells)):
+            lengths = np.arange(spells.shape[2])
+            number = spells.sum(axis=2)
+            safeNumber = np.maximum(number, 1)
+            days = (spells * lengths).sum(axis=2)
+            mean = days / safeNumber
+            longest = np.where(spells > 0, lengths, 0).max(axis=2)
+            #Added up in order, so lengths no member reached (zero counts) don't change the rounding
+            sd = np.sqrt(np.cumsum(spells * (lengths - mean[..., None]) ** 2, axis=2)[..., -1] / safeNumber)
+            persistence = (spells * lengths)[..., 2:].sum(axis=2) / np.maximum(days, 1)
+            #Median spell length, from the running count of spells up to each length
+            cumulative = np.cumsum(spells, axis=2)
+            middle = [(cumulative > ((number - 1) // 2)[..., None]).argmax(axis=2),
+                      (cumulative > (number // 2)[..., None]).argmax(axis=2)]
+            median = np.where(number % 2 != 0, middle[1], (middle[0] + middle[1]) / 2)
+            statistics[name] = {
+                "mean": np.where(number > 0, mean, 0.0), "max": longest, "sd": np.where(number > 0, sd, 0.0),
+                "persistence": np.where(number > 0, persistence, 0.0),
+                "median": np.where(number > 0, median, missingCode),
+            }
+        wet, dry = statistics["wet"], statistics["dry"]
+        for index, value in ((16, wet["mean"]), (18, wet["max"]), (19, wet["sd"]), (25, wet["persistence"]),
+                             (15, dry["mean"]), (17, dry["max"]), (20, dry["sd"]), (26, dry["persistence"]),
+                             (28, wet["median"]), (29, dry["median"])):
+            values[..., index] = np.where(hasData, value, missingCode)
+        bothPersist = (wet["persistence"] != 0) & (dry["persistence"] != 0)
+        values[..., 27] = np.where(hasData & bothPersist, wet["persistence"] - (1 - dry["persistence"]), missingCode)
+
+    def percentileStatistics(self, values, hasData):
+        """Median, IQR, percentile and precipitation POT from the kept values"""
+        missingCode = self.missingCode
+        threshold = self.settings["threshold"]
+        blocks = []
+        for first, block in self.storedValues:
+            months, seasons, _ = periodDays(self.startDate, first, len(block))
+            blocks.append((block, months, seasons))
+        if len(blocks) == 0:
+            return
+
+        precipThreshold = None
+        #Annual first, its percentile is the precipitation POT threshold for every period
+        for period in range(nPeriods - 1, -1, -1):
+            if period == annualPeriod:
+                data = np.concatenate([block for block, _, _ in blocks])
+            else:
+                data = np.concatenate([block[(months if period < 12 else seasons) == period] for block, months, seasons in blocks])
+            kept = data != missingCode
+            if self.rainYes:
+                kept &= data > threshold
+            count = kept.sum(axis=0)
+            ordered = np.sort(np.where(kept, data, np.inf), axis=0)
+            if len(ordered) == 0:
+                ordered = np.full((1, self.ensembleSize), np.inf)
+            safeCount = np.maximum(count, 1)
+            hasValues = hasData[:, period] & (count > 0)
+            values[:, period, 8] = np.where(hasValues, vbaPercentile(ordered, safeCount, self.settings["percentile"]), missingCode)
+            values[:, period, 3] = np.where(hasValues, vbaPercentile(ordered, safeCount, 50), missingCode)
+            with np.errstate(invalid='ignore'):
+                values[:, period, 5] = np.where(hasValues, vbaPercentile(ordered, safeCount, 75) - vbaPercentile(ordered, safeCount, 25), missingCode)
+
+            if not self.rainYes:
+                continue
+            if period == annualPeriod:
+                precipThreshold = np.where(hasValues & (count > 1), vbaPercentile(ordered, safeCount, self.settings["precPot"]), np.nan)
+            above = kept & (data > precipThreshold)
+            potSum = columnSums(np.where(above, data, 0.0))
+            completeSum = columnSums(np.where(kept, data, 0.0))
+            hasPot = hasValues & (count > 1) & ~np.isnan(precipThreshold)
+            values[:, period, 21] = np.where(hasPot, above.sum(axis=0), missingCode)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                values[:, period, 22] = np.where(hasPot & (completeSum > 0), potSum / completeSum, missingCode)
+
+    def join(self, parts):
+        """Takes the member statistics of closed sinks for consecutive runs of members (e.g. worker processes)"""
+        self.memberValues = np.concatenate([part.memberValues for part in parts])
+        self.memberYears = np.concatenate([part.memberYears for part in parts])
+        self.nDays = max(part.nDays for part in parts)
+        self.closed = True
+
+    def results(self):
+        """ Statistics of the run as a dictionary:
+            statistics (names), periods (labels), members (members x periods x statistics),
+            mean and sd (periods x statistics, across members, missing values left out)"""
+        self.close()
+        missingCode = self.missingCode
+        columns = [statNames.index(name) for name in self.statistics]
+        members = self.memberValues.copy()
+        #Sum is per year, the greatest number of years any member has for the period
+        years = self.memberYears.max(axis=0)
+        hasSum = (years > 0) & (members[..., 9] != missingCode)
+        members[..., 9] = np.where(hasSum, members[..., 9] / np.maximum(years, 1), missingCode)
+        members = members[..., columns]
+
+        present = members != missingCode
+        number = present.sum(axis=0)
+        safeNumber = np.maximum(number, 1)
+        mean = np.where(present, members, 0.0).sum(axis=0) / safeNumber
+        sd = np.sqrt(np.where(present, (members - mean) ** 2, 0.0).sum(axis=0) / safeNumber)
+        return {
+            "statistics": list(self.statistics),
+            "periods": list(periodLabels),
+            "members": members,
+            "mean": np.where(number > 0, mean, missingCode),
+            "sd": np.where(number > 0, sd, missingCode),
+        }
+
+    def write(self, filePath, title="Weather Generator", includeMembers=False):
+        """ Writes the results in the Summary Statistics file layout (ensemble mean and standard
+            deviations), then each member's table if includeMembers"""
+        results = self.results()
+        missingCode = self.missingCode
+        endDate = self.startDate + datetime.timedelta(days=max(self.nDays - 1, 0))
+
+        def table(rows):
+            lines = []
+            for label, row in zip(results["periods"], rows):
+                lines.append(label + "".join(",---" if value == missingCode else f",{float(value)}" for value in row))
+            return "\n".join(lines) + "\n"
+
+        with open(filePath, "w") as file:
+            file.write(f"SUMMARY STATISTICS FOR: {title}\n\n")
+            file.write(f"Analysis Start Date: {self.startDate.strftime('%d/%m/%Y')}\n")
+            file.write(f"Analysis End Date: {endDate.strftime('%d/%m/%Y')}\n")
+            if self.ensembleSize > 1:
+                file.write("Ensemble Member(s): ALL\n")
+            file.write("-\n")
+            file.write("Month" + "".join(f",{name}" for name in results["statistics"]) + "\n-\n")
+            file.write(table(results["mean"]))
+            if self.ensembleSize > 1:
+                file.write("\nStandard Deviations of Results\n")
+                file.write(table(results["sd"]))
+                if includeMembers:
+                    for member in range(self.ensembleSize):
+                        file.write(f"\nEnsemble Member {member + 1}\n")
+                        file.write(table(results["members"][member]))
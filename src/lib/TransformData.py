@@ -1,3 +1,5 @@
+import os
+import string
 import numpy as np
 import datetime as dt
 import scipy as sci
@@ -28,6 +30,13 @@ def loadData(file):
 def valueIsValid(value, applyThresh, missingCode, thresh):
     return value != missingCode and (not applyThresh or value > thresh)
 
+def validMask(data, applyThresh, missingCode, thresh):
+    """Array version of valueIsValid"""
+    mask = data != missingCode
+    if applyThresh:
+        mask &= data > thresh
+    return mask
+
 def genericTransform(data, func, applyThresh):
     """ Takes all transformations which require a single function and applies them to all values in all columns.
         Specific transformations used are listed below."""
@@ -36,23 +45,21 @@ def genericTransform(data, func, applyThresh):
     missingCode = settings["globalmissingcode"]
     thresh = settings["fixedthreshold"]
     
-    returnData = np.empty_like(data)
-    success = 0
-    overflow = 0
-    failure = 0
+    returnData = np.array(data, copy=True)
+    valid = validMask(data, applyThresh, missingCode, thresh)
+
+    #Transforms listed in arrayTransforms run on the whole array, anything else value by value
+    arrayFunc = arrayTransforms.get(func)
+    with np.errstate(all='ignore'):
+        if arrayFunc is not None:
+            newValues = arrayFunc(data[valid], missingCode)
+        else:
+            newValues = np.array([func(value, missingCode) for value in data[valid]], dtype=returnData.dtype)
+    returnData[valid] = newValues
 
-    for c in range(len(data.T)):
-        for r in range(len(data[:, c])):
-            if valueIsValid(data[r][c], applyThresh, missingCode, thresh):
-                newVal = func(data[r][c], missingCode)
-                returnData[r][c] = newVal
-                if newVal == missingCode:
-                    overflow += 1
-                else:
-                    success += 1
-            else:
-                returnData[r][c] = data[r][c]
-                failure += 1
+    failure = int(np.count_nonzero(~valid))
+    overflow = int(np.count_nonzero(newValues == missingCode))
+    success = len(newValues) - overflow
                 
     infoString = "Processed " + str(success + overflow + failure) + " values.\n"
     if failure > 0:
@@ -75,6 +82,31 @@ def powThird(n, missingCode): return np.float_power(n, 1/3) if n <= 1e308 else m
 def powQuarter(n, missingCode): return np.float_power(n, 1/4) if n <= 1e308 else missingCode
 def returnSelf(n, missingCode): return n
 
+def arrayTransform(func, inRange):
+    """ Array version of one of the transforms above: func applied where inRange holds (the same limits
+        as the scalar function), global missing code everywhere else."""
+    def transform(values, missingCode):
+        result = np.full_like(values, missingCode)
+        ok = inRange(values)
+        result[ok] = func(values[ok])
+        return result
+    return transform
+
+arrayTransforms = {
+    ln: arrayTransform(np.log, lambda n: (0 < n) & (n <= 1e308)),
+    log: arrayTransform(np.log10, lambda n: (0 < n) & (n <= 1e308)),
+    square: arrayTransform(lambda n: np.float_power(n, 2), lambda n: n <= 1e154),
+    cube: arrayTransform(lambda n: np.float_power(n, 3), lambda n: n <= 1e102),
+    powFour: arrayTransform(lambda n: np.float_power(n, 4), lambda n: n <= 1e77),
+    powMinusOne: arrayTransform(lambda n: np.float_power(n, -1), lambda n: n >= 1e-308),
+    eToTheN: arrayTransform(lambda n: np.float_power(np.e, n), lambda n: n <= 709),
+    tenToTheN: arrayTransform(lambda n: np.float_power(10, n), lambda n: n <= 308),
+    powHalf: arrayTransform(lambda n: np.float_power(n, 1/2), lambda n: n <= 1e308),
+    powThird: arrayTransform(lambda n: np.float_power(n, 1/3), lambda n: n <= 1e308),
+    powQuarter: arrayTransform(lambda n: np.float_power(n, 1/4), lambda n: n <= 1e308),
+    returnSelf: lambda values, missingCode: values.copy()
+}
+
 def backwardsChange(data, applyThresh):
     """Returns the difference between each value in a column and the previous value in that column"""
 
@@ -82,21 +114,17 @@ def backwardsChange(data, applyThresh):
     missingCode = settings["globalmissingcode"]
     thresh = settings["fixedthreshold"]
 
-    returnData = np.empty_like(data)
-    success = 0
-    failure = 0
+    returnData = np.array(data, copy=True)
+    valid = validMask(data, applyThresh, missingCode, thresh)
 
-    for c in range(len(data.T)):
-        for r in range(len(data[:, c])):
-            if valueIsValid(data[r][c], applyThresh, missingCode, thresh):
-                success += 1
-                if r == 0 or not valueIsValid(data[r - 1][c], applyThresh, missingCode, thresh):
-                    returnData[r][c] = missingCode
-                else:
-                    returnData[r][c] = data[r][c] - data[r - 1][c]
-            else:
-                failure += 1
-                returnData[r][c] = data[r][c]
+    #A valid value only has a change if the value before it (in the same column) is valid too
+    hasPrevious = np.zeros_like(valid)
+    hasPrevious[1:] = valid[1:] & valid[:-1]
+    returnData[valid & ~hasPrevious] = missingCode
+    returnData[1:][hasPrevious[1:]] = (data[1:] - data[:-1])[hasPrevious[1:]]
+
+    success = int(np.count_nonzero(valid))
+    failure = valid.size - success
 
     infoString = "Processed " + str(success + failure) + " values.\n"
     if failure > 0:
@@ -136,18 +164,12 @@ def binomial(data, binomial, applyThresh):
     missingCode = settings["globalmissingcode"]
     thresh = settings["fixedthreshold"]
 
-    returnData = np.empty_like(data)
-    success = 0
-    failure = 0
+    returnData = np.array(data, copy=True)
+    valid = validMask(data, applyThresh, missingCode, thresh)
+    returnData[valid] = data[valid] > binomial
 
-    for c in range(len(data.T)):
-        for r in range(len(data[:, c])):
-            if valueIsValid(data[r][c], applyThresh, missingCode, thresh):
-                returnData[r][c] = 1 if data[r][c] > binomial else 0
-                success += 1
-            else:
-                returnData[r][c] = data[r][c]
-                failure += 1
+    success = int(np.count_nonzero(valid))
+    failure = valid.size - success
 
     infoString = "Processed " + str(success + failure) + " values.\n"
     if failure > 0:
@@ -184,34 +206,27 @@ def removeOutliers(data, sdFilterValue, applyThresh):
     missingCode = settings["globalmissingcode"]
     thresh = settings["fixedthreshold"]
     
-    returnData = np.empty_like(data)
-    remained = 0
+    returnData = np.array(data, copy=True)
+    valid = validMask(data, applyThresh, missingCode, thresh)
     removed = 0
 
     for c in range(len(data.T)):
         column = data[:, c]
-        threshCol = [entry for entry in column if valueIsValid(entry, applyThresh, missingCode, thresh)]
+        threshCol = column[valid[:, c]]
+        if len(threshCol) == 0:
+            continue
 
         #Calculation standard deviation of the column
-        if len(threshCol) > 0:
-            mean = sum(threshCol) / len(threshCol)
-            sd = 0
-            for entry in threshCol:
-                if valueIsValid(entry, applyThresh, missingCode, thresh):
-                    sd += np.power((entry - mean), 2)
-            sd = np.sqrt(sd / len(threshCol))
-            sdFilter = sd * sdFilterValue
-        
-        #Create an empty column. Write all non-outliers to this column.
-        filteredCol = np.empty_like(column)
-        for r in range(len(column)):
-            if valueIsValid(column[r], applyThresh, missingCode, thresh) and (column[r] > (mean + sdFilter) or column[r] < (mean - sdFilter)):
-                filteredCol[r] = missingCode
-                removed += 1
-            else:
-                filteredCol[r] = column[r]
-                remained += 1
-        returnData[:, c] = filteredCol
+        #cumsum adds in order, so these match summing the values one at a time
+        mean = np.cumsum(threshCol)[-1] / len(threshCol)
+        sd = np.sqrt(np.cumsum((threshCol - mean) ** 2)[-1] / len(threshCol))
+        sdFilter = sd * sdFilterValue
+
+        #Replace all outliers in the column with the global missing code
+        outliers = valid[:, c] & ((column > (mean + sdFilter)) | (column < (mean - sdFilter)))
+        returnData[outliers, c] = missingCode
+        removed += int(np.count_nonzero(outliers))
+    remained = data.size - removed
 
     infoString = "Processed " + str(remained + removed) + " values.\n"
     if removed > 0:
@@ -336,6 +351,171 @@ def writeToFile(data, path):
         file.write("\n")
     file.close()
 
+## Transform pipeline
+## A step is a transformation name as shown on the Transform Data screen, or (name, options) for those
+## that need values, e.g. [("Remove Outliers", {"sd": 3}), "Ln", ("Lag n", {"n": 1}), ("Pad Data", {...})]
+## The steps run one after another on the array in memory and the result is written once.
+
+genericSteps = {
+    "Ln": ln,
+    "Log": log,
+    "x²": square,
+    "x³": cube,
+    "x⁴": powFour,
+    "x⁻¹": powMinusOne,
+    "eˣ": eToTheN,
+    "10ˣ": tenToTheN,
+    "√x": powHalf,
+    "∛x": powThird,
+    "∜x": powQuarter,
+    "x": returnSelf
+}
+
+def applyTransform(data, step, applyThresh):
+    """ Runs one pipeline step on data. Returns (data, infoString) like the transformations themselves,
+        or (None, error message) if the step can't be run."""
+    name, options = step if isinstance(step, (tuple, list)) else (step, {})
+
+    if name in genericSteps:
+        return genericTransform(data, genericSteps[name], applyThresh)
+    elif name == "Box Cox":
+        return boxCox(data, applyThresh)
+    elif name == "Un-Box Cox":
+        return unBoxCox(data, float(options.get("lamda", 1)), float(options.get("leftShift", 0)), applyThresh)
+    elif name == "Lag n":
+        n = int(options.get("n", 0))
+        if n > len(data):
+            return None, "Cannot perform lag transformation, input past end of file."
+        return lag(data, n, options.get("wrap", False))
+    elif name == "Binomial":
+        return binomial(data, options.get("value", 0), applyThresh)
+    elif name == "Backward Change":
+        return backwardsChange(data, applyThresh)
+    elif name == "Remove Outliers":
+        return removeOutliers(data, options.get("sd", 0), applyThresh)
+    elif name == "Pad Data":
+        paddedData = padData(data, options["startDate"], options["endDate"])
+        return paddedData, "Padded to " + str(len(paddedData)) + " rows."
+    return None, "Unknown transformation: " + str(name)
+
+def stepName(step):
+    return step[0] if isinstance(step, (tuple, list)) else step
+
+def runPipeline(data, steps, applyThresh, intermediatePath=None):
+    """ Applies each step in turn to the data in memory.
+        If intermediatePath is given, the result of every step but the last is also written to
+        <intermediatePath without extension>_step<n><extension>.
+        Returns (data, infoString), data is None if a step failed."""
+    infoStrings = []
+    for i, step in enumerate(steps):
+        data, info = applyTransform(data, step, applyThresh)
+        infoStrings.append("Step " + str(i + 1) + " (" + stepName(step) + "): " + info.strip())
+        if data is None:
+            break
+        if intermediatePath is not None and i < len(steps) - 1:
+            root, extension = os.path.splitext(intermediatePath)
+            writeToFile(data, root + "_step" + str(i + 1) + extension)
+
+    return data, "\n".join(infoStrings)
+
+def transformFile(inputPath, outputPath, steps, applyThresh=False, writeIntermediate=False):
+    """ Loads inputPath once, runs the pipeline and writes outputPath once.
+        Returns the pipeline info string."""
+    data = loadData([inputPath])
+    returnData, infoString = runPipeline(data, steps, applyThresh, outputPath if writeIntermediate else None)
+    if returnData is not None:
+        writeToFile(returnData, outputPath)
+    return infoString
+
+## Batch mode - the same steps applied to every file in a directory, one file per worker process
+
+def checkNameTemplate(nameTemplate):
+    """None if nameTemplate can name the output files of a batch, otherwise what is wrong with it"""
+    try:
+        fields = [field for _, field, _, _ in string.Formatter().parse(nameTemplate) if field is not None]
+        unknown = [field for field in fields if field not in ("name", "ext")]
+        if unknown:
+            return "Unknown field {" + unknown[0] + "} in the batch name, only {name} and {ext} can be used."
+        if "name" not in fields:
+            return "The batch name must contain {name}."
+        sampleName = nameTemplate.format(name="name", ext=".dat")
+    except (ValueError, KeyError, IndexError) as e:
+        return "Invalid batch name: " + str(e)
+    if "/" in sampleName or "\\" in sampleName or sampleName in (".", ".."):
+        return "The batch name must be a file name, not a path."
+    return None
+
+def batchOutputName(inputPath, nameTemplate):
+    """Output file name from a template, {name} is the input file name without extension and {ext} its extension"""
+    name, ext = os.path.splitext(os.path.basename(inputPath))
+    return nameTemplate.format(name=name, ext=ext)
+
+def batchWorker(job):
+    """Transforms one file of a batch, returns (inputPath, outputPath, infoString, succeeded)"""
+    inputPath, outputPath, steps, applyThresh = job
+    try:
+        returnData, info = runPipeline(loadData([inputPath]), steps, applyThresh)
+        if returnData is not None:
+            writeToFile(returnData, outputPath)
+    except Exception as e:
+        return inputPath, outputPath, "Failed: " + str(e), False
+    return inputPath, outputPath, info, returnData is not None
+
+def batchTransform(inputDir, outputDir, steps, applyThresh=False, nameTemplate="{name}_transformed{ext}",
+                   extensions=(".dat",), processes=None, reportName="transform_report.txt"):
+    """ Applies the pipeline steps to every file in inputDir with one of the given extensions,
+        writing each result to outputDir under nameTemplate. Files are spread over processes worker
+        processes (default: one per CPU, 1 runs everything in this process).
+        A summary of every file's info strings is returned and written to outputDir/reportName."""
+    templateError = checkNameTemplate(nameTemplate)
+    if templateError is not None:
+        return {"error": templateError}
+    try:
+        inputFiles = sorted(os.path.join(inputDir, name) for name in os.listdir(inputDir)
+                            if name.lower().endswith(tuple(ext.lower() for ext in extensions)))
+    except OSError:
+        return {"error": "Input directory not found"}
+    if len(inputFiles) == 0:
+        return {"error": "No files to transform"}
+    os.makedirs(outputDir, exist_ok=True)
+
+    jobs = []
+    for inputPath in inputFiles:
+        outputPath = os.path.join(outputDir, batchOutputName(inputPath, nameTemplate))
+        if os.path.abspath(outputPath) == os.path.abspath(inputPath):
+            return {"error": "Name template would overwrite " + os.path.basename(inputPath)}
+        jobs.append((inputPath, outputPath, steps, applyThresh))
+
+    processes = min(processes or os.cpu_count() or 1, len(jobs))
+    if processes == 1:
+        results = [batchWorker(job) for job in jobs]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(batchWorker, jobs))
+
+    report = ["Batch transformation of " + str(len(results)) + " file(s) from " + inputDir,
+              "Steps: " + " -> ".join(stepName(step) for step in steps),
+              ""]
+    for inputPath, outputPath, info, succeeded in results:
+        report.append(os.path.basename(inputPath) + " -> " + os.path.basename(outputPath) + ("" if succeeded else " (FAILED)"))
+        report.extend("    " + line for line in info.splitlines())
+    failed = sum(1 for result in results if not result[3])
+    report.append("")
+    report.append(str(len(results) - failed) + " file(s) transformed, " + str(failed) + " failed.")
+    report = "\n".join(report)
+
+    with open(os.path.join(outputDir, reportName), "w") as f:
+        f.write(report + "\n")
+
+    return {
+        "error": None,
+        "files": [{"input": inputPath, "output": outputPath, "info": info, "succeeded": succeeded}
+                  for inputPath, outputPath, info, succeeded in results],
+        "failed": failed,
+        "report": report
+    }
+
 if __name__ == "__main__":
     """Variables that are gotten from the screen."""
     applyThresh = False
@@ -0,0 +1,715 @@
+import datetime
+import functools
+import hashlib
+import math
+import multiprocessing
+import os
+import pickle
+import shutil
+import tempfile
+from itertools import islice
+import numpy as np
+from scipy.stats import norm as scipyNorm
+
+## Weather generator engine, no GUI needed
+## Works on a parsed PAR model - a dictionary with the keys below - and whole arrays of predictor data:
+##     nPredictors, seasonCode, yearLength, startDate (record start), recordLength, calStartDate, calLength,
+##     rainYes, modelTrans, autoRegression, ptandFilename, predictorFilenames (predictand first), ptandFileRoot,
+##     unconParms (12 x params), conParms (12 x params or None), lamdaArray (12 x 2 or None),
+##     deTrend, deTrendType, betaTrend (periods x params or None)
+## The linear predictor is worked out for every day at once, residuals, wet/dry selection and back
+## transforms for every day and ensemble member at once. Only the autoregressive term steps through
+## the days, and it does so for all members together.
+## Every ensemble member draws from its own random stream (a SeedSequence spawn child), so members
+## can be split across worker processes and still give the same output as a single process run.
+## Options are the weather generator settings: allowNeg, randomSeed, thresh, globalMissingCode,
+## varianceInflation, biasCorrection, fixedThreshold, conditionalSelection (1 = Stochastic, 2 = Fixed)
+## and residualMode ("irwinHall" or "normal", see residuals)
+## Long runs can save checkpoints (see synthesiseMembers): the day reached, the autoregression seeds,
+## every member's random generator state, how much output has been written and the statistics' running
+## totals. Values a statistics sink keeps for its percentiles go to an append-only side file instead, so
+## each checkpoint stays small. The trend adjustment only depends on the day, so a run carried on from a
+## checkpoint gives the same bytes as one that was not stopped.
+
+defaultBlockDays = 3650 ## Days synthesised at a time, keeps memory bounded for long runs
+fixedSeed = 1 ## Seed used when randomSeed is off, so runs can be repeated
+checkpointVersion = 2 ## Bump when the checkpoint contents change so old checkpoints are not used
+checkpointExtension = ".ckpt" ## Checkpoint of a single process run, next to the output file
+valuesExtension = ".values" ## Values kept by the statistics up to a checkpoint, next to the checkpoint
+partsExtension = ".parts" ## Directory of a checkpointed parallel run's member files and their checkpoints
+progressInterval = 0.2 ## Seconds between progress reports while worker processes run
+
+def synthesisMonths(startDate, nDays):
+    """Month (1-12) of each of nDays consecutive days from startDate"""
+    dates = np.datetime64(startDate, 'D') + np.arange(nDays)
+    return dates.astype('datetime64[M]').astype(int) % 12 + 1
+
+def periodIndex(months, seasonCode):
+    """Detrend period of each month: 0 (annual), the season (0 = Winter ... 3 = Autumn) or month - 1"""
+    months = np.asarray(months, dtype=int)
+    if seasonCode == 1:
+        return np.zeros(len(months), dtype=int)
+    elif seasonCode == 4:
+        return (months % 12) // 3
+    elif seasonCode == 12:
+        return months - 1
+    return np.full(len(months), -1)
+
+def unconIndices(model):
+    """Column of the standard error and autoregression (-1 if none) parameters in unconParms"""
+    idxSE = 1 + model["nPredictors"]
+    return idxSE, (idxSE + 1 if model["autoRegression"] else -1)
+
+def trendDays(model, startDate, nDays):
+    """ Detrend period and day counters (linear: days since the fit start, power: days since the record start)
+        of each synthesised day, counting the day itself. Period is -1 where the model has no detrend
+        parameters for it."""
+    seasonCode = model["seasonCode"]
+    trendRows = model["betaTrend"].shape[0]
+    recordStart = model["startDate"]
+
+    def periodCounts(toDate):
+        days = max(0, (toDate - recordStart).days)
+        periods = periodIndex(synthesisMonths(recordStart, days), seasonCode)
+        return np.bincount(periods[(periods >= 0) & (periods < trendRows)], minlength=trendRows)
+
+    calBase = periodCounts(model["calStartDate"])
+    fsBase = periodCounts(startDate)
+
+    period = periodIndex(synthesisMonths(startDate, nDays), seasonCode)
+    period[(period < 0) | (period >= trendRows)] = -1
+    valid = period >= 0
+    #Running count of the days in each period, including the day itself
+    runningCount = np.zeros(nDays, dtype=int)
+    for p in range(trendRows):
+        inPeriod = period == p
+        runningCount[inPeriod] = np.arange(1, np.count_nonzero(inPeriod) + 1)
+
+    linear = np.where(valid, fsBase[np.maximum(period, 0)] - calBase[np.maximum(period, 0)] + runningCount, 0)
+    power = np.where(valid, fsBase[np.maximum(period, 0)] + runningCount, 0)
+    return period, linear, power
+
+def trendAdjustment(model, startDate, nDays):
+    """Amount the detrend adds to each synthesised day (0 where there is no trend)"""
+    adjustment = np.zeros(nDays)
+    if not model["deTrend"] or model["betaTrend"] is None:
+        return adjustment
+
+    period, linear, power = trendDays(model, startDate, nDays)
+    betaTrend = model["betaTrend"]
+    valid = period >= 0
+    valid[valid] = ~np.isnan(betaTrend[period[valid]]).any(axis=1)
+    params = betaTrend[period[valid]]
+    with np.errstate(over='ignore', invalid='ignore'):
+        if model["deTrendType"] == 1: #Linear trend
+            adjustment[valid] = params[:, 1] * linear[valid]
+        else: #Power trend
+            adjustment[valid] = params[:, 0] * (np.maximum(power[valid], 0).astype(float) ** params[:, 1])
+            adjustment[valid] -= np.abs(params[:, 2])
+            adjustment[valid] -= 0.001
+    return adjustment
+
+def readColumn(filePath, skip, nDays, warnings=None):
+    """ Values of a single column file from line skip on, at most nDays of them. Lines that are not numbers are NaN,
+        and a message saying so is added to warnings (a list, if given)."""
+    with open(filePath, "r") as file:
+        lines = list(islice(file, skip, skip + nDays))
+    try:
+        return np.array(lines).astype(float) if len(lines) > 0 else np.zeros(0)
+    except ValueError:
+        values = np.full(len(lines), np.nan)
+        badLines = []
+        for i, line in enumerate(lines):
+            try:
+                values[i] = float(line.strip())
+            except ValueError:
+                badLines.append((skip + i + 1, line.strip()))
+        if warnings is not None:
+            warnings.append(f"{len(badLines)} non-numeric value(s) in {os.path.basename(filePath)}, treated as missing. "
+                            f"First at line {badLines[0][0]}: '{badLines[0][1]}'")
+        return values
+
+def loadPredictors(model, predictorDir, startDate, nDays, missingCode, predictorData=None, warnings=None):
+    """ Reads nDays from every predictor file, starting at startDate (the files start on the record start date).
+        predictorData -> whole files already in memory (predictand first, as calibrateModel loads them),
+        used instead of reading the files again
+        warnings -> list that messages about empty filenames and non-numeric values are added to (optional)
+        Returns an (nDays, nPredictors) array with NaN where a value is missing."""
+    skip = max(0, (startDate - model["startDate"]).days)
+    predictors = np.full((nDays, model["nPredictors"]), np.nan)
+    for i in range(model["nPredictors"]):
+        filename = model["predictorFilenames"][i + 1] if i + 1 < len(model["predictorFilenames"]) else ""
+        if predictorData is not None:
+            values = np.asarray(predictorData[i + 1], dtype=float)[skip:skip + nDays]
+        elif not filename:
+            #No file, so every day is missing
+            if warnings is not None:
+                warnings.append(f"Empty predictor filename entry for predictor {i + 1}, its values are treated as missing.")
+            continue
+        else:
+            filePath = os.path.join(predictorDir, filename)
+            if not os.path.exists(filePath):
+                raise FileNotFoundError(f"Predictor file not found: {filePath}")
+            values = readColumn(filePath, skip, nDays, warnings)
+        if len(values) < nDays:
+            raise EOFError(f"Predictor '{filename}' ended unexpectedly at day {len(values) + 1}. Expected {nDays} days.")
+        predictors[:, i] = values
+    predictors[np.abs(predictors - missingCode) < 1e-9] = np.nan
+    return predictors
+
+def prepareInverseNormal(model, parFilePath, predictorDir, missingCode, thresh, ptandData=None):
+    """ Reads and sorts the predictand over the calibration period for the Inverse Normal back transform.
+        ptandData -> the whole predictand file already in memory, used instead of reading it again
+        Returns a dictionary: rankData, firstValueIdx, nSplit, limit, totalArea, zBreaks and warnings (list of strings)
+        zBreaks[k] is the z score whose area from the limit is (k + 1) / nSplit of totalArea, i.e. where the
+        lookup moves on from rankData[firstValueIdx + k] to the next value"""
+    warnings = []
+    ptandFileRoot = model["ptandFileRoot"]
+    if ptandData is not None:
+        ptandPath = ptandFileRoot or model["ptandFilename"]
+    elif not ptandFileRoot:
+        raise ValueError("Predictand file root path missing in PAR (required for Inv Normal).")
+    #Find the predictand file
+    elif os.path.isabs(ptandFileRoot):
+        ptandPath = ptandFileRoot
+    else:
+        parDir = os.path.dirname(parFilePath) if parFilePath else predictorDir
+        ptandPath = os.path.join(parDir, ptandFileRoot)
+    if ptandData is None and not os.path.exists(ptandPath):
+        ptandPathAlt = os.path.join(predictorDir, os.path.basename(ptandFileRoot))
+        if os.path.exists(ptandPathAlt):
+            ptandPath = ptandPathAlt
+        else:
+            raise FileNotFoundError(f"Predictand file for Inv Normal not found.\nChecked PAR path: {ptandPath}\nChecked Predictor path: {ptandPathAlt}")
+
+    if not model["startDate"] or not model["calStartDate"]:
+        raise ValueError("Record Start Date or Calibration Fit Start Date not available from PAR for Inv Normal.")
+    calStartLine = max(0, (model["calStartDate"] - model["startDate"]).days)
+    calEndLine = calStartLine + model["calLength"]
+
+    try:
+        if ptandData is not None:
+            values = np.asarray(ptandData, dtype=float)[calStartLine:calEndLine]
+        else:
+            values = readColumn(ptandPath, calStartLine, model["calLength"], warnings)
+        if len(values) < model["calLength"]:
+            warnings.append(f"Predictand file {os.path.basename(ptandPath)} for Inv Normal may have ended prematurely.\nExpected data until line {calEndLine}, read {calStartLine + len(values)} lines.")
+        values = values[~np.isnan(values) & (np.abs(values - missingCode) > 1e-9)]
+        if len(values) == 0:
+            raise ValueError(f"No valid numeric data (excluding missing code {missingCode}) found in predictand file {os.path.basename(ptandPath)} for the calibration period (lines {calStartLine + 1} to {calEndLine}). Cannot perform Inverse Normal transform.")
+
+        #Sorted data for the lookup, and the first value above the threshold
+        rankData = np.sort(values)
+        above = np.flatnonzero(rankData > thresh)
+        if len(above) > 0:
+            firstValueIdx = int(above[0])
+        else:
+            atThresh = np.flatnonzero(np.abs(rankData - thresh) < 1e-9)
+            if len(atThresh) == 0:
+                raise ValueError(f"No data >= threshold ({thresh}) found in predictand file for calibration period. Cannot perform Inverse Normal transform.")
+            firstValueIdx = int(atThresh[0])
+            warnings.append(f"No data strictly > threshold ({thresh}) for Inv Normal. Using first value >= threshold at index {firstValueIdx}.")
+        nSplit = len(rankData) - firstValueIdx
+
+        #Z score below which the lower tail holds 1 / (nSplit + 1) of the area
+        zStart = 1.0 / (nSplit + 1.0)
+        limit = float(scipyNorm.ppf(zStart))
+
+        totalArea = max(0.0, 1.0 - (2.0 * zStart))
+        if totalArea <= 1e-9:
+            warnings.append(f"Total Area for Inv Norm scaling is near zero ({totalArea:.2e}). nSplit={nSplit}. Check threshold/data.")
+            if totalArea <= 0:
+                totalArea = 1e-9
+            zBreaks = np.zeros(0)
+        else:
+            zBreaks = scipyNorm.ppf(zStart + totalArea * (np.arange(1, nSplit) / nSplit))
+    except Exception as e:
+        raise IOError(f"Error processing predictand file '{ptandPath}' for Inverse Normal Transform:\n{e}")
+
+    return {"rankData": rankData, "firstValueIdx": firstValueIdx, "nSplit": nSplit,
+            "limit": limit, "totalArea": totalArea, "zBreaks": zBreaks, "warnings": warnings}
+
+def translateInverseNormal(values, invNorm):
+    """ Inverse Normal back transform of an array of z scores: the area under the normal curve from the
+        limit to each value picks a value from the sorted calibration data
+        floor(area / totalArea * nSplit) is the number of zBreaks at or below the value, so a binary search
+        of zBreaks gives the same index without integrating"""
+    values = np.asarray(values, dtype=float)
+    rankData = invNorm["rankData"]
+    firstValueIdx = invNorm["firstValueIdx"]
+    nSplit = invNorm["nSplit"]
+
+    #Anything at or below the limit (and NaN) takes the first value over the threshold
+    offset = np.searchsorted(invNorm["zBreaks"], values, side='right')
+    offset[np.isnan(values)] = 0
+    maxIndex = min(firstValueIdx + nSplit - 1, len(rankData) - 1)
+    return rankData[np.clip(firstValueIdx + offset, firstValueIdx, maxIndex)]
+
+def seedEntropy(options):
+    """Root seed of a run: fixedSeed unless randomSeed is set, then fresh entropy from the OS"""
+    return np.random.SeedSequence().entropy if options["randomSeed"] else fixedSeed
+
+def memberGenerators(entropy, firstMember, count):
+    """ PCG64 random generators for members firstMember to firstMember + count - 1
+        Member m gets the same stream as SeedSequence(entropy).spawn(m + 1)[m], whichever process makes it"""
+    return [np.random.Generator(np.random.PCG64(np.random.SeedSequence(entropy, spawn_key=(member,))))
+            for member in range(firstMember, firstMember + count)]
+
+def memberDraws(rngs, draw):
+    """(days, members) block from draw(rng) -> (days,) for each member's generator"""
+    return np.stack([draw(rng) for rng in rngs], axis=1)
+
+def residuals(rngs, blockLength, standardError, precN, residualMode="irwinHall"):
+    """ Block of residuals (days, members), scaled by the standard error of each day
+        irwinHall -> sum of precN uniform numbers less precN / 2 (the original approximation)
+        normal -> exact normal numbers with the same variance (precN / 12)"""
+    if precN <= 0:
+        return np.zeros((blockLength, len(rngs)))
+    if residualMode == "normal":
+        return memberDraws(rngs, lambda rng: rng.standard_normal(blockLength)) * (math.sqrt(precN / 12.0) * standardError[:, None])
+    return (memberDraws(rngs, lambda rng: rng.random((blockLength, precN)).sum(axis=1)) - (precN / 2.0)) * standardError[:, None]
+
+def backTransform(model, base, residual, months, options, invNorm=None):
+    """ Precipitation amounts from the conditional model for a block of days
+        base -> (days,) linear predictor plus trend, residual -> (days, members)
+        Values that cannot be worked out are the missing code, the rest are at least just above the threshold"""
+    missingCode = options["globalMissingCode"]
+    biasCorrection = options["biasCorrection"]
+    thresh = options["thresh"]
+    modelTrans = model["modelTrans"]
+    varInf = model["conParms"][months, 1][:, None]
+    base = base[:, None]
+    amount = np.full(residual.shape, float(missingCode))
+
+    with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+        if modelTrans == 1: #No transformation
+            amount = biasCorrection * ((varInf * base) + residual)
+        elif modelTrans == 2: #Fourth root
+            amount = biasCorrection * (np.maximum(0.0, varInf * (base + residual)) ** 4.0)
+        elif modelTrans == 3: #Natural log
+            amount = biasCorrection * np.exp(varInf * (base + residual))
+        elif modelTrans == 4: #Inverse Normal
+            amount = translateInverseNormal(biasCorrection * ((varInf * base) + residual), invNorm)
+        elif modelTrans == 5 and model["lamdaArray"] is not None: #Box-Cox
+            lamda = model["lamdaArray"][months, 0][:, None]
+            rightShift = model["lamdaArray"][months, 1][:, None]
+            toTransform = (varInf * base) + residual + rightShift
+            logCase = np.abs(lamda) < 1e-9
+            term = toTransform * lamda + 1.0
+            untransformed = np.where(logCase, np.exp(toTransform) - rightShift,
+                                     np.power(np.where(term < 1e-9, 1.0, term), 1.0 / np.where(logCase, 1.0, lamda)) - rightShift)
+            #The power can only be taken of a positive base
+            invalid = (~logCase & (term < 1e-9)) | np.isnan(lamda) | np.isnan(rightShift)
+            amount = np.where(invalid | np.isinf(untransformed), untransformed, biasCorrection * untransformed)
+            amount[invalid] = missingCode
+
+    #Infinite / NaN values are missing, anything at or under the threshold goes just over it
+    amount = np.where(np.isfinite(amount), amount, missingCode)
+    amount[(amount != missingCode) & (amount <= thresh)] = thresh + 0.001
+    return amount
+
+def synthesiseBlocks(model, predictors, startDate, ensembleSize, options, invNorm=None,
+                     blockDays=defaultBlockDays, rngs=None, state=None):
+    """ Synthesises the predictand for every day of predictors (nDays x nPredictors, NaN = missing)
+        Yields (first day, values) for consecutive blocks of days, values being (days, ensembleSize)
+        with the missing code where a day could not be synthesised.
+        rngs are the members' random generators (memberGenerators for a new run if not given).
+        state -> dictionary updated with the run's position before each block is yielded (day: the next
+        day, arSeed); one from an earlier run (with rngs as they were then) carries on from there."""
+    nDays = len(predictors)
+    nPredictors = model["nPredictors"]
+    missingCode = options["globalMissingCode"]
+    precN = options["varianceInflation"]
+    residualMode = options.get("residualMode", "irwinHall")
+    rainYes = model["rainYes"]
+    unconParms = model["unconParms"]
+    idxSE, idxAR = unconIndices(model)
+
+    #--- Deterministic part, every day at once ---
+    months = synthesisMonths(startDate, nDays) - 1
+    unconOK = ~np.isnan(unconParms[:, 0]) & ~np.isnan(unconParms[:, idxSE])
+    dayOK = ~np.isnan(predictors).any(axis=1) & unconOK[months]
+    X = np.nan_to_num(predictors)
+    #Missing coefficients add nothing, as np.nansum did
+    unconBase = unconParms[months, 0] + np.einsum('ij,ij->i', X, np.nan_to_num(unconParms[months, 1:idxSE]))
+    arCoeff = np.nan_to_num(unconParms[months, idxAR]) if idxAR != -1 else np.zeros(nDays)
+    unconSE = unconParms[months, idxSE]
+    unconSE = np.where(~np.isnan(unconSE) & (unconSE > 1e-9), unconSE, 0.0)
+    trend = trendAdjustment(model, startDate, nDays)
+
+    if rainYes:
+        conParms = model["conParms"]
+        idxSECon = 2 + nPredictors
+        conOK = ~np.isnan(conParms[:, 0]) & ~np.isnan(conParms[:, 1]) & ~np.isnan(conParms[:, idxSECon])
+        amountOK = dayOK & conOK[months]
+        conBase = conParms[months, 0] + np.einsum('ij,ij->i', X, np.nan_to_num(conParms[months, 2:idxSECon]))
+        conBase = conBase + trend
+        conSE = conParms[months, idxSECon]
+        conSE = np.where(~np.isnan(conSE) & (conSE > 1e-9), conSE, 0.0)
+
+    #Autoregression starts from the intercept of the first month
+    initialIntercept = unconParms[months[0], 0] if nDays > 0 else 0.0
+    arSeed = np.full(ensembleSize, 0.0 if np.isnan(initialIntercept) else initialIntercept)
+    if rngs is None:
+        rngs = memberGenerators(seedEntropy(options), 0, ensembleSize)
+    firstDay = 0
+    if state is not None and "day" in state:
+        firstDay = state["day"]
+        arSeed = np.array(state["arSeed"], dtype=float)
+
+    for first in range(firstDay, nDays, blockDays):
+        last = min(first + blockDays, nDays)
+        days = slice(first, last)
+        blockLength = last - first
+        values = np.full((blockLength, ensembleSize), float(missingCode))
+
+        if not rainYes:
+            #--- Unconditional process (e.g. temperature) ---
+            residual = residuals(rngs, blockLength, unconSE[days], precN, residualMode)
+            if idxAR == -1:
+                predicted = unconBase[days, None] + residual + trend[days, None]
+                if not options["allowNeg"]:
+                    predicted = np.maximum(predicted, 0.0)
+                values[dayOK[days]] = predicted[dayOK[days]]
+            else:
+                #Each day's value seeds the next, so step through the days for all members at once
+                for d in range(blockLength):
+                    day = first + d
+                    if not dayOK[day]:
+                        continue
+                    arTerm = np.where(np.abs(arSeed - missingCode) > 1e-9, arSeed * arCoeff[day], 0.0)
+                    predicted = (unconBase[day] + arTerm) + residual[d] + trend[day]
+                    if not options["allowNeg"]:
+                        predicted = np.maximum(predicted, 0.0)
+                    values[d] = predicted
+                    arSeed = predicted
+        else:
+            #--- Conditional process (e.g. precipitation) ---
+            wetUniforms = memberDraws(rngs, lambda rng: rng.random(blockLength)) if options["conditionalSelection"] == 1 else None
+            wet = np.zeros((blockLength, ensembleSize), dtype=bool)
+            if idxAR == -1:
+                probWet = np.repeat(unconBase[days, None], ensembleSize, axis=1)
+                wet = wetUniforms <= probWet if wetUniforms is not None else probWet >= options["fixedThreshold"]
+            else:
+                for d in range(blockLength):
+                    day = first + d
+                    if not dayOK[day]:
+                        continue
+                    arTerm = np.where(np.abs(arSeed - missingCode) > 1e-9, arSeed * arCoeff[day], 0.0)
+                    probWet = unconBase[day] + arTerm
+                    wet[d] = wetUniforms[d] <= probWet if wetUniforms is not None else probWet >= options["fixedThreshold"]
+                    arSeed = wet[d].astype(float)
+
+            residual = residuals(rngs, blockLength, conSE[days], precN, residualMode)
+            amount = backTransform(model, conBase[days], residual, months[days], options, invNorm)
+            blockOK = amountOK[days]
+            values[blockOK] = np.where(wet[blockOK], amount[blockOK], 0.0)
+
+        if state is not None:
+            state["day"] = last
+            state["arSeed"] = arSeed.copy()
+        yield first, values
+
+def formatBlock(values, missingCode):
+    """Output file lines for a block of synthesised values, tab separated members, 3 decimal places"""
+    if len(values) == 0:
+        return ""
+    missingText = f"{int(missingCode):d}" if missingCode == int(missingCode) else f"{missingCode:.1f}"
+    text = np.char.mod("%.3f", values)
+    #Very large values are written in scientific notation
+    long = np.char.str_len(text) > 20
+    if np.any(long):
+        text[long] = np.char.mod("%.3e", values[long])
+    text[np.isnan(values) | (np.abs(values - missingCode) < 1e-9)] = missingText
+    return "\n".join("\t".join(row) for row in text.tolist()) + "\n"
+
+def writeSimFile(simFilePath, model, options, startDate, nDays, ensembleSize, yearIndicator):
+    """Writes the SIM summary that goes with an output file"""
+    with open(simFilePath, "w") as simFile:
+        simFile.write(f" {model['nPredictors']}\n")
+        simFile.write(f" {model['seasonCode']}\n")
+        simFile.write(f" {yearIndicator}\n")
+        simFile.write(f"{startDate.strftime('%d/%m/%Y')}\n")
+        simFile.write(f" {nDays}\n")
+        simFile.write(f"#{str(model['rainYes']).upper()}#\n")
+        simFile.write(f" {ensembleSize}\n")
+        simFile.write(f" {options['varianceInflation']}\n")
+        simFile.write(f" {model['modelTrans']}\n")
+        simFile.write(f" {options['biasCorrection']:g}\n")
+        simFile.write(f'"{model["ptandFilename"]}"\n')
+        for i in range(model["nPredictors"]):
+            filename = model["predictorFilenames"][i + 1] if (i + 1) < len(model["predictorFilenames"]) else ""
+            simFile.write(f'"{filename}"\n')
+
+def runSignature(model, predictors, startDate, firstMember, count, dailyCount, options, statistics):
+    """Hash of everything that changes a run's output, a checkpoint is only used by a run with the same one"""
+    digest = hashlib.sha256()
+    sinkSettings = (statistics.statistics, sorted(statistics.settings.items())) if statistics is not None else None
+    digest.update(pickle.dumps((checkpointVersion, dict(model), startDate, len(predictors), firstMember, count,
+                                dailyCount, defaultBlockDays, sorted(options.items()), sinkSettings)))
+    digest.update(np.ascontiguousarray(predictors).tobytes())
+    return digest.hexdigest()
+
+def saveCheckpoint(checkpointPath, checkpoint):
+    """Written to a temporary file first so a run stopped part way through never leaves a half-written checkpoint"""
+    fd, tempPath = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(checkpointPath)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            pickle.dump(checkpoint, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tempPath, checkpointPath)
+    except BaseException:
+        if os.path.exists(tempPath):
+            os.remove(tempPath)
+        raise
+
+def loadCheckpoint(checkpointPath, signature):
+    """The checkpoint saved at checkpointPath, None if there isn't one. Raises ValueError if it is for a different run"""
+    try:
+        with open(checkpointPath, "rb") as file:
+            checkpoint = pickle.load(file)
+    except FileNotFoundError:
+        return None
+    if checkpoint.get("version") != checkpointVersion or checkpoint.get("signature") != signature:
+        raise ValueError(f"The checkpoint {checkpointPath} is for a different run, remove it or run without resuming.")
+    return checkpoint
+
+def appendValues(valuesPath, blocks):
+    """Adds (first day, values) blocks to the end of the side file, returns its size"""
+    with open(valuesPath, "ab") as file:
+        for block in blocks:
+            pickle.dump(block, file, protocol=pickle.HIGHEST_PROTOCOL)
+        return file.tell()
+
+def readValues(valuesPath, size):
+    """The blocks in the first size bytes of the side file, anything after them is dropped"""
+    if size == 0:
+        if os.path.exists(valuesPath):
+            os.remove(valuesPath)
+        return []
+    if not os.path.exists(valuesPath) or os.path.getsize(valuesPath) < size:
+        raise ValueError(f"{valuesPath} is shorter than when the checkpoint was saved, it can't be resumed.")
+    os.truncate(valuesPath, size)
+    blocks = []
+    with open(valuesPath, "rb") as file:
+        while file.tell() < size:
+            blocks.append(pickle.load(file))
+    return blocks
+
+def hasCheckpoint(outFilePath):
+    """True if a checkpointed run writing outFilePath was stopped before it finished"""
+    return os.path.exists(outFilePath + checkpointExtension) or os.path.isdir(outFilePath + partsExtension)
+
+def removeCheckpoint(outFilePath):
+    """Removes the checkpoint (and a parallel run's member files) of the run writing outFilePath"""
+    for filePath in (outFilePath + checkpointExtension, outFilePath + checkpointExtension + valuesExtension):
+        if os.path.exists(filePath):
+            os.remove(filePath)
+    shutil.rmtree(outFilePath + partsExtension, ignore_errors=True)
+
+def synthesiseMembers(model, predictors, startDate, firstMember, count, options, invNorm, entropy, outFilePath,
+                      dailyCount=None, statistics=None, progress=None, checkpointPath=None, checkpointDays=None,
+                      resume=False):
+    """ Synthesises members firstMember to firstMember + count - 1 (all of them, or a worker process' share)
+        The first dailyCount of them (default all) go to outFilePath, all of them to statistics
+        (a StatisticsSink for count members) if given. progress(daysDone, nDays) is called after each block.
+        checkpointPath -> saves a checkpoint there at the first block end after every checkpointDays days and
+        at the end; with resume the run carries on from it (starting afresh if there is none).
+        Checkpoints are only made between blocks (defaultBlockDays), as changing the blocks changes the output,
+        so checkpointDays under defaultBlockDays checkpoints every block.
+        The statistics' kept values go to checkpointPath + valuesExtension, only the new ones at each checkpoint.
+        Returns the statistics, closed."""
+    nDays = len(predictors)
+    rngs = memberGenerators(entropy, firstMember, count)
+    dailyCount = count if dailyCount is None else dailyCount
+    state = {}
+    checkpoint = None
+    if checkpointPath is not None:
+        signature = runSignature(model, predictors, startDate, firstMember, count, dailyCount, options, statistics)
+        valuesPath = checkpointPath + valuesExtension
+        if resume:
+            checkpoint = loadCheckpoint(checkpointPath, signature)
+        elif os.path.exists(checkpointPath):
+            os.remove(checkpointPath)
+        valuesSize = checkpoint["valuesSize"] if checkpoint is not None else 0
+
+    if checkpoint is not None:
+        state = {"day": checkpoint["day"], "arSeed": checkpoint["arSeed"]}
+        for rng, rngState in zip(rngs, checkpoint["rngStates"]):
+            rng.bit_generator.state = rngState
+        if statistics is not None:
+            statistics.restore(checkpoint["statistics"], readValues(valuesPath, valuesSize))
+        #Anything written after the checkpoint is written again
+        if dailyCount > 0:
+            if not os.path.exists(outFilePath) or os.path.getsize(outFilePath) < checkpoint["outOffset"]:
+                raise ValueError(f"{outFilePath} is shorter than when the checkpoint was saved, it can't be resumed.")
+            os.truncate(outFilePath, checkpoint["outOffset"])
+
+    elif checkpointPath is not None and os.path.exists(valuesPath):
+        os.remove(valuesPath)
+
+    outFile = (open(outFilePath, "a" if checkpoint is not None else "w") if dailyCount > 0 else None)
+    savedDay = state.get("day", 0)
+    savedBlocks = len(statistics.storedValues) if statistics is not None else 0
+    try:
+        for first, values in synthesiseBlocks(model, predictors, startDate, count, options, invNorm, rngs=rngs, state=state):
+            if outFile is not None:
+                outFile.write(formatBlock(values[:, :dailyCount], options["globalMissingCode"]))
+            if statistics is not None:
+                statistics.add(first, values)
+            if checkpointPath is not None and (state["day"] - savedDay >= (checkpointDays or nDays) or state["day"] == nDays):
+                if outFile is not None:
+                    outFile.flush()
+                if statistics is not None and len(statistics.storedValues) > savedBlocks:
+                    valuesSize = appendValues(valuesPath, statistics.storedValues[savedBlocks:])
+                    savedBlocks = len(statistics.storedValues)
+                saveCheckpoint(checkpointPath, {
+                    "version": checkpointVersion, "signature": signature, "day": state["day"], "arSeed": state["arSeed"],
+                    "rngStates": [rng.bit_generator.state for rng in rngs],
+                    "outOffset": outFile.tell() if outFile is not None else 0, "valuesSize": valuesSize,
+                    "statistics": statistics.runningTotals() if statistics is not None else None})
+                savedDay = state["day"]
+            if progress is not None:
+                progress(first + len(values), nDays)
+    finally:
+        if outFile is not None:
+            outFile.close()
+    if statistics is not None:
+        statistics.close()
+    return statistics
+
+_workerShared = None ## Days done by each worker and the stop flag, in a worker process (see startWorker)
+
+def startWorker(daysDone, stopEvent):
+    """Worker process initialiser, keeps the counters and stop flag shared with generateWeather"""
+    global _workerShared
+    _workerShared = (daysDone, stopEvent)
+
+def workerProgress(worker, daysDone, nDays):
+    """progress of a worker's synthesiseMembers: records the days done, stops the worker once the run is cancelled"""
+    counters, stopEvent = _workerShared
+    counters[worker] = daysDone
+    if stopEvent.is_set():
+        raise InterruptedError("Cancelled")
+
+def mergeMembers(chunkPaths, outFilePath):
+    """Joins the lines of the member chunk files side by side, in member order"""
+    chunkFiles = [open(path, "r") for path in chunkPaths]
+    try:
+        with open(outFilePath, "w") as outFile:
+            for lines in zip(*chunkFiles):
+                outFile.write("\t".join(line.rstrip("\n") for line in lines) + "\n")
+    finally:
+        for file in chunkFiles:
+            file.close()
+
+def generateWeather(model, predictorDir, outFilePath, startDate, nDays, ensembleSize, options,
+                    parFilePath=None, yearIndicator=365, progress=None, processes=1, predictorData=None,
+                    statistics=None, dailyMembers=None, checkpointDays=None, resume=False):
+    """ Runs the weather generator: reads the predictors, synthesises nDays from startDate for
+        ensembleSize members and writes the output file (one line per day) and its SIM file.
+        Members are split over processes worker processes (None: one per CPU, 1 runs everything in
+        this process); the output is the same whatever the number of processes.
+        progress(daysDone, nDays) is called after each block (every progressInterval seconds when in parallel,
+        with the days done by the ensemble as a whole), it may raise to stop the run; workers stop at the
+        end of their current block.
+        predictorData -> predictand and predictor files already in memory (see loadPredictors), nothing is read from predictorDir
+        statistics -> a StatisticsSink (see SummaryStatistics) fed every member's values as they are synthesised;
+        its median / percentile statistics keep every value of the run in memory
+        dailyMembers -> only write the first dailyMembers members to the output file (0: no output or SIM file)
+        checkpointDays -> save a checkpoint about every checkpointDays days (see synthesiseMembers), next to the
+        output file; resume -> carry on from the checkpoint of a run that was stopped (same settings and number
+        of processes). Checkpoints are removed once the run has finished.
+        Returns a dictionary: outFile, simFile (None when not written), warnings and statistics (the sink's results)"""
+    missingCode = options["globalMissingCode"]
+    warnings = []
+    invNorm = None
+    if model["modelTrans"] == 4: #Inverse Normal
+        invNorm = prepareInverseNormal(model, parFilePath, predictorDir, missingCode, options["thresh"],
+                                       ptandData=predictorData[0] if predictorData is not None else None)
+        warnings += invNorm["warnings"]
+
+    predictors = loadPredictors(model, predictorDir, startDate, nDays, missingCode, predictorData, warnings)
+    entropy = seedEntropy(options)
+
+    dailyCount = ensembleSize if dailyMembers is None else max(0, min(dailyMembers, ensembleSize))
+    processes = max(1, min(processes or os.cpu_count() or 1, ensembleSize))
+    checkpointing = checkpointDays is not None or resume
+    checkpointPath = outFilePath + checkpointExtension
+    partsDir = outFilePath + partsExtension
+    if resume and (os.path.isdir(partsDir) if processes == 1 else os.path.exists(checkpointPath)):
+        raise ValueError("The checkpoint was saved by a run with a different number of processes.")
+    if not resume:
+        removeCheckpoint(outFilePath)
+
+    if processes == 1:
+        synthesiseMembers(model, predictors, startDate, 0, ensembleSize, options, invNorm, entropy, outFilePath,
+                          dailyCount, statistics, progress, checkpointPath if checkpointing else None, checkpointDays, resume)
+        if checkpointing:
+            removeCheckpoint(outFilePath)
+    else:
+        #Contiguous runs of members, each written to its own file and joined column-wise at the end
+        from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+        bounds = np.linspace(0, ensembleSize, processes + 1).astype(int)
+        counts = bounds[1:] - bounds[:-1]
+        daysDone = multiprocessing.Array('q', processes, lock=False)
+        stopEvent = multiprocessing.Event()
+        ## A checkpointed run keeps its member files (and their checkpoints) until it has finished
+        if checkpointing:
+            os.makedirs(partsDir, exist_ok=True)
+            chunkDir = partsDir
+        else:
+            chunkDir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(outFilePath)))
+        finished = False
+        try:
+            chunkPaths = [os.path.join(chunkDir, f"members_{i}.txt") for i in range(processes)]
+            chunkCheckpoints = [os.path.join(chunkDir, f"members_{i}{checkpointExtension}") if checkpointing else None
+                                for i in range(processes)]
+            with ProcessPoolExecutor(max_workers=processes, initializer=startWorker, initargs=(daysDone, stopEvent)) as executor:
+                #Members after the first dailyCount are only fed to the statistics
+                chunkDaily = np.clip(dailyCount - bounds[:-1], 0, counts)
+                futures = [executor.submit(synthesiseMembers, model, predictors, startDate, bounds[i],
+                                           counts[i], options, invNorm, entropy, chunkPaths[i],
+                                           chunkDaily[i], statistics.forMembers(counts[i]) if statistics is not None else None,
+                                           functools.partial(workerProgress, i), chunkCheckpoints[i], checkpointDays, resume)
+                           for i in range(processes)]
+                try:
+                    pending = set(futures)
+                    while pending:
+                        done, pending = wait(pending, timeout=progressInterval, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            future.result()
+                        if progress is not None:
+                            progress(int(np.dot(daysDone[:], counts)) // ensembleSize, nDays)
+                except BaseException:
+                    ## Leaving the executor waits for the workers, they stop at the end of their block
+                    stopEvent.set()
+                    for future in futures:
+                        future.cancel()
+                    raise
+            if dailyCount > 0:
+                mergeMembers([chunkPaths[i] for i in range(processes) if chunkDaily[i] > 0], outFilePath)
+            if statistics is not None:
+                statistics.join([future.result() for future in futures])
+            finished = True
+        finally:
+            if finished or not checkpointing:
+                shutil.rmtree(chunkDir, ignore_errors=True)
+
+    outFile = simFilePath = None
+    if dailyCount > 0:
+        outFile = outFilePath
+        simFilePath = os.path.splitext(outFilePath)[0] + ".SIM"
+        writeSimFile(simFilePath, model, options, startDate, nDays, dailyCount, yearIndicator)
+    return {"outFile": outFile, "simFile": simFilePath, "warnings": warnings,
+            "statistics": statistics.results() if statistics is not None else None}
+
+def generateFromCalibration(calibration, outFilePath, startDate, nDays, ensembleSize, options, predictorDir=None, **kwargs):
+    """ Runs the weather generator straight from a calibrateModel result, without going through the PAR file.
+        With calibrateModel(..., keepData=True) the predictor files it loaded are used as they are, otherwise
+        they are read from predictorDir (default: the predictand's directory).
+        Other keyword arguments are passed on to generateWeather."""
+    model = calibration["parModel"]
+    if predictorDir is None:
+        predictorDir = os.path.dirname(model["ptandFileRoot"])
+    return generateWeather(model, predictorDir, outFilePath, startDate, nDays, ensembleSize, options,
+                           predictorData=calibration.get("predictorData"), **kwargs)
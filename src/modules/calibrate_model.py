@@ -483,6 +483,9 @@ class ContentWidget(QWidget):
         self.chowCheck = QCheckBox("Calculate Chow Test")
         chowTestLayout.addWidget(self.chowCheck)
 
+        self.chowScanCheck = QCheckBox("Scan Breakpoints")
+        chowTestLayout.addWidget(self.chowScanCheck)
+
         # Histogram Input
 
         histogramLabel = QLabel("No. of categories")
@@ -566,6 +569,7 @@ class ContentWidget(QWidget):
                 deTrend,
                 self.crossValCalcCheck.isChecked(),
                 int(self.crossValInput.text()),
+                self.chowScanCheck.isChecked(),
             )   
         except Exception as e:
             return displayError(e)
@@ -575,9 +579,9 @@ class ContentWidget(QWidget):
             self.newWindow.loadResults(data)
             self.newWindow.show()
             if self.scatterRadioButton.isChecked():
-                plotScatter(data['residualArray'])
+                plotScatter(data['residualDiagnostics'])
             elif self.histogramRadioButton.isChecked():
-                plotHistogram(data['residualArray'], int(self.histogramInput.text()))
+                plotHistogram(data['residualDiagnostics'], int(self.histogramInput.text()))
 
         
 
@@ -600,6 +604,7 @@ class ContentWidget(QWidget):
         self.autoregressionCheck.setChecked(False)
         self.noneRadioButton.setChecked(True)
         self.chowCheck.setChecked(False)
+        self.chowScanCheck.setChecked(False)
         self.noneTrendRadioButton.setChecked(True)
         self.crossValCalcCheck.setChecked(False)
         # Reset all line edit values to default
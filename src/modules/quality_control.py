@@ -272,6 +272,13 @@ class ContentWidget(QWidget):
         selectFileLayout.addWidget(selectFileButton)
         self.selectedFileLabel = QLabel("No File Selected")
         selectFileLayout.addWidget(self.selectedFileLabel)
+        # Reads the file in chunks instead of loading it all, for very large files
+        self.streamingCheckBox = QCheckBox("Stream large file")
+        selectFileLayout.addWidget(self.streamingCheckBox)
+        # Worker processes for Check Directory (1 checks every file in this process)
+        selectFileLayout.addWidget(QLabel("Batch processes: "))
+        self.batchProcessesInput = QLineEdit("1")
+        selectFileLayout.addWidget(self.batchProcessesInput)
 
         # Pettitt Test input elements
 
@@ -385,6 +392,13 @@ class ContentWidget(QWidget):
         )
         buttonLayout.addWidget(self.outliersButton)
 
+        checkDirectoryButton = QPushButton("Check Directory")
+        checkDirectoryButton.clicked.connect(self.checkDirectory)
+        checkDirectoryButton.setStyleSheet(
+            "background-color: #4CAF50; color: white; font-weight: bold;"
+        )
+        buttonLayout.addWidget(checkDirectoryButton)
+
         resetButton = QPushButton("🔄 Reset")
         resetButton.setStyleSheet(
             "background-color: #F44336; color: white; font-weight: bold;"
@@ -405,7 +419,9 @@ class ContentWidget(QWidget):
         # Reset check boxes and line edit fields
         self.pettittInput.setText("90")
         self.thresholdCheckBox.setChecked(False)
+        self.streamingCheckBox.setChecked(False)
         self.standardDeviationInput.setText("0")
+        self.batchProcessesInput.setText("1")
         # Reset results frames
         self.minimumFrame.setText("")
         self.maximumFrame.setText("")
@@ -448,7 +464,7 @@ class ContentWidget(QWidget):
 
     def checkFile(self):
         # https://www.youtube.com/watch?v=QY4KKG4TBFo im keeping this in the comments
-        from src.lib.QualityControl import qualityCheck
+        from src.lib.QualityControl import qualityCheck, streamingQualityCheck
 
         #print("https://www.youtube.com/watch?v=QY4KKG4TBFo")  # Are easter eggs allowed?
         try:
@@ -467,10 +483,18 @@ class ContentWidget(QWidget):
                 pettitMaxPos,
                 globalMissingCount,
                 thresh,
-            ) = qualityCheck(
-                [self.selectedFile],
-                self.thresholdCheckBox.isChecked(),
-                int(self.pettittInput.text()),
+            ) = (
+                streamingQualityCheck(
+                    self.selectedFile,
+                    self.thresholdCheckBox.isChecked(),
+                    int(self.pettittInput.text()),
+                )
+                if self.streamingCheckBox.isChecked()
+                else qualityCheck(
+                    [self.selectedFile],
+                    self.thresholdCheckBox.isChecked(),
+                    int(self.pettittInput.text()),
+                )
             )
             self.minimumFrame.contentLabel.setText(str(min))
             self.maximumFrame.contentLabel.setText(str(max))
@@ -495,13 +519,62 @@ class ContentWidget(QWidget):
                 isError=True,
             )
 
+    def checkDirectory(self):
+        from src.lib.QualityControl import batchQualityCheck
+
+        try:
+            ptPercent = int(self.pettittInput.text())
+            sdFilterValue = int(self.standardDeviationInput.text())
+            processes = int(self.batchProcessesInput.text())
+        except ValueError:
+            return displayBox(
+                "Value Error",
+                "Please ensure the Pettitt threshold, standard deviations and batch processes are whole numbers.",
+                "Error",
+                isError=True,
+            )
+        if processes < 1:
+            return displayBox("Value Error", "Please use at least 1 batch process.", "Error", isError=True)
+        inputDir = QFileDialog.getExistingDirectory(self, "Select directory to check")
+        if inputDir == "":
+            return
+        reportPath = QFileDialog.getSaveFileName(
+            self, "Save report as", "qc_report.csv", "CSV Files (*.csv);;JSON Files (*.json)"
+        )[0]
+        if reportPath == "":
+            return
+
+        results = batchQualityCheck(
+            inputDir,
+            reportPath,
+            self.thresholdCheckBox.isChecked(),
+            ptPercent,
+            sdFilterValue,
+            processes=processes,
+        )
+        if results["error"] is not None:
+            return displayBox("Batch Error", results["error"], "Error", isError=True)
+        return displayBox(
+            "Directory Checked",
+            str(len(results["rows"])) + " file(s) checked, " + str(results["failed"]) + " failed.\n"
+            + "Report written to " + reportPath + ", sorted by missing values.",
+            "Quality Control Results",
+            isError=results["failed"] > 0,
+        )
+
     def getDailyStats(self):
         from src.lib.QualityControl import dailyMeans as dailyMeansNew
+        from src.lib.QualityControl import streamingDailyMeans
 
         try:
-            stats = dailyMeansNew(
-                [self.selectedFile], self.thresholdCheckBox.isChecked()
-            )
+            if self.streamingCheckBox.isChecked():
+                stats = streamingDailyMeans(
+                    self.selectedFile, self.thresholdCheckBox.isChecked()
+                )
+            else:
+                stats = dailyMeansNew(
+                    [self.selectedFile], self.thresholdCheckBox.isChecked()
+                )
             displayBox("Daily Stats:", stats, "Daily Results")
         except FileNotFoundError:
             displayBox(
@@ -532,14 +605,23 @@ class ContentWidget(QWidget):
     def checkOutliers(self):
         self.outliersButton.setText("Calculating")
         from src.lib.QualityControl import getOutliers as getOutliersNew
+        from src.lib.QualityControl import streamingOutliers
 
         try:
-            message = getOutliersNew(
-                [self.selectedFile],
-                self.selectedOutlier,
-                int(self.standardDeviationInput.text()),
-                self.thresholdCheckBox.isChecked(),
-            )
+            if self.streamingCheckBox.isChecked():
+                message = streamingOutliers(
+                    self.selectedFile,
+                    self.selectedOutlier,
+                    int(self.standardDeviationInput.text()),
+                    self.thresholdCheckBox.isChecked(),
+                )
+            else:
+                message = getOutliersNew(
+                    [self.selectedFile],
+                    self.selectedOutlier,
+                    int(self.standardDeviationInput.text()),
+                    self.thresholdCheckBox.isChecked(),
+                )
             self.outliersButton.setText("Outliers")
             # proc = threading.Thread(target=displayBox, args=("Outliers Identified", message, "Outlier Results"))
             # proc.start()
@@ -11,6 +11,8 @@ from PyQt5.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout, QP
                              QStyle) # Import QStyle for icons
 from PyQt5.QtCore import Qt, QTimer
 
+from src.lib.ParModel import ParModel
+
 # --- Default Values ---
 # Used when no specific values are provided by the user
 GLOBAL_MISSING_CODE = -999.0  # Value that indicates missing data
@@ -1391,103 +1393,36 @@ def write_output_file(ctx: SDSMContext, progress_callback=None):
 
 # Parse PAR file to set model parameters
 def parse_par_file(par_path: str, ctx: SDSMContext):
-    lines = []
     try:
-        # Read the file
-        with open(par_path, "r") as f:
-            raw_lines = f.readlines()
-            
-        # Clean up lines (remove empty lines and whitespace)
-        lines = [line.strip() for line in raw_lines if line.strip()]
-        if not lines:
-            return False  # Empty file
-
-        idx = 0
-        # Helper function to safely get next line
-        def get_line(current_idx):
-            if current_idx < len(lines):
-                return lines[current_idx], current_idx + 1
-            raise IndexError("Unexpected end of PAR file.")
-
-        # Read basic parameters
-        line, idx = get_line(idx); ctx.num_predictors = int(line)
-        line, idx = get_line(idx); ctx.num_months = int(line)  # Should be 12
-        line, idx = get_line(idx); ctx.year_length = int(line)
-        ctx.year_indicator = ctx.year_length
-        
-        # Parse start date
-        line, idx = get_line(idx); start_date_str = line
-        try:
-            ctx.start_date = datetime.datetime.strptime(start_date_str, "%d/%m/%Y").date()
-        except ValueError:  # Try alternative format
-            ctx.start_date = datetime.datetime.strptime(start_date_str, "%m/%d/%Y").date()
-
-        # Number of days
-        line, idx = get_line(idx); ctx.no_of_days = int(line)
-
-        # Skip potential duplicate date/days if present
-        if idx < len(lines) and lines[idx] == start_date_str:
-            idx += 1
-        if idx < len(lines) and lines[idx].isdigit() and int(lines[idx]) == ctx.no_of_days:
-            idx += 1
+        model = ParModel.read(par_path)
 
-        # Read conditional flag
-        line, idx = get_line(idx); cond_str = line
-        ctx.conditional_check = (cond_str.upper() == "#TRUE#")
-        
-        # Read ensemble size
-        line, idx = get_line(idx); ensemble_str = line
-        ctx.ensemble_size = int(ensemble_str)
-
-        # Skip variance factor, transform code, bias correction
-        idx += 3
+        ctx.num_predictors = model['nPredictors']
+        ctx.num_months = model['seasonCode']
+        ctx.year_length = model['yearLength']
+        ctx.year_indicator = ctx.year_length
+        ctx.start_date = model['startDate']
+        ctx.no_of_days = model['recordLength']
+        ctx.conditional_check = model['rainYes']
+        ctx.ensemble_size = model['ensembleSize']
 
-        # Read predictor files
-        ctx.predictor_files = []
+        # Predictor files are relative to the PAR file (predictand is first in the list)
         par_dir = os.path.dirname(par_path)
-        for _ in range(ctx.num_predictors):
-            if idx >= len(lines):
-                break
-            line, idx = get_line(idx); pfile = line
-            abs_pfile = os.path.normpath(os.path.join(par_dir, pfile))
-            ctx.predictor_files.append(abs_pfile)
-
-        # Read data file path
-        if idx < len(lines):
-            line, idx = get_line(idx); data_file = line
-            # Check if it's a coefficient line or data file name
-            if ' ' not in data_file and ('.' in data_file or os.sep in data_file or os.altsep in data_file):
-                abs_data_file = os.path.normpath(os.path.join(par_dir, data_file))
-                ctx.in_file = os.path.basename(abs_data_file)
-                ctx.in_root = abs_data_file
-            else:
-                # Line was not a filename, put it back
-                idx -= 1
-
-        # Read monthly coefficients if present
-        ctx.monthly_coeffs = []
-        coeffs_found = False
-        while idx < len(lines):
-            line, current_idx_plus_1 = get_line(idx)
-            parts = line.split()
-            try:
-                # Check if line contains coefficient values
-                coeffs = [float(x) for x in parts]
-                if len(coeffs) == ctx.num_predictors + 1:  # Intercept + predictors
-                    ctx.monthly_coeffs.append(coeffs)
-                    coeffs_found = True
-                    idx = current_idx_plus_1
-                else:
-                    break
-            except ValueError:
-                break  # Not coefficient values
-
-        if coeffs_found:
-            print(f"Read {len(ctx.monthly_coeffs)} lines of monthly coefficients from PAR file.")
+        ctx.predictor_files = [os.path.normpath(os.path.join(par_dir, pfile))
+                               for pfile in model['predictorFilenames'][1:] if pfile]
+
+        # Data file is the predictand the model was calibrated on
+        if model['ptandFileRoot']:
+            abs_data_file = os.path.normpath(os.path.join(par_dir, model['ptandFileRoot']))
+            ctx.in_file = os.path.basename(abs_data_file)
+            ctx.in_root = abs_data_file
+
+        # Monthly coefficients: intercept + predictors
+        ctx.monthly_coeffs = model['unconParms'][:, :ctx.num_predictors + 1].tolist()
+        print(f"Read {len(ctx.monthly_coeffs)} lines of monthly coefficients from PAR file.")
         return True
 
     except Exception as e:
-        QMessageBox.critical(None, "Error", f"Error parsing .PAR file '{os.path.basename(par_path)}':\n{e}\nApproximate line number/block: {idx+1}")
+        QMessageBox.critical(None, "Error", f"Error parsing .PAR file '{os.path.basename(par_path)}':\n{e}")
         return False
 
 
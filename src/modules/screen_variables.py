@@ -462,6 +462,22 @@ class ContentWidget(QWidget):
         )
         buttonLayout.addWidget(scatterButton)
 
+        screenButton = QPushButton("Screen All")
+        screenButton.setToolTip("Rank every predictor in the predictor path against the predictand")
+        screenButton.clicked.connect(self.doScreening)
+        screenButton.setStyleSheet(
+            "background-color: #7E57C2; color: white; font-weight: bold"
+        )
+        buttonLayout.addWidget(screenButton)
+
+        lagScanButton = QPushButton("Lag Scan")
+        lagScanButton.setToolTip("Find the lead / lag (-10 to +10 days) of each selected predictor that best correlates with the predictand")
+        lagScanButton.clicked.connect(self.doLagScan)
+        lagScanButton.setStyleSheet(
+            "background-color: #009688; color: white; font-weight: bold"
+        )
+        buttonLayout.addWidget(lagScanButton)
+
         resetButton = QPushButton("🔄 Reset")
         resetButton.setStyleSheet(
             "background-color: #F44336; color: white; font-weight: bold;"
@@ -591,6 +607,7 @@ class ContentWidget(QWidget):
             [self.predictandSelected],
             [predictor for predictor in self.predictorsSelected],
             userInput,
+            rawData=False,
         )
 
         if data["error"] == "Predictand Error":
@@ -603,7 +620,7 @@ class ContentWidget(QWidget):
         elif data["error"] == "Predictor Error":
             return displayBox(
                 "Predictor Error",
-                "There can only be between one and twelve predictor files selected.",
+                "At least one predictor file must be selected.",
                 "Error",
                 isError=True,
             )
@@ -619,6 +636,104 @@ class ContentWidget(QWidget):
         self.newWindow.loadResults(data)
         self.newWindow.show()
 
+    def doScreening(self):
+        from src.lib.ScreenVars import screenPredictors, ScreeningResultsApp
+
+        fitStartDate = self.QDateEditToDateTime(self.fitStartDateChooser)
+        fitEndDate = self.QDateEditToDateTime(self.fitEndDateChooser)
+        try:
+            sigLevel = float(self.significanceInput.text())
+        except ValueError:
+            return displayBox(
+                "Significance Error",
+                "Significance level must be a number.",
+                "Error",
+                isError=True,
+            )
+
+        userInput = {
+            "fSDate": fitStartDate,
+            "fEDate": fitEndDate,
+            "analysisPeriodChosen": self.dropdownBox.currentIndex(),
+            "conditional": self.conditionalRadioButton.isChecked(),
+            "autoRegressionTick": self.autoregressionCheckBox.isChecked(),
+            "sigLevelInput": sigLevel,
+        }
+        if fitEndDate <= fitStartDate:
+            return displayBox(
+                "Date Error",
+                "End date cannot be before start date.",
+                "Error",
+                isError=True,
+            )
+        if not self.predictandSelected:
+            return displayBox(
+                "Predictand Error",
+                "No predictand file selected.",
+                "Error",
+                isError=True,
+            )
+
+        data = screenPredictors(
+            [self.predictandSelected], self.predictorPath, userInput
+        )
+        if data["error"] is not None:
+            return displayBox("Error", data["error"], "Error", isError=True)
+
+        self.newWindow = ScreeningResultsApp()
+        self.newWindow.loadResults(data)
+        self.newWindow.show()
+
+    def doLagScan(self):
+        from src.lib.ScreenVars import laggedCorrelationScan, LaggedCorrelationApp
+
+        fitStartDate = self.QDateEditToDateTime(self.fitStartDateChooser)
+        fitEndDate = self.QDateEditToDateTime(self.fitEndDateChooser)
+
+        userInput = {
+            "fSDate": fitStartDate,
+            "fEDate": fitEndDate,
+            "conditional": self.conditionalRadioButton.isChecked(),
+        }
+        if fitEndDate <= fitStartDate:
+            return displayBox(
+                "Date Error",
+                "End date cannot be before start date.",
+                "Error",
+                isError=True,
+            )
+        if not self.predictandSelected:
+            return displayBox(
+                "Predictand Error",
+                "No predictand file selected.",
+                "Error",
+                isError=True,
+            )
+
+        data = laggedCorrelationScan(
+            [self.predictandSelected], self.predictorsSelected, userInput
+        )
+        if data["error"] == "Predictand Error":
+            return displayBox(
+                "Predictand Error",
+                "No predictand file selected.",
+                "Error",
+                isError=True,
+            )
+        elif data["error"] == "Predictor Error":
+            return displayBox(
+                "Predictor Error",
+                "At least one predictor file must be selected.",
+                "Error",
+                isError=True,
+            )
+        elif data["error"] is not None:
+            return displayBox("Error", data["error"], "Error", isError=True)
+
+        self.newWindow = LaggedCorrelationApp()
+        self.newWindow.loadResults(data)
+        self.newWindow.show()
+
     def writePredictors(self):
         for predictor in listdir(self.predictorPath):
             # These are functionally labels, but QLabels do not have an onclick function that emits a sender signal,
@@ -705,7 +820,7 @@ class ContentWidget(QWidget):
 
     def showScatterGraph(self):
         import pyqtgraph as pg
-        from src.lib.ScreenVars import scatterPlot
+        from src.lib.ScreenVars import scatterPlot, scatterRenderData, renderScatter
 
         fitStartDate = self.QDateEditToDateTime(self.fitStartDateChooser)
         fitEndDate = self.QDateEditToDateTime(self.fitEndDateChooser)
@@ -757,18 +872,13 @@ class ContentWidget(QWidget):
         if self.autoregressionCheckBox.isChecked():
             self.predictorsSelected.append("Autoregression")
         plot = pg.plot()
-        
-        scatter = pg.ScatterPlotItem(size=10, brush=pg.mkBrush(255, 255, 255, 120))
-        
 
-        outputData = data["Data"]
-        spots = [
-            {"pos": [outputData[1, i], outputData[0, i]]}
-            for i in range(int(outputData.size / 2))
-        ]
+        # Long records are binned into a density image rather than drawn point by point
+        renderData = scatterRenderData(data["Data"])
         plot.getPlotItem().setLabel("left",self.predictandSelected.split("/")[-1])
         plot.getPlotItem().setLabel("bottom",self.predictorsSelected[0].split("/")[-1])
-        scatter.addPoints(spots)
-        plot.addItem(scatter)
+        if renderData["mode"] == "density":
+            plot.setWindowTitle(f"Scatter - density of {renderData['total']} points")
+        renderScatter(plot.getPlotItem(), renderData)
         if self.autoregressionCheckBox.isChecked():
             self.predictorsSelected.remove("Autoregression")
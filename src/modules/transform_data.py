@@ -15,6 +15,7 @@ from PyQt5.QtWidgets import (
     QLineEdit,
     QGroupBox,
     QMessageBox,
+    QListWidget,
 )
 from PyQt5.QtCore import Qt, QDate
 from PyQt5.QtGui import QPalette, QColor, QIcon
@@ -283,6 +284,16 @@ class ContentWidget(QWidget):
         outlierFrame.setLayout(outlierLayout)
         selectOPBOLayout.addWidget(outlierFrame)
 
+        pipelineFrame = borderedQGroupBox("Pipeline")
+        pipelineFrame.setBaseSize(200, 200)
+
+        pipelineLayout = QVBoxLayout()
+        pipelineLayout.setContentsMargins(25, 25, 25, 25)
+        pipelineLayout.setSpacing(0)
+
+        pipelineFrame.setLayout(pipelineLayout)
+        selectOPBOLayout.addWidget(pipelineFrame)
+
         buttonFrame = QFrame()
         buttonFrame.setBaseSize(600, 60)
         buttonFrame.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
@@ -487,6 +498,33 @@ class ContentWidget(QWidget):
         outlierLayout.addWidget(self.outlierRadio)
         outlierLayout.addWidget(self.standardDevFrame)
 
+        # Steps added here are run in order, in memory, when Transform Data is pressed
+        self.pipelineSteps = []
+        self.pipelineList = QListWidget()
+        self.pipelineList.setToolTip(
+            "Add Step adds the selected transformation (or Pad Data, if no transformation is selected). "
+            "When there are steps, Transform Data runs them all and writes the output file once."
+        )
+        pipelineButtonFrame = QFrame()
+        pipelineButtonLayout = QHBoxLayout()
+        addStepButton = QPushButton("Add Step")
+        addStepButton.clicked.connect(self.addPipelineStep)
+        clearStepsButton = QPushButton("Clear Steps")
+        clearStepsButton.clicked.connect(self.clearPipelineSteps)
+        pipelineButtonLayout.addWidget(addStepButton)
+        pipelineButtonLayout.addWidget(clearStepsButton)
+        pipelineButtonFrame.setLayout(pipelineButtonLayout)
+        self.intermediateCheckBox = QCheckBox("Write Intermediate Files")
+        self.nameTemplateFrame = labeledQLineEditFrame("Batch Name: ", "{name}_transformed{ext}")
+        self.nameTemplateFrame.setToolTip("Output file name for Transform Directory, {name} and {ext} come from each input file")
+        self.batchProcessesFrame = labeledQLineEditFrame("Batch Processes: ", "1")
+        self.batchProcessesFrame.setToolTip("Worker processes for Transform Directory (1 runs every file in this process)")
+        pipelineLayout.addWidget(self.pipelineList)
+        pipelineLayout.addWidget(pipelineButtonFrame)
+        pipelineLayout.addWidget(self.intermediateCheckBox)
+        pipelineLayout.addWidget(self.nameTemplateFrame)
+        pipelineLayout.addWidget(self.batchProcessesFrame)
+
         transformButton = QPushButton("Transform Data")
         transformButton.clicked.connect(self.doTransform)
         transformButton.setStyleSheet(
@@ -495,6 +533,13 @@ class ContentWidget(QWidget):
 
         buttonLayout.addWidget(transformButton)
 
+        batchButton = QPushButton("Transform Directory")
+        batchButton.clicked.connect(self.doBatchTransform)
+        batchButton.setStyleSheet(
+            "background-color: #1FC7F5; color: white; font-weight: bold;"
+        )
+        buttonLayout.addWidget(batchButton)
+
         resetButton = QPushButton("🔄 Reset")
         resetButton.clicked.connect(self.resetAll)
         resetButton.setStyleSheet(
@@ -525,6 +570,10 @@ class ContentWidget(QWidget):
         self.outputCheckBox.setChecked(False)
         self.wrapCheckBox.setChecked(False)
         self.padDataCheckBox.setChecked(False)
+        self.intermediateCheckBox.setChecked(False)
+        self.nameTemplateFrame.setLineEditVal("{name}_transformed{ext}")
+        self.batchProcessesFrame.setLineEditVal("1")
+        self.clearPipelineSteps()
 
         # Reset line edit fields
         self.columnInput.setText("1")
@@ -581,6 +630,139 @@ class ContentWidget(QWidget):
                 if button.isChecked():
                     button.setChecked(False)
 
+    def currentStep(self):
+        """Pipeline step for the transformation currently selected on screen, or None after showing an error"""
+        checkedButton = self.transformRadioGroup.checkedButton()
+        if checkedButton is None:
+            if self.padDataCheckBox.isChecked():
+                return ("Pad Data", {
+                    "startDate": self.QDateEditToDateTime(self.startDateEdit),
+                    "endDate": self.QDateEditToDateTime(self.endDateEdit),
+                })
+            displayBox(
+                "Transformation Error",
+                "A transformation must be selected.",
+                "Error",
+                isError=True,
+            )
+            return None
+
+        trans = checkedButton.text()
+        if trans == "Un-Box Cox":
+            try:
+                return (trans, {
+                    "lamda": float(self.lambdaFrame.getLineEditVal()),
+                    "leftShift": float(self.shiftFrame.getLineEditVal()),
+                })
+            except ValueError:
+                displayBox(
+                    "Value error",
+                    "Lamda and left shift values must be numerical",
+                    "Error",
+                    isError=True,
+                )
+                return None
+        elif trans == "Lag n":
+            if not self.lagNLineEdit.text().isdigit():
+                displayBox(
+                    "Value error",
+                    "Lag N value must be an integer",
+                    "Error",
+                    isError=True,
+                )
+                return None
+            return (trans, {"n": int(self.lagNLineEdit.text()), "wrap": self.wrapCheckBox.isChecked()})
+        elif trans == "Binomial":
+            if not self.binomialLineEdit.text().isdigit():
+                displayBox(
+                    "Value error",
+                    "Binomial value must be an integer",
+                    "Error",
+                    isError=True,
+                )
+                return None
+            return (trans, {"value": int(self.binomialLineEdit.text())})
+        elif trans == "Remove Outliers":
+            if not self.standardDevFrame.getLineEditVal().isdigit():
+                displayBox(
+                    "Value error",
+                    "Standard deviation value must be an integer",
+                    "Error",
+                    isError=True,
+                )
+                return None
+            return (trans, {"sd": int(self.standardDevFrame.getLineEditVal())})
+        return (trans, {})
+
+    def addPipelineStep(self):
+        step = self.currentStep()
+        if step is None:
+            return
+        name, options = step
+        label = name
+        if options and name != "Pad Data":
+            label += " (" + ", ".join(f"{key}={value}" for key, value in options.items()) + ")"
+        elif name == "Pad Data":
+            label += f" ({options['startDate']} - {options['endDate']})"
+        self.pipelineSteps.append(step)
+        self.pipelineList.addItem(f"{len(self.pipelineSteps)}. {label}")
+
+    def clearPipelineSteps(self):
+        self.pipelineSteps = []
+        self.pipelineList.clear()
+
+    def doBatchTransform(self):
+        from src.lib.TransformData import batchTransform, checkNameTemplate
+
+        if self.pipelineSteps:
+            steps = self.pipelineSteps
+        else:
+            step = self.currentStep()
+            if step is None:
+                return
+            steps = [step]
+
+        nameTemplate = self.nameTemplateFrame.getLineEditVal()
+        templateError = checkNameTemplate(nameTemplate)
+        if templateError is not None:
+            return displayBox(
+                "Value error",
+                templateError,
+                "Error",
+                isError=True,
+            )
+        processes = self.batchProcessesFrame.getLineEditVal()
+        if not processes.isdigit() or int(processes) < 1:
+            return displayBox(
+                "Value error",
+                "Batch Processes must be a whole number of at least 1.",
+                "Error",
+                isError=True,
+            )
+        inputDir = QFileDialog.getExistingDirectory(self, "Select input directory")
+        if inputDir == "":
+            return
+        outputDir = QFileDialog.getExistingDirectory(self, "Select output directory")
+        if outputDir == "":
+            return
+
+        results = batchTransform(
+            inputDir,
+            outputDir,
+            steps,
+            self.thresholdCheckBox.isChecked(),
+            nameTemplate,
+            processes=int(processes),
+        )
+        if results["error"] is not None:
+            return displayBox("Batch Error", results["error"], "Error", isError=True)
+        return displayBox(
+            "Directory Transformed",
+            results["report"].splitlines()[-1] + "\nThe full report is in " + path.join(outputDir, "transform_report.txt"),
+            "Transformation Success",
+            isError=results["failed"] > 0,
+        )
+
     def doTransform(self):
         from src.lib.utils import getSettings
         from src.lib.TransformData import (
@@ -651,6 +833,23 @@ class ContentWidget(QWidget):
                 )
         else:
             data = loadData([self.inputSelected])
+
+        if self.pipelineSteps:
+            from src.lib.TransformData import runPipeline
+
+            returnedData, returnedInfo = runPipeline(
+                data,
+                self.pipelineSteps,
+                applyThresh,
+                self.outputSelected if self.intermediateCheckBox.isChecked() else None,
+            )
+            if returnedData is None:
+                outputFile.close()
+                return displayBox("Pipeline Error", returnedInfo, "Error", isError=True)
+            writeToFile(returnedData, self.outputSelected)
+            outputFile.close()
+            return displayBox("Data Transformed", returnedInfo, "Transformation Success")
+
         try:  # Check if a transformation is selected
             trans = self.transformRadioGroup.checkedButton().text()
         except AttributeError:
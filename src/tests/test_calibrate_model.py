@@ -0,0 +1,322 @@
+# src/tests/test_calibrate_model.py
+
+import os
+import pickle
+import shutil
+import datetime
+import unittest
+import tempfile
+import numpy as np
+
+from src.lib import CalibrateModel
+from src.lib.utils import loadFilesIntoMemory
+
+SETTINGS = """[Settings]
+yearindicator = 366
+globalsdate = 01/01/1961
+globaledate = 31/12/1970
+allowneg = True
+randomseed = False
+thresh = 0
+globalmissingcode = -999
+defaultdir = .
+varianceinflation = 12
+biascorrection = 1
+fixedthreshold = 0.5
+modeltransformation = None
+optimizationalgorithm = Ordinary Least Squares
+criteriatype = AIC Criteria
+stepwiseregression = {stepwise}
+conditionalselection = Stochastic
+months = 0,0,0,0,0,0,0,0,0,0,0,0
+"""
+
+## The value by value loops the array versions replaced, kept here as the reference
+
+def scalarDetrend(yMatrix, yMatrixAboveThreshPos, detrendOption, fsDateBaseline, conditional):
+    xValues = np.ndarray((len(yMatrix), 2))
+    tempYMatrix = yMatrix.copy()
+    for i in range(len(yMatrix)):
+        xValues[i, 0] = 1
+        xValues[i, 1] = yMatrixAboveThreshPos[i] if conditional else i
+        if detrendOption == 2:
+            xValues[i, 1] += fsDateBaseline
+    if detrendOption == 1:
+        betaValues = np.linalg.inv(xValues.T @ xValues) @ (xValues.T @ yMatrix)
+        for i in range(len(yMatrix)):
+            yMatrix[i] -= (xValues[i, 1] * betaValues[1])
+        return [betaValues[0], betaValues[1]], yMatrix
+    xLogged = xValues.copy()
+    minY = np.min(yMatrix)
+    if minY > 0: minY = 0
+    for i in range(len(yMatrix)):
+        tempYMatrix[i] = np.log(yMatrix[i] + np.abs(minY) + 0.001)
+        xLogged[i, 1] = np.log(xValues[i, 1])
+    betaValues = np.linalg.inv(xLogged.T @ xLogged) @ (xLogged.T @ tempYMatrix)
+    betaValues[0] = np.exp(betaValues[0])
+    for i in range(len(yMatrix)):
+        yMatrix[i] -= (betaValues[0] * (xValues[i][1] ** betaValues[1])) - np.abs(minY) - 0.001
+    return [betaValues[0], betaValues[1], minY], yMatrix
+
+def searchLimit(zStart):
+    """Z score the Inverse Normal untransform steps left to, until the lower tail holds zStart"""
+    delta = 0.0001
+    area = 0.5
+    fx = 0
+    fxOld = CalibrateModel.fxNormal(fx)
+    for i in range(50000):
+        fx -= delta
+        fxNew = CalibrateModel.fxNormal(fx)
+        area -= (delta * 0.5 * (fxOld + fxNew))
+        if area <= zStart:
+            break
+        fxOld = fxNew
+    return fx
+
+def scalarUntransform(matrix, tResults, modelTrans, missingCode, limit=None, totalArea=None):
+    for i in range(len(matrix)):
+        if matrix[i] == missingCode:
+            continue
+        if modelTrans == 2:
+            matrix[i] **= 4
+        elif modelTrans == 3:
+            matrix[i] = np.exp(matrix[i])
+        elif modelTrans == 4:
+            matrix[i] = CalibrateModel.translator(matrix[i], limit, totalArea, np.sort(tResults, kind='stable'))
+        elif modelTrans == 5:
+            lamda = tResults['lamda']
+            shift = tResults['shiftRight']
+            tempValue = matrix[i] + shift
+            if lamda == 0:
+                tempValue = np.exp(tempValue) - shift
+            else:
+                tempValue = (lamda * tempValue) + 1
+                tempValue = np.exp(np.log(tempValue) / lamda) - shift if tempValue > 0 else missingCode
+            matrix[i] = tempValue
+    return matrix
+
+
+class CalibrationTestCase(unittest.TestCase):
+    """
+    Calibrates synthetic records (1961-1970) in a scratch directory holding its own settings.ini.
+    """
+    stepwise = False
+
+    def setUp(self):
+        self.oldDir = os.getcwd()
+        self.tempDir = tempfile.mkdtemp()
+        os.chdir(self.tempDir)
+        with open("settings.ini", "w") as f:
+            f.write(SETTINGS.format(stepwise=self.stepwise))
+
+        nDays = (datetime.date(1970, 12, 31) - datetime.date(1961, 1, 1)).days + 1
+        rng = np.random.default_rng(7)
+        predictors = rng.normal(size=(4, nDays))
+        predictand = 10 + 2 * predictors[0] - predictors[2] + rng.normal(scale=0.5, size=nDays)
+        self.fileList = [os.path.join(self.tempDir, "predictand.dat")]
+        np.savetxt(self.fileList[0], predictand, fmt="%.3f")
+        for i, values in enumerate(predictors):
+            self.fileList.append(os.path.join(self.tempDir, f"predictor{i + 1}.dat"))
+            np.savetxt(self.fileList[-1], values, fmt="%.3f")
+
+    def tearDown(self):
+        os.chdir(self.oldDir)
+        shutil.rmtree(self.tempDir, ignore_errors=True)
+
+    def calibrate(self, **kwargs):
+        return CalibrateModel.calibrateModel(self.fileList, os.path.join(self.tempDir, "model.PAR"),
+                                             datetime.date(1961, 1, 1), datetime.date(1970, 12, 31), **kwargs)
+
+    def expectedResiduals(self, diagnostics, columns=None, autoRegression=False):
+        ## Every day is in the annual fit, so X and Y come straight from the files
+        loaded = loadFilesIntoMemory(self.fileList)
+        xMatrix = np.column_stack([np.ones(len(loaded[0]))] + loaded[1:])
+        yMatrix = loaded[0]
+        if autoRegression:
+            xMatrix = np.column_stack([xMatrix[1:], loaded[0][:-1]])
+            yMatrix = yMatrix[1:]
+        if columns is not None:
+            xMatrix = xMatrix[:, columns]
+        betaMatrix = diagnostics.fits[0][3]
+        return yMatrix - xMatrix @ betaMatrix
+
+
+class TestChowBreakpointScan(CalibrationTestCase):
+    def test_matches_chow_formula(self):
+        """
+        Each split's statistic is the Chow statistic calculateParameters works out, from refits of both halves.
+        """
+        CalibrateModel.reloadGlobals()
+        rng = np.random.default_rng(4)
+        rowYears = np.repeat(np.arange(1961, 1971), 40)
+        n = len(rowYears)
+        xMatrix = np.column_stack([np.ones(n), rng.normal(size=(n, 3))])
+        yMatrix = xMatrix @ [1, 2, -1, 0.5] + np.where(rowYears < 1966, 0, 1.5) + rng.normal(size=n)
+
+        scan = CalibrateModel.chowBreakpointScan(xMatrix, yMatrix, rowYears)
+        self.assertEqual(scan["years"], list(range(1962, 1971)))
+        p = xMatrix.shape[1]
+        RSSAll = CalibrateModel.calculateParameters2(xMatrix, yMatrix, p - 1)["RSS"]
+        for year, chowStat in zip(scan["years"], scan["chowStat"]):
+            k = int(np.argmax(rowYears == year))
+            RSS1 = CalibrateModel.calculateParameters2(xMatrix[:k], yMatrix[:k], p - 1)["RSS"]
+            RSS2 = CalibrateModel.calculateParameters2(xMatrix[k:], yMatrix[k:], p - 1)["RSS"]
+            expected = (RSSAll - RSS1 - RSS2) / (RSS1 + RSS2) * (n - 2 * (p - 1)) / (p - 1)
+            self.assertAlmostEqual(chowStat, expected, places=6)
+        ## The break put in the data is the largest
+        self.assertEqual(scan["years"][int(np.argmax(scan["chowStat"]))], 1966)
+
+        ## Splits leaving 10 rows or fewer on a side are skipped
+        self.assertEqual(CalibrateModel.chowBreakpointScan(xMatrix[:50], yMatrix[:50], rowYears[:50])["years"], [])
+
+
+class TestScalarParity(CalibrationTestCase):
+    def setUp(self):
+        super().setUp()
+        CalibrateModel.reloadGlobals()
+        rng = np.random.default_rng(12)
+        self.values = rng.gamma(1.2, 3, 500)
+        self.values[rng.random(500) < 0.35] = 0
+        self.values[rng.random(500) < 0.05] = -999
+
+    def tearDown(self):
+        CalibrateModel.reloadGlobals()
+        super().tearDown()
+
+    def test_detrend_and_propogate(self):
+        """
+        Linear and power detrending (conditional or not) and the wet/dry propagation give the loops' values.
+        """
+        yMatrix = self.values[self.values > 0]
+        aboveThreshPos = np.flatnonzero(self.values > 0) + 1
+        for detrendOption in (1, 2):
+            for conditional in (False, True):
+                with self.subTest(detrendOption=detrendOption, conditional=conditional):
+                    result = CalibrateModel.detrendData(yMatrix.copy(), aboveThreshPos, detrendOption, 22000, conditional)
+                    betaValues, expected = scalarDetrend(yMatrix.copy(), aboveThreshPos, detrendOption, 22000, conditional)
+                    np.testing.assert_array_equal(result["betaValues"], betaValues)
+                    np.testing.assert_array_equal(result["yMatrix"], expected)
+
+        propogated = self.values.copy()
+        CalibrateModel.propogateUnconditional(propogated, 0.5)
+        np.testing.assert_array_equal(propogated, [1 if value > 0.5 else 0 for value in self.values])
+
+    def test_untransform(self):
+        """
+        Untransforming the fourth root, log, Inverse Normal and Box Cox leaves missing values alone and
+        gives every other value what the loops (and translator for the Inverse Normal) gave it.
+        """
+        rng = np.random.default_rng(5)
+        transformed = rng.normal(0.5, 1.2, 400)
+        transformed[::17] = -999
+        reSample = self.values[self.values > 0]
+        zStart = 1 / (len(reSample) + 1)
+        limit = searchLimit(zStart)
+        for modelTrans, tResults in ((2, None), (3, None), (4, reSample),
+                                     (5, {'lamda': 0.3, 'shiftRight': 1.5}), (5, {'lamda': -0.8, 'shiftRight': 0.2}),
+                                     (5, {'lamda': 0, 'shiftRight': 0.7})):
+            with self.subTest(modelTrans=modelTrans):
+                CalibrateModel._globalSettings['modelTrans'] = modelTrans
+                result = transformed.copy()
+                CalibrateModel.untransformData([result], tResults)
+                expected = scalarUntransform(transformed.copy(), tResults, modelTrans, -999, limit, 1 - 2 * zStart)
+                np.testing.assert_array_equal(result, expected)
+
+    def test_translator_array(self):
+        """
+        translatorArray gives every value what translator gives it, at and either side of the limit.
+        """
+        reSample = np.sort(self.values[self.values > 0], kind='stable')
+        limit = -2.5
+        totalArea = 1 - 2 / (len(reSample) + 1)
+        values = np.concatenate([np.linspace(-4, 4, 801), [limit, np.nextafter(limit, 0)]])
+        np.testing.assert_array_equal(CalibrateModel.translatorArray(values, limit, totalArea, reSample),
+                                      [CalibrateModel.translator(value, limit, totalArea, reSample) for value in values])
+
+
+class TestCalibrationCacheSetting(CalibrationTestCase):
+    def test_cache_follows_setting(self):
+        """
+        Nothing is cached unless the CalibrationCache setting is on.
+        """
+        cacheDir = os.path.join(self.tempDir, "cache")
+        self.calibrate(cacheDir=cacheDir)
+        self.assertFalse(os.path.exists(cacheDir))
+
+        with open("settings.ini", "a") as f:
+            f.write("calibrationcache = True\n")
+        self.calibrate(cacheDir=cacheDir)
+        self.assertEqual(len([name for name in os.listdir(cacheDir) if name.endswith(".pkl")]), 1)
+
+
+class TestResidualDiagnostics(CalibrationTestCase):
+    def test_residuals_match_fit(self):
+        """
+        The residuals rebuilt from the files are Y - X.beta of the fit, with and without autoregression.
+        """
+        for autoRegression in (False, True):
+            diagnostics = self.calibrate(useCache=False, autoRegression=autoRegression)["residualDiagnostics"]
+            self.assertIsNone(diagnostics.loadedFiles)
+            self.assertEqual(len(diagnostics.fits), 1)
+            np.testing.assert_allclose(diagnostics.residuals()["residual"],
+                                       self.expectedResiduals(diagnostics, autoRegression=autoRegression))
+
+    def test_pickle_keeps_fits_only(self):
+        """
+        A pickled diagnostics object holds no data, gives the same residuals, and refuses changed files.
+        """
+        diagnostics = self.calibrate(useCache=False, keepData=True)["residualDiagnostics"]
+        values = diagnostics.residuals()
+        state = diagnostics.__getstate__()
+        self.assertIsNone(state["loadedFiles"])
+        self.assertIsNone(state["values"])
+
+        restored = pickle.loads(pickle.dumps(diagnostics))
+        np.testing.assert_array_equal(restored.residuals()["residual"], values["residual"])
+        np.testing.assert_array_equal(restored.residuals()["predicted"], values["predicted"])
+
+        with open(self.fileList[1], "a") as f:
+            f.write("0.000\n")
+        with self.assertRaises(ValueError):
+            pickle.loads(pickle.dumps(diagnostics)).residuals()
+
+
+class TestKeepDataAfterStepwise(CalibrationTestCase):
+    stepwise = True
+
+    def setUp(self):
+        super().setUp()
+        ## Keeps the 2nd and 4th predictors, whatever the data
+        self.stepWiseRegression = CalibrateModel.stepWiseRegression
+        CalibrateModel.stepWiseRegression = lambda xMatrix, yMatrix, NPredictors: {
+            "newFileList": [2, 4], "noOfCols": 3, "NPredictors": 2, "xMatrix": xMatrix[:, [0, 2, 4]]}
+
+    def tearDown(self):
+        CalibrateModel.stepWiseRegression = self.stepWiseRegression
+        super().tearDown()
+
+    def test_predictor_data_follows_selected_predictors(self):
+        """
+        predictorData holds the predictors the model kept, also when the result comes from the cache.
+        """
+        cacheDir = os.path.join(self.tempDir, "cache")
+        for attempt in ("calibrated", "cached"):
+            output = self.calibrate(useCache=True, cacheDir=cacheDir, keepData=True)
+            self.assertEqual(list(output["Predictors"]), [self.fileList[2], self.fileList[4]], attempt)
+            expected = loadFilesIntoMemory([self.fileList[0], self.fileList[2], self.fileList[4]])
+            self.assertEqual(len(output["predictorData"]), 3, attempt)
+            for loaded, wanted in zip(output["predictorData"], expected):
+                np.testing.assert_array_equal(loaded, wanted)
+
+    def test_residuals_use_selected_predictors(self):
+        """
+        The residuals after stepwise regression come from the predictors the model kept.
+        """
+        diagnostics = self.calibrate(useCache=False)["residualDiagnostics"]
+        self.assertEqual(diagnostics.fits[0][2], [0, 2, 4])
+        np.testing.assert_allclose(diagnostics.residuals()["residual"],
+                                   self.expectedResiduals(diagnostics, [0, 2, 4]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+# src/tests/test_par_model.py
+
+import os
+import shutil
+import datetime
+import unittest
+import tempfile
+import numpy as np
+
+from src.lib.ParModel import ParModel
+
+## Two predictors with autoregression, rows as calibrateModel writes them:
+## intercept, predictors, autoregression, SE, RSQR
+AR_PAR = "\n".join(
+    ["2", "12", "366", "01/01/1961", "20089", "01/01/1975", "5844", "#False#", "1", "1", "True",
+     "tmax.dat", "ncep_mslp.dat", "ncep_p500.dat"]
+    + [f"{5 + month:.3f}\t-1.444\t3.343\t0.656\t2.958\t0.915\t" for month in range(12)]
+    + ["tmax.dat"]) + "\n"
+
+
+def sampleModel(autoRegression=False, rainYes=True, deTrend=False):
+    rng = np.random.default_rng(3)
+    nPredictors = 3
+    model = ParModel({
+        "nPredictors": nPredictors,
+        "seasonCode": 4,
+        "yearLength": 365,
+        "startDate": datetime.date(1961, 1, 1),
+        "recordLength": 10957,
+        "calStartDate": datetime.date(1971, 1, 1),
+        "calLength": 3652,
+        "rainYes": rainYes,
+        "modelTrans": 1,
+        "ensembleSize": 1,
+        "autoRegression": autoRegression,
+        "ptandFilename": "prec.dat",
+        "predictorFilenames": ["prec.dat", "a.dat", "b.dat", "c.dat"],
+        "unconParms": np.round(rng.normal(size=(12, nPredictors + 3 + int(autoRegression))), 3),
+        "conParms": np.round(rng.normal(size=(12, nPredictors + 4)), 3) if rainYes else None,
+        "lamdaArray": None,
+        "ptandFileRoot": "prec.dat",
+        "deTrend": deTrend,
+        "deTrendType": 1 if deTrend else 0,
+        "betaTrend": rng.normal(size=(4, 2)) if deTrend else None,
+    })
+    return model
+
+
+class TestParModel(unittest.TestCase):
+    def assertModelsEqual(self, first, second):
+        self.assertEqual(sorted(first.keys()), sorted(second.keys()))
+        for key in first:
+            if first[key] is None or isinstance(first[key], np.ndarray):
+                if first[key] is None:
+                    self.assertIsNone(second[key], key)
+                else:
+                    np.testing.assert_array_equal(first[key], second[key], err_msg=key)
+            else:
+                self.assertEqual(first[key], second[key], key)
+
+    def test_text_round_trip(self):
+        """
+        A model written with toText reads back the same, with and without autoregression and detrend.
+        """
+        for options in ({}, {"autoRegression": True}, {"rainYes": False, "deTrend": True}):
+            model = sampleModel(**options)
+            self.assertModelsEqual(model, ParModel.fromText(model.toText()))
+
+    def test_autoregression_column_order(self):
+        """
+        The file has the autoregression coefficient before SE, a ParModel has SE first, and the text
+        written back is the text read.
+        """
+        model = ParModel.fromText(AR_PAR)
+        nPredictors = model["nPredictors"]
+        self.assertEqual(model["unconParms"][0, nPredictors + 1], 2.958)
+        self.assertEqual(model["unconParms"][0, nPredictors + 2], 0.656)
+        self.assertEqual(model.toText(), AR_PAR)
+
+    def test_power_detrend_written_as_calibration_wrote_it(self):
+        """
+        A zero minimum in the power detrend rows is written as 0, as calibrateModel always wrote it,
+        and other values as the float Python prints.
+        """
+        model = sampleModel(rainYes=False, deTrend=True)
+        model["deTrendType"] = 2
+        model["betaTrend"] = np.array([[0.59187, 0.12731, 0.0], [2.8, -0.1, -3.5], [1.0, 0.5, 0.0], [0.3, 0.3, 0.0]])
+        text = model.toText()
+        self.assertEqual(text.splitlines()[-4:], ["0.59187\t0.12731\t0", "2.8\t-0.1\t-3.5", "1.0\t0.5\t0", "0.3\t0.3\t0"])
+        self.assertModelsEqual(model, ParModel.fromText(text))
+
+    def test_sidecar_round_trip(self):
+        """
+        The JSON sidecar gives back the parsed model, and is not used once the PAR file changes.
+        """
+        tempDir = tempfile.mkdtemp()
+        try:
+            filePath = os.path.join(tempDir, "model.PAR")
+            with open(filePath, "w") as f:
+                f.write(AR_PAR)
+            model = ParModel.read(filePath, useSidecar=True)
+            self.assertTrue(os.path.exists(ParModel.sidecarPath(filePath)))
+            self.assertModelsEqual(model, ParModel.loadSidecar(filePath))
+
+            with open(filePath, "a") as f:
+                f.write("\n")
+            self.assertIsNone(ParModel.loadSidecar(filePath))
+        finally:
+            shutil.rmtree(tempDir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,307 @@
+# src/tests/test_quality_control.py
+
+import os
+import csv
+import shutil
+import datetime
+import unittest
+import tempfile
+import numpy as np
+
+from src.lib.QualityControl import (
+    pettittStatistic,
+    pettittCalc,
+    pettittSeasonal,
+    pettittTest,
+    calendarIndex,
+    batchQualityCheck,
+    qualityCheck,
+    streamingQualityCheck,
+    dailyMeans,
+    streamingDailyMeans,
+    getOutliers,
+    streamingOutliers,
+    checkData,
+    dailyStatistics,
+    findOutliers,
+    valueIsValid,
+    reportColumns,
+)
+
+SETTINGS = """[Settings]
+yearindicator = 366
+globalsdate = 01/01/1999
+globaledate = 31/12/2028
+allowneg = True
+randomseed = False
+thresh = 0
+globalmissingcode = -999
+defaultdir = .
+varianceinflation = 12
+biascorrection = 1
+fixedthreshold = 0.5
+modeltransformation = None
+optimizationalgorithm = Ordinary Least Squares
+criteriatype = AIC Criteria
+stepwiseregression = False
+conditionalselection = Stochastic
+months = 0,0,0,0,0,0,0,0,0,0,0,0
+"""
+
+## The value by value loops the array versions replaced, kept here as the reference
+
+def scalarCheck(data, applyThresh, missingCode, thresh):
+    """Min, max, mean and the largest adjacent difference as qualityCheck worked them out"""
+    totalCount = len(data)
+    missingCount = sum(1 if entry == missingCode else 0 for entry in data)
+    okCount = totalCount - missingCount
+    threshCount = sum(1 if valueIsValid(entry, True, missingCode, thresh) else 0 for entry in data)
+    validData = [entry for entry in data if valueIsValid(entry, applyThresh, missingCode, thresh)]
+
+    prevValue = missingCode
+    maxDifference = -9999
+    maxDiffVal1 = maxDiffVal2 = missingCode
+    for i in range(len(data)):
+        if prevValue != missingCode:
+            if valueIsValid(data[i], applyThresh, missingCode, thresh):
+                difference = abs(prevValue - data[i])
+                if difference > maxDifference:
+                    maxDifference = round(difference, 4)
+                    maxDiffVal1 = prevValue
+                    maxDiffVal2 = data[i]
+        if (applyThresh and data[i] > thresh) or (not applyThresh):
+            prevValue = data[i]
+
+    mean = round(sum(validData) / (threshCount if applyThresh else okCount), 4)
+    return (min(validData), max(validData), mean, totalCount, missingCount, okCount,
+            maxDifference, maxDiffVal1, maxDiffVal2, threshCount)
+
+def scalarDailyStatistics(data, applyThresh, missingCode, thresh, globalSDate):
+    dailyStats = np.zeros((7, 4), float)
+    day = globalSDate.weekday()
+    for value in data:
+        if valueIsValid(value, applyThresh, missingCode, thresh):
+            dailyStats[day][0] += value
+            dailyStats[day][1] += 1
+        day = (day + 1) % 7
+    for stat in dailyStats:
+        stat[2] = stat[0] / stat[1] if stat[1] > 0 else missingCode
+    day = globalSDate.weekday()
+    for value in data:
+        if dailyStats[day][2] != missingCode and valueIsValid(value, applyThresh, missingCode, thresh):
+            dailyStats[day][3] += (value - dailyStats[day][2]) ** 2
+        day = (day + 1) % 7
+    for stat in dailyStats:
+        stat[3] = np.sqrt(stat[3] / stat[1]) if stat[1] > 0 else missingCode
+    return dailyStats
+
+def scalarOutliers(data, sdFilterValue, applyThresh, missingCode, thresh):
+    workingData = [value for value in data if valueIsValid(value, applyThresh, missingCode, thresh)]
+    mean = sum(workingData) / len(workingData)
+    sd = 0
+    for value in workingData:
+        sd += np.power((value - mean), 2)
+    sdFilter = np.sqrt(sd / len(workingData)) * sdFilterValue
+    index = []
+    outliers = []
+    for i in range(len(data)):
+        if valueIsValid(data[i], applyThresh, missingCode, thresh) and (data[i] > (mean + sdFilter) or data[i] < (mean - sdFilter)):
+            index.append(i + 1)
+            outliers.append(data[i])
+    return index, outliers
+
+
+class QualityControlTestCase(unittest.TestCase):
+    """
+    Runs each test in a scratch directory, as getSettings writes a default
+    settings.ini to the working directory when there is none.
+    """
+
+    def setUp(self):
+        self.oldDir = os.getcwd()
+        self.tempDir = tempfile.mkdtemp()
+        os.chdir(self.tempDir)
+
+    def tearDown(self):
+        os.chdir(self.oldDir)
+        shutil.rmtree(self.tempDir, ignore_errors=True)
+
+
+class TestPettitt(QualityControlTestCase):
+    def test_constant_series_has_no_change_point(self):
+        """
+        An all-dry month gives a constant yearly series, which has no change point.
+        """
+        self.assertEqual(pettittStatistic(np.zeros(20)), (1.0, None))
+        pettittVal, changeYear = pettittCalc(np.zeros(20), 1961, -999)
+        self.assertEqual(changeYear, -999)
+
+        results = pettittSeasonal(np.zeros(3650), 90, False, "monthly")
+        self.assertEqual(len(results), 12)
+        for result in results:
+            self.assertEqual(result["changeYear"], -999)
+
+    def test_change_point_is_never_the_last_value(self):
+        """
+        With tied ranks U is largest at the last value, which has no year after it.
+        """
+        data = np.array([1, 1, 1, 1, 1, 1, 1, 0], dtype=float)
+        pettittVal, maxPos = pettittStatistic(data)
+        self.assertLess(maxPos, len(data) - 1)
+
+    def test_step_change(self):
+        """
+        A clear step is found at the first year after it.
+        """
+        data = np.r_[np.zeros(15), np.ones(15) * 5] + np.linspace(0, 0.1, 30)
+        pettittVal, changeYear = pettittCalc(data, 1961, -999)
+        self.assertLess(pettittVal, 0.05)
+        self.assertEqual(changeYear, 1976)
+
+    def dailySeries(self, changeFrom, months=range(1, 13)):
+        """30 years of daily values from 1999 (written to settings.ini), higher in the given months from changeFrom on"""
+        with open("settings.ini", "w") as f:
+            f.write(SETTINGS)
+        start = datetime.date(1999, 1, 1)
+        nDays = (datetime.date(2028, 12, 31) - start).days + 1
+        years, monthOfDay = calendarIndex(nDays, start)
+        dates = np.datetime64(start) + np.arange(nDays)
+        rng = np.random.default_rng(9)
+        data = 1 + rng.uniform(0, 0.1, nDays)
+        data[(dates >= np.datetime64(changeFrom)) & np.isin(monthOfDay, months)] += 5
+        return data, years
+
+    def test_change_year_skips_dropped_years(self):
+        """
+        With a year left out for missing values, the annual test and the per season tests give the
+        same calendar year for a change at the start of the winter of 2012.
+        """
+        data, years = self.dailySeries("2011-12-01")
+        data[years == 2003] = -999
+        self.assertEqual(pettittTest(data, 90, False)[1], 2012)
+        self.assertEqual(pettittSeasonal(data, 90, False, "annual")[0]["changeYear"], 2012)
+        for result in pettittSeasonal(data, 90, False, "seasonal"):
+            self.assertNotIn(2003, result["years"])
+            self.assertEqual(result["changeYear"], 2012, result["name"])
+
+    def test_winter_takes_the_previous_december(self):
+        """
+        December belongs to the winter of the January after it, so a change in December 2011 is a
+        change in the winter of 2012.
+        """
+        data, years = self.dailySeries("2011-12-01", months=(12,))
+        winter = pettittSeasonal(data, 90, False, "seasonal")[0]
+        self.assertEqual(winter["name"], "Winter")
+        self.assertEqual(winter["changeYear"], 2012)
+        ## Winter 1999 has no December and the December of 2028 goes with a winter after the data,
+        ## so neither has enough days
+        self.assertEqual(winter["years"][0], 2000)
+        self.assertEqual(winter["years"][-1], 2028)
+
+
+class TestScalarParity(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(21)
+        self.missingCode = -999
+        self.thresh = 0.5
+        data = np.round(rng.gamma(1, 1.5, 4000), 3)
+        data[rng.random(len(data)) < 0.3] = 0
+        data[rng.random(len(data)) < 0.05] = self.missingCode
+        ## Adjacent differences of 20 within 0.0001 of each other, well above any the gamma draws give,
+        ## some across a missing value or a dry day, so the rounded running maximum decides the pair
+        for position, (first, second) in zip((500, 900, 1300, 1700, 2100, 2500, 2900),
+                                             ((1, 21.00004), (21.00006, 1), (2, 22.00003), (1, 21.0001),
+                                              (3, 23.00009), (22.00005, 1.00001), (4, 24.0000))):
+            data[position:position + 2] = first, second
+        data[2502] = self.missingCode
+        data[2901:2903] = (0, 20.00007)
+        self.data = data
+
+    def test_check_data(self):
+        """
+        The counts, min, max, mean and largest adjacent difference (with its pair of values) are the
+        ones the value by value loop finds, with and without the threshold.
+        """
+        for applyThresh in (False, True):
+            with self.subTest(applyThresh=applyThresh):
+                result = checkData(self.data, applyThresh, 90, self.missingCode, self.thresh)
+                self.assertEqual(tuple(result[:10]), scalarCheck(self.data.tolist(), applyThresh, self.missingCode, self.thresh))
+
+    def test_daily_statistics_and_outliers(self):
+        """
+        The weekday sums, counts, means and standard deviations and the outliers found match the loops.
+        """
+        start = datetime.date(1961, 1, 1)
+        for applyThresh in (False, True):
+            with self.subTest(applyThresh=applyThresh):
+                np.testing.assert_allclose(dailyStatistics(self.data, applyThresh, self.missingCode, self.thresh, start),
+                                           scalarDailyStatistics(self.data, applyThresh, self.missingCode, self.thresh, start),
+                                           rtol=1e-12)
+                index, outliers = findOutliers(self.data, 2, applyThresh, self.missingCode, self.thresh)
+                self.assertGreater(len(index), 0)
+                self.assertEqual((index, outliers), scalarOutliers(self.data, 2, applyThresh, self.missingCode, self.thresh))
+
+
+class TestBatchReport(QualityControlTestCase):
+    def test_report_has_seasonal_pettitt(self):
+        """
+        The batch report holds a Pettitt result per season, and a file that can't be read gets an error row.
+        """
+        inputDir = os.path.join(self.tempDir, "input")
+        os.mkdir(inputDir)
+        rng = np.random.default_rng(1)
+        np.savetxt(os.path.join(inputDir, "good.dat"), rng.gamma(2, 2, 3650), fmt="%.3f")
+        with open(os.path.join(inputDir, "bad.dat"), "w") as f:
+            f.write("not a number\n")
+
+        reportPath = os.path.join(self.tempDir, "report.csv")
+        results = batchQualityCheck(inputDir, reportPath, processes=1)
+        self.assertIsNone(results["error"])
+        self.assertEqual(results["failed"], 1)
+
+        with open(reportPath, newline="") as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(list(rows[0].keys()), reportColumns)
+        good = [row for row in rows if row["file"] == "good.dat"][0]
+        self.assertEqual(good["error"], "")
+        for season in ("winter", "spring", "summer", "autumn"):
+            self.assertNotEqual(good[season + "Pettitt"], "")
+
+
+class TestStreaming(QualityControlTestCase):
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(4)
+        data = np.round(rng.gamma(0.8, 4, 3 * 3652 + 17), 3)
+        data[rng.random(len(data)) < 0.3] = 0
+        data[rng.random(len(data)) < 0.05] = -999
+        self.filePath = os.path.join(self.tempDir, "data.dat")
+        np.savetxt(self.filePath, data, fmt="%.3f")
+
+    def test_matches_in_memory(self):
+        """
+        Reading the file in small chunks, whose edges fall part way through weeks and years, gives
+        the same quality check, weekday means and outliers as loading it whole (the in-memory
+        functions take a list of files, as the screen passes them).
+        """
+        chunkSize = 97
+        for applyThresh in (False, True):
+            inMemory = qualityCheck([self.filePath], applyThresh, 90)
+            streamed = streamingQualityCheck(self.filePath, applyThresh, 90, chunkSize)
+            self.assertEqual(len(streamed), len(inMemory))
+            for first, second in zip(inMemory, streamed):
+                self.assertAlmostEqual(first, second, places=8)
+
+            self.assertEqual(streamingDailyMeans(self.filePath, applyThresh, chunkSize),
+                             dailyMeans([self.filePath], applyThresh))
+
+            inMemoryFile = os.path.join(self.tempDir, "inMemory.out")
+            streamedFile = os.path.join(self.tempDir, "streamed.out")
+            self.assertEqual(streamingOutliers(self.filePath, streamedFile, 2, applyThresh, chunkSize),
+                             getOutliers([self.filePath], inMemoryFile, 2, applyThresh))
+            with open(inMemoryFile) as first, open(streamedFile) as second:
+                self.assertEqual(first.read(), second.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,188 @@
+# src/tests/test_screen_vars.py
+
+import os
+import shutil
+import datetime
+import unittest
+import tempfile
+import numpy as np
+
+from src.lib.ScreenVars import laggedCorrelationScan, partialCorrelation, partialCorrelations, screenPredictors
+
+SETTINGS = """[Settings]
+yearindicator = 366
+globalsdate = 01/01/1961
+globaledate = 31/12/1970
+allowneg = True
+randomseed = False
+thresh = 0
+globalmissingcode = -999
+defaultdir = .
+varianceinflation = 12
+biascorrection = 1
+fixedthreshold = 0.5
+modeltransformation = None
+optimizationalgorithm = Ordinary Least Squares
+criteriatype = AIC Criteria
+stepwiseregression = False
+conditionalselection = Stochastic
+months = 0,0,0,0,0,0,0,0,0,0,0,0
+"""
+INPUTS = {"fSDate": datetime.date(1961, 1, 1), "fEDate": datetime.date(1970, 12, 31), "conditional": False}
+
+
+class ScreenVarsTestCase(unittest.TestCase):
+    """
+    Works on synthetic records (1961-1970) in a scratch directory holding its own settings.ini.
+    """
+
+    def setUp(self):
+        self.oldDir = os.getcwd()
+        self.tempDir = tempfile.mkdtemp()
+        os.chdir(self.tempDir)
+        with open("settings.ini", "w") as f:
+            f.write(SETTINGS)
+
+        nDays = (datetime.date(1970, 12, 31) - datetime.date(1961, 1, 1)).days + 1
+        rng = np.random.default_rng(2)
+        self.predictors = rng.normal(size=(3, nDays))
+        ## The predictand follows the first predictor three days later
+        self.predictand = np.r_[np.zeros(3), self.predictors[0, :-3]] + rng.normal(scale=0.5, size=nDays)
+        self.predictandFile = self.save("predictand.dat", self.predictand)
+        self.predictorFiles = [self.save(f"predictor{i + 1}.dat", values) for i, values in enumerate(self.predictors)]
+
+    def tearDown(self):
+        os.chdir(self.oldDir)
+        shutil.rmtree(self.tempDir, ignore_errors=True)
+
+    def save(self, name, values):
+        filePath = os.path.join(self.tempDir, name)
+        np.savetxt(filePath, values, fmt="%.6f")
+        return filePath
+
+
+class TestLaggedCorrelationScan(ScreenVarsTestCase):
+    def test_no_predictand(self):
+        """
+        A missing predictand is reported however the screen passes it.
+        """
+        for predictand in ([""], [None], []):
+            self.assertEqual(laggedCorrelationScan(predictand, self.predictorFiles, INPUTS)["error"], "Predictand Error")
+
+    def test_finds_lag(self):
+        """
+        The best lag is the shift the predictand was built with, and its correlation is the plain
+        correlation of the shifted pairs.
+        """
+        results = laggedCorrelationScan([self.predictandFile], self.predictorFiles, INPUTS, maxLag=5, periods=(0,))
+        self.assertIsNone(results["error"])
+        best = results["bestLag"][results["names"][0]]["Annual"]
+        self.assertEqual(best["lag"], 3)
+
+        ## The scan covers the (fEDate - fSDate) days from the start
+        nDays = len(self.predictand) - 1
+        y = np.round(self.predictand, 6)[3:nDays]
+        x = np.round(self.predictors[0], 6)[:nDays - 3]
+        self.assertAlmostEqual(best["correlation"], np.corrcoef(y, x)[0, 1], places=8)
+        self.assertEqual(best["n"], nDays - 3)
+
+
+class TestScreenPredictors(ScreenVarsTestCase):
+    def setUp(self):
+        super().setUp()
+        ## A directory of predictors that follow the predictand closely, loosely and not at all, and a
+        ## stray file too short for the fit period
+        self.predictorDir = os.path.join(self.tempDir, "predictors")
+        os.mkdir(self.predictorDir)
+        rng = np.random.default_rng(9)
+        nDays = len(self.predictand)
+        self.strongFile = self.save(os.path.join("predictors", "strong.dat"), self.predictand + rng.normal(scale=0.5, size=nDays))
+        self.save(os.path.join("predictors", "medium.dat"), self.predictand + rng.normal(scale=2, size=nDays))
+        self.save(os.path.join("predictors", "noise.dat"), self.predictors[1])
+        self.shortFile = self.save(os.path.join("predictors", "short.dat"), np.zeros(10))
+
+    def screen(self, **kwargs):
+        inputs = dict(INPUTS, autoRegressionTick=kwargs.pop("autoRegressionTick", False))
+        results = screenPredictors([self.predictandFile], self.predictorDir, inputs, **kwargs)
+        self.assertIsNone(results["error"])
+        return results
+
+    def test_ranking(self):
+        """
+        Files too short for the fit period are skipped, the rest are ranked by the size of the chosen
+        column, and each correlation is the plain correlation over the fit period.
+        """
+        results = self.screen(rankBy="correlation")
+        self.assertEqual(results["skipped"], [self.shortFile])
+        ranking = results["ranking"]
+        self.assertEqual([row["name"] for row in ranking], ["strong.dat", "medium.dat", "noise.dat"])
+        self.assertEqual([row["rank"] for row in ranking], [1, 2, 3])
+
+        nDays = len(self.predictand) - 1
+        expected = np.corrcoef(np.loadtxt(self.strongFile)[:nDays], np.loadtxt(self.predictandFile)[:nDays])[0, 1]
+        self.assertAlmostEqual(ranking[0]["correlation"], expected, places=10)
+        ## Months that are not significant add nothing to the explained variance
+        self.assertEqual(ranking[2]["significantMonths"], 0)
+        self.assertEqual(ranking[2]["meanRSQD"], 0)
+        self.assertAlmostEqual(ranking[0]["meanRSQD"], sum(ranking[0]["RSQD"]) / 12)
+
+        for rankBy in ("meanRSQD", "partialCorrelation"):
+            values = [abs(row[rankBy]) for row in self.screen(rankBy=rankBy)["ranking"]]
+            self.assertEqual(values, sorted(values, reverse=True))
+
+    def test_processes(self):
+        """
+        Splitting the explained variance across worker processes gives the in-process table.
+        """
+        self.assertEqual(self.screen(processes=2)["ranking"], self.screen(processes=1)["ranking"])
+
+    def test_autoregression_column(self):
+        """
+        With autoregression ticked the lagged predictand is an extra last column, so every predictor
+        keeps its own correlation and explained variance and the lagged column is not ranked.
+        """
+        plain = self.screen(rankBy="correlation")["ranking"]
+        lagged = self.screen(rankBy="correlation", autoRegressionTick=True)["ranking"]
+        self.assertEqual([row["file"] for row in lagged], [row["file"] for row in plain])
+        for plainRow, laggedRow in zip(plain, lagged):
+            ## The lag leaves the first day out of the correlation, nothing more
+            self.assertAlmostEqual(laggedRow["correlation"], plainRow["correlation"], delta=1e-3)
+            self.assertEqual(laggedRow["RSQD"], plainRow["RSQD"])
+            self.assertEqual(laggedRow["pr"], plainRow["pr"])
+
+
+class TestPartialCorrelations(unittest.TestCase):
+    def test_matches_recursion_and_residuals(self):
+        """
+        Each partial correlation is the one the recursive formula gives, and the plain correlation of
+        the residuals left after regressing both variables on the controlling ones.
+        """
+        rng = np.random.default_rng(5)
+        data = rng.normal(size=(500, 5)) @ rng.normal(size=(5, 5))
+        crossCorr = np.corrcoef(data, rowvar=False)
+        results = partialCorrelations(crossCorr)
+        self.assertEqual(results.shape, (4,))
+
+        for i in range(1, 5):
+            controls = [j for j in range(1, 5) if j != i]
+            recursive = partialCorrelation(0, i, len(controls), crossCorr, controls)
+            self.assertAlmostEqual(results[i - 1], recursive, places=10)
+
+            design = np.column_stack([np.ones(len(data)), data[:, controls]])
+            residuals = [data[:, k] - design @ np.linalg.lstsq(design, data[:, k], rcond=None)[0] for k in (0, i)]
+            self.assertAlmostEqual(results[i - 1], np.corrcoef(*residuals)[0, 1], places=10)
+
+    def test_singular_matrix(self):
+        """
+        A duplicated variable makes the correlation matrix singular and every result -1.
+        """
+        rng = np.random.default_rng(6)
+        data = rng.normal(size=(100, 3))
+        data = np.column_stack([data, data[:, 1]])
+        crossCorr = np.corrcoef(data, rowvar=False)
+        crossCorr[1, 3] = crossCorr[3, 1] = 1.0
+        np.testing.assert_array_equal(partialCorrelations(crossCorr), -np.ones(3))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,161 @@
+# src/tests/test_summary_statistics.py
+
+import os
+import pickle
+import shutil
+import datetime
+import unittest
+import tempfile
+from unittest import mock
+import numpy as np
+
+from src.lib.SummaryStatistics import StatisticsSink, mergeMoments, maskedMoments, statNames
+
+START = datetime.date(1975, 3, 17) ## Part way through a month, season and year
+N_DAYS = 6 * 365 + 40
+SETTINGS = {"threshold": 0.3, "pot": 10, "pbt": 2, "percentile": 80, "precPot": 85, "nDayTotal": 4}
+## Summary Statistics reads its dates and missing code from settings.ini in the working directory
+SETTINGS_INI = """[Settings]
+yearindicator = 366
+globalsdate = 17/03/1975
+globaledate = 31/12/1981
+globalmissingcode = -999
+"""
+
+
+class TestMergeMoments(unittest.TestCase):
+    def test_chunks_match_whole(self):
+        """
+        Merging the moments of two chunks gives the moments of all the values together.
+        """
+        rng = np.random.default_rng(5)
+        values = rng.gamma(2, 3, (500, 4))
+        mask = values > 2
+        whole = maskedMoments(values, mask)
+        first = maskedMoments(values[:123], mask[:123])
+        second = maskedMoments(values[123:], mask[123:])
+        merged = mergeMoments(first[0], first[1], first[2], second[0], second[1], second[2], first[3], second[3])
+        for wanted, got in zip(whole, merged):
+            np.testing.assert_allclose(got, wanted)
+
+        ## Without third moments, as QualityControl uses it, and with nothing on one side
+        count, mean, M2 = mergeMoments(0, 0.0, 0.0, 10, 4.5, 82.5)
+        self.assertEqual((count, mean, M2), (10, 4.5, 82.5))
+
+
+class TestStatisticsSink(unittest.TestCase):
+    def test_default_keeps_no_values(self):
+        """
+        The default statistics are all running totals, nothing from the run is kept in memory.
+        """
+        sink = StatisticsSink(datetime.date(1961, 1, 1), 3, -999.0)
+        self.assertFalse(sink.keepValues)
+        sink.add(0, np.ones((400, 3)))
+        self.assertEqual(sink.storedValues, [])
+        self.assertTrue(StatisticsSink(datetime.date(1961, 1, 1), 3, -999.0, ["Median"]).keepValues)
+
+
+class TestSummaryStatisticsParity(unittest.TestCase):
+    """
+    The sink against calc_stats of the Summary Statistics screen (run offscreen), all 30 statistics,
+    on two members of rainfall-like data with dry days and missing values.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        from PyQt5.QtWidgets import QApplication
+        from src.modules import summary_statistics
+
+        cls.app = QApplication.instance() or QApplication([])
+        rng = np.random.default_rng(8)
+        cls.values = np.round(rng.gamma(0.7, 5, (N_DAYS, 2)), 3)
+        cls.values[rng.random(cls.values.shape) < 0.4] = 0
+        cls.values[rng.random(cls.values.shape) < 0.03] = -999.0
+
+        oldDir = os.getcwd()
+        tempDir = tempfile.mkdtemp()
+        try:
+            os.chdir(tempDir)
+            with open("settings.ini", "w") as f:
+                f.write(SETTINGS_INI)
+            with open("member.sim", "w") as f:
+                f.write(f"1\n12\n366\n{START.strftime('%d/%m/%Y')}\n{N_DAYS}\n#TRUE#\n1\n")
+            startTime = datetime.datetime.combine(START, datetime.time())
+            cls.expected = []
+            for member in range(cls.values.shape[1]):
+                np.savetxt("member.out", cls.values[:, member], fmt="%.3f")
+                widget = summary_statistics.ContentWidget()
+                widget.stats_params = [(name, "Y", description) for name, _, description in widget.stats_params]
+                widget.threshold, widget.pot, widget.pbt = SETTINGS["threshold"], SETTINGS["pot"], SETTINGS["pbt"]
+                widget.percentile, widget.prec_pot = SETTINGS["percentile"], SETTINGS["precPot"]
+                widget.nday_total = SETTINGS["nDayTotal"]
+                widget.input_filename = "member.out"
+                widget.input_file_root = os.path.join(tempDir, "member.out")
+                widget.sim_fname = os.path.join(tempDir, "member.sim")
+                widget.save_filename = "member.txt"
+                widget.source_modelled.setChecked(True)
+                widget.ensemble_mean_check.setChecked(True)
+                with mock.patch.object(summary_statistics, "QMessageBox") as messageBox:
+                    widget.calc_stats(startTime, startTime + datetime.timedelta(days=N_DAYS - 1), False)
+                assert not messageBox.mock_calls, messageBox.mock_calls
+                cls.expected.append(widget.results_array[1, 1:18, 1:31].copy())
+        finally:
+            os.chdir(oldDir)
+            shutil.rmtree(tempDir, ignore_errors=True)
+
+    def newSink(self, members=2):
+        return StatisticsSink(START, members, -999.0, statNames, SETTINGS)
+
+    def addBlocks(self, sink, values, blockDays, first=0, last=N_DAYS):
+        for day in range(first, last, blockDays):
+            sink.add(day, values[day:min(day + blockDays, last)])
+
+    def assertMatchesCalcStats(self, sink):
+        members = sink.results()["members"]
+        for member, expected in enumerate(self.expected):
+            np.testing.assert_allclose(members[member], expected, rtol=1e-9, atol=1e-9)
+
+    def test_block_sizes(self):
+        """
+        Every statistic matches calc_stats however the run is split into blocks of days.
+        """
+        for blockDays in (1, 37, 365, 1000, N_DAYS):
+            with self.subTest(blockDays=blockDays):
+                sink = self.newSink()
+                self.addBlocks(sink, self.values, blockDays)
+                self.assertMatchesCalcStats(sink)
+
+    def test_restore_running_totals(self):
+        """
+        A sink restored from the running totals and kept values of a part run (as a checkpoint holds
+        them) finishes with the same statistics.
+        """
+        sink = self.newSink()
+        self.addBlocks(sink, self.values, 100, last=1300)
+        totals = pickle.loads(pickle.dumps(sink.runningTotals()))
+        self.assertNotIn("storedValues", totals)
+
+        resumed = self.newSink()
+        resumed.restore(totals, list(sink.storedValues))
+        self.addBlocks(resumed, self.values, 100, first=1300)
+        self.assertMatchesCalcStats(resumed)
+
+    def test_join(self):
+        """
+        Joining closed sinks of one member each (as worker processes hand them back) gives the
+        statistics of one sink for both members.
+        """
+        parts = []
+        for member in range(2):
+            part = self.newSink().forMembers(1)
+            self.addBlocks(part, self.values[:, member:member + 1], 365)
+            part.close()
+            parts.append(part)
+        joined = self.newSink()
+        joined.join(parts)
+        self.assertMatchesCalcStats(joined)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,244 @@
+# src/tests/test_transform_data.py
+
+import os
+import shutil
+import unittest
+import tempfile
+import numpy as np
+
+from src.lib import TransformData
+from src.lib.utils import getSettings
+from src.lib.TransformData import (
+    genericTransform,
+    binomial,
+    backwardsChange,
+    removeOutliers,
+    valueIsValid,
+    runPipeline,
+    applyTransform,
+    batchTransform,
+    batchOutputName,
+    checkNameTemplate,
+    loadData,
+)
+
+
+class TransformTestCase(unittest.TestCase):
+    """
+    Runs each test in a scratch directory, as getSettings writes a default
+    settings.ini to the working directory when there is none.
+    """
+
+    def setUp(self):
+        self.oldDir = os.getcwd()
+        self.tempDir = tempfile.mkdtemp()
+        os.chdir(self.tempDir)
+
+    def tearDown(self):
+        os.chdir(self.oldDir)
+        shutil.rmtree(self.tempDir, ignore_errors=True)
+
+
+class TestPipeline(TransformTestCase):
+    def test_steps_run_in_order(self):
+        """
+        A pipeline gives the same data as running its steps one at a time.
+        """
+        data = np.arange(1, 21, dtype=float).reshape(-1, 1)
+        steps = ["x²", ("Lag n", {"n": 2}), "Ln"]
+        expected = data
+        for step in steps:
+            expected, _ = applyTransform(expected, step, False)
+        result, info = runPipeline(data, steps, False)
+        np.testing.assert_array_equal(result, expected)
+        for i, name in enumerate(["x²", "Lag n", "Ln"]):
+            self.assertIn("Step " + str(i + 1) + " (" + name + ")", info)
+
+    def test_failed_step_stops_pipeline(self):
+        """
+        Steps after one that fails are not run.
+        """
+        result, info = runPipeline(np.ones((5, 1)), [("Lag n", {"n": 10}), "Ln"], False)
+        self.assertIsNone(result)
+        self.assertIn("Step 1", info)
+        self.assertNotIn("Step 2", info)
+
+
+## The value by value loops the array transforms replaced, kept here as the reference
+
+def scalarGeneric(data, func, applyThresh, missingCode, thresh):
+    returnData = np.empty_like(data)
+    success = overflow = failure = 0
+    for c in range(data.shape[1]):
+        for r in range(data.shape[0]):
+            if valueIsValid(data[r][c], applyThresh, missingCode, thresh):
+                returnData[r][c] = func(data[r][c], missingCode)
+                if returnData[r][c] == missingCode:
+                    overflow += 1
+                else:
+                    success += 1
+            else:
+                returnData[r][c] = data[r][c]
+                failure += 1
+    infoString = "Processed " + str(success + overflow + failure) + " values.\n"
+    if failure > 0:
+        infoString += str(failure) + " value(s) not transformed (missing or below threshold).\n"
+    if overflow > 0:
+        infoString += str(overflow) + " value(s) would have caused overflow, replaced by global missing code."
+    return returnData, infoString
+
+def notTransformedInfo(success, failure):
+    infoString = "Processed " + str(success + failure) + " values.\n"
+    if failure > 0:
+        infoString += str(failure) + " value(s) were not transformed (missing or below threshold)."
+    return infoString
+
+def scalarBinomial(data, cutOff, applyThresh, missingCode, thresh):
+    returnData = np.empty_like(data)
+    success = failure = 0
+    for c in range(data.shape[1]):
+        for r in range(data.shape[0]):
+            if valueIsValid(data[r][c], applyThresh, missingCode, thresh):
+                returnData[r][c] = 1 if data[r][c] > cutOff else 0
+                success += 1
+            else:
+                returnData[r][c] = data[r][c]
+                failure += 1
+    return returnData, notTransformedInfo(success, failure)
+
+def scalarBackwardsChange(data, applyThresh, missingCode, thresh):
+    returnData = np.empty_like(data)
+    success = failure = 0
+    for c in range(data.shape[1]):
+        for r in range(data.shape[0]):
+            if valueIsValid(data[r][c], applyThresh, missingCode, thresh):
+                success += 1
+                if r == 0 or not valueIsValid(data[r - 1][c], applyThresh, missingCode, thresh):
+                    returnData[r][c] = missingCode
+                else:
+                    returnData[r][c] = data[r][c] - data[r - 1][c]
+            else:
+                failure += 1
+                returnData[r][c] = data[r][c]
+    return returnData, notTransformedInfo(success, failure)
+
+def scalarRemoveOutliers(data, sdFilterValue, applyThresh, missingCode, thresh):
+    returnData = np.empty_like(data)
+    remained = removed = 0
+    for c in range(data.shape[1]):
+        column = data[:, c]
+        threshCol = [entry for entry in column if valueIsValid(entry, applyThresh, missingCode, thresh)]
+        mean = sum(threshCol) / len(threshCol)
+        sd = 0
+        for entry in threshCol:
+            sd += np.power((entry - mean), 2)
+        sdFilter = np.sqrt(sd / len(threshCol)) * sdFilterValue
+        for r in range(len(column)):
+            if valueIsValid(column[r], applyThresh, missingCode, thresh) and (column[r] > (mean + sdFilter) or column[r] < (mean - sdFilter)):
+                returnData[r, c] = missingCode
+                removed += 1
+            else:
+                returnData[r, c] = column[r]
+                remained += 1
+    infoString = "Processed " + str(remained + removed) + " values.\n"
+    if removed > 0:
+        infoString += str(removed) + " value(s) were identified as outliers and removed."
+    return returnData, infoString
+
+
+class TestArrayTransforms(TransformTestCase):
+    def setUp(self):
+        super().setUp()
+        settings = getSettings()
+        self.missingCode = settings["globalmissingcode"]
+        self.thresh = settings["fixedthreshold"]
+        rng = np.random.default_rng(12)
+        self.data = np.round(rng.normal(2, 3, (300, 2)), 3)
+        self.data[rng.random(self.data.shape) < 0.05] = self.missingCode
+        self.data[:4, 0] = [self.thresh, 0, 800, 1e200] ## At the threshold, zero and values that overflow
+        self.data[10, 1] = 1e-320
+        self.data[20, 1] = np.nan
+
+    def run(self, result=None):
+        ## Overflow and roots of negative values are expected here, on both sides
+        with np.errstate(all="ignore"):
+            return super().run(result)
+
+    def assertSameResult(self, result, expected):
+        np.testing.assert_array_equal(result[0], expected[0])
+        self.assertEqual(result[1], expected[1])
+
+    def test_generic_transforms(self):
+        """
+        Every single function transform gives the values, success / overflow / failure counts and info
+        string of running the scalar function value by value.
+        """
+        for func in TransformData.arrayTransforms:
+            for applyThresh in (False, True):
+                with self.subTest(func=func.__name__, applyThresh=applyThresh):
+                    self.assertSameResult(genericTransform(self.data, func, applyThresh),
+                                          scalarGeneric(self.data, func, applyThresh, self.missingCode, self.thresh))
+
+    def test_binomial_backwards_change_and_outliers(self):
+        """
+        Binomial, backwards change and outlier removal match their value by value loops.
+        """
+        ## Without the huge value and the NaN, which leave no outliers to find
+        data = self.data[4:].copy()
+        data[16, 1] = 1.5
+        for applyThresh in (False, True):
+            with self.subTest(applyThresh=applyThresh):
+                self.assertSameResult(binomial(self.data, 1.5, applyThresh),
+                                      scalarBinomial(self.data, 1.5, applyThresh, self.missingCode, self.thresh))
+                self.assertSameResult(backwardsChange(self.data, applyThresh),
+                                      scalarBackwardsChange(self.data, applyThresh, self.missingCode, self.thresh))
+                self.assertIn("identified as outliers", removeOutliers(data, 1, applyThresh)[1])
+                for outlierData in (self.data, data):
+                    self.assertSameResult(removeOutliers(outlierData, 1, applyThresh),
+                                          scalarRemoveOutliers(outlierData, 1, applyThresh, self.missingCode, self.thresh))
+
+
+class TestBatch(TransformTestCase):
+    def test_output_names(self):
+        """
+        {name} and {ext} are the input file's name and extension.
+        """
+        self.assertEqual(batchOutputName("/data/tmax.dat", "{name}_sq{ext}"), "tmax_sq.dat")
+        self.assertEqual(batchOutputName("prec.txt", "t_{name}.csv"), "t_prec.csv")
+
+    def test_bad_templates(self):
+        """
+        Templates that can't name a file are reported, not raised.
+        """
+        for template in ("{name}_{x}", "{}", "{0}{name}", "{name", "{name.upper}", "out{ext}", "sub/{name}{ext}"):
+            self.assertIsNotNone(checkNameTemplate(template), template)
+        self.assertIsNone(checkNameTemplate("{name}_transformed{ext}"))
+
+        inputDir = os.path.join(self.tempDir, "input")
+        os.mkdir(inputDir)
+        np.savetxt(os.path.join(inputDir, "a.dat"), np.ones(5))
+        outputDir = os.path.join(self.tempDir, "output")
+        results = batchTransform(inputDir, outputDir, ["x²"], nameTemplate="{name}_{x}", processes=1)
+        self.assertIsNotNone(results["error"])
+        self.assertFalse(os.path.exists(outputDir))
+
+    def test_batch_transforms_every_file(self):
+        """
+        Every file in the directory is transformed under the template name, with a report.
+        """
+        inputDir = os.path.join(self.tempDir, "input")
+        os.mkdir(inputDir)
+        for name in ("a", "b"):
+            np.savetxt(os.path.join(inputDir, name + ".dat"), np.arange(1, 6, dtype=float))
+        outputDir = os.path.join(self.tempDir, "output")
+        results = batchTransform(inputDir, outputDir, ["x²"], nameTemplate="{name}_sq{ext}", processes=1)
+        self.assertIsNone(results["error"])
+        self.assertEqual(results["failed"], 0)
+        for name in ("a", "b"):
+            squared = loadData([os.path.join(outputDir, name + "_sq.dat")])
+            np.testing.assert_array_equal(squared[:, 0], np.arange(1, 6) ** 2)
+        self.assertTrue(os.path.exists(os.path.join(outputDir, "transform_report.txt")))
+
+
+if __name__ == "__main__":
+    unittest.main()
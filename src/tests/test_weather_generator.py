@@ -0,0 +1,304 @@
+# src/tests/test_weather_generator.py
+
+import os
+import math
+import pickle
+import shutil
+import datetime
+import unittest
+import tempfile
+import numpy as np
+
+from src.lib.ParModel import ParModel
+from src.lib import WeatherGenerator
+from src.lib.WeatherGenerator import generateWeather, hasCheckpoint, prepareInverseNormal, translateInverseNormal
+from src.lib.SummaryStatistics import StatisticsSink, statNames
+
+START = datetime.date(1961, 1, 1)
+N_DAYS = 3 * WeatherGenerator.defaultBlockDays + 100 ## A few blocks, so runs can stop between them
+OPTIONS = {
+    "allowNeg": False,
+    "randomSeed": False,
+    "thresh": 0.0,
+    "globalMissingCode": -999.0,
+    "varianceInflation": 12,
+    "biasCorrection": 1.0,
+    "fixedThreshold": 0.5,
+    "conditionalSelection": 1,
+}
+## PAR files, predictors and the output the widget's own generator loop wrote for them (before the engine
+## was moved to WeatherGenerator), with no residuals (varianceInflation 0) and a fixed wet day threshold
+## The autoregression model has the same value in its SE and autoregression columns, which the old loop
+## read the other way round (see ParModel)
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test_data", "weather_generator")
+FIXTURE_MODELS = ["monthly", "seasonal", "autoregression", "detrend_linear", "detrend_power"]
+
+
+def sampleModel(autoRegression=False):
+    """
+    Monthly conditional model with two predictors (optionally autoregressive) and data to go with it
+    Returns (model, predictorData)
+    """
+    rng = np.random.default_rng(11)
+    nPredictors = 2
+    uncon = np.column_stack([rng.uniform(0.3, 0.6, 12), rng.normal(0, 0.1, (12, nPredictors)),
+                             np.full(12, 0.3)] + ([np.full(12, 0.4)] if autoRegression else []) + [np.full(12, 0.5)])
+    con = np.column_stack([rng.uniform(1, 2, 12), np.ones(12), rng.normal(0, 0.2, (12, nPredictors)),
+                           np.full(12, 0.6), np.full(12, 0.5)])
+    model = ParModel({
+        "nPredictors": nPredictors, "seasonCode": 12, "yearLength": 366, "startDate": START,
+        "recordLength": N_DAYS, "calStartDate": START, "calLength": N_DAYS, "rainYes": True,
+        "modelTrans": 1, "ensembleSize": 1, "autoRegression": autoRegression, "ptandFilename": "prec.dat",
+        "predictorFilenames": ["prec.dat", "a.dat", "b.dat"], "unconParms": uncon, "conParms": con,
+        "lamdaArray": None, "ptandFileRoot": "prec.dat", "deTrend": False, "deTrendType": 0, "betaTrend": None,
+    })
+    predictorData = [rng.gamma(1, 2, N_DAYS)] + [rng.normal(size=N_DAYS) for _ in range(nPredictors)]
+    return model, predictorData
+
+def normalPdf(x):
+    return math.exp(-0.5 * x * x) / math.sqrt(2.0 * math.pi)
+
+def stepLimit(nSplit):
+    """Lower limit z score as the widget searched for it, stepping left from 0 in steps of 0.0001"""
+    zStart = 1.0 / (nSplit + 1.0)
+    delta = 0.0001
+    area = 0.5
+    fx = 0.0
+    oldPdf = normalPdf(fx)
+    for _ in range(50000):
+        fx -= delta
+        newPdf = normalPdf(fx)
+        area -= delta * 0.5 * (oldPdf + newPdf)
+        if area <= zStart:
+            break
+        oldPdf = newPdf
+    return fx
+
+def trapezoidTranslate(value, rankData, firstValueIdx, nSplit, limit, totalArea):
+    """Inverse Normal lookup as the widget did it, integrating the normal curve in 100 trapezoids"""
+    if value <= limit:
+        return rankData[firstValueIdx]
+    interval = (value - limit) / 100.0
+    area = 0.0
+    fx = limit
+    oldPdf = normalPdf(fx)
+    for _ in range(100):
+        fx += interval
+        newPdf = normalPdf(fx)
+        area += interval * 0.5 * (oldPdf + newPdf)
+        oldPdf = newPdf
+    area = max(0.0, min(area, totalArea))
+    index = firstValueIdx + math.floor(area / totalArea * nSplit)
+    index = min(index, firstValueIdx + nSplit - 1, len(rankData) - 1)
+    return rankData[max(index, firstValueIdx)]
+
+
+class GeneratorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tempDir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempDir, ignore_errors=True)
+
+    def generate(self, name, model, predictorData, ensembleSize=5, **kwargs):
+        outFilePath = os.path.join(self.tempDir, name + ".OUT")
+        result = generateWeather(model, None, outFilePath, START, N_DAYS, ensembleSize, OPTIONS,
+                                 predictorData=predictorData, **kwargs)
+        return result, outFilePath
+
+    def read(self, filePath):
+        with open(filePath) as f:
+            return f.read()
+
+    def assertResultsEqual(self, first, second):
+        for key in ("members", "mean", "sd"):
+            np.testing.assert_array_equal(first[key], second[key], err_msg=key)
+
+
+class TestOldWidgetOutput(GeneratorTestCase):
+    def test_matches_old_widget(self):
+        """
+        Without residuals the engine writes the old widget's output byte for byte: monthly and seasonal,
+        conditional and unconditional, autoregressive and detrended (linear and power) models.
+        """
+        options = dict(OPTIONS, varianceInflation=0, conditionalSelection=2)
+        for name in FIXTURE_MODELS:
+            with self.subTest(model=name):
+                parFilePath = os.path.join(FIXTURE_DIR, name + ".PAR")
+                outFilePath = os.path.join(self.tempDir, name + ".OUT")
+                result = generateWeather(ParModel.read(parFilePath), FIXTURE_DIR, outFilePath, datetime.date(1963, 6, 1),
+                                         400, 2, options, parFilePath=parFilePath, yearIndicator=366)
+                self.assertEqual(result["warnings"], [])
+                self.assertEqual(self.read(outFilePath), self.read(os.path.join(FIXTURE_DIR, name + ".OUT")))
+
+    def test_non_numeric_predictor_is_a_warning(self):
+        """
+        A predictor line that is not a number makes that day missing and is reported in the warnings.
+        """
+        predictorDir = os.path.join(self.tempDir, "predictors")
+        shutil.copytree(FIXTURE_DIR, predictorDir)
+        with open(os.path.join(predictorDir, "a.dat")) as f:
+            lines = f.readlines()
+        skip = (datetime.date(1963, 6, 1) - datetime.date(1961, 1, 1)).days
+        lines[skip + 10] = "n/a\n"
+        with open(os.path.join(predictorDir, "a.dat"), "w") as f:
+            f.writelines(lines)
+
+        parFilePath = os.path.join(predictorDir, "seasonal.PAR")
+        outFilePath = os.path.join(self.tempDir, "seasonal.OUT")
+        result = generateWeather(ParModel.read(parFilePath), predictorDir, outFilePath, datetime.date(1963, 6, 1), 400, 1,
+                                 dict(OPTIONS, varianceInflation=0), parFilePath=parFilePath, yearIndicator=366)
+        self.assertEqual(len(result["warnings"]), 1)
+        self.assertIn("a.dat", result["warnings"][0])
+        self.assertEqual(self.read(outFilePath).splitlines()[10], "-999")
+
+
+class TestInverseNormal(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(3)
+        data = np.round(rng.gamma(0.7, 4, 60), 1)
+        data[rng.random(60) < 0.4] = 0
+        data[7] = -999
+        model = {"ptandFileRoot": "prec.dat", "ptandFilename": "prec.dat", "startDate": START,
+                 "calStartDate": START, "calLength": 60}
+        self.invNorm = prepareInverseNormal(model, None, None, -999, 0.0, ptandData=data)
+
+    def test_matches_trapezoid_lookup(self):
+        """
+        The exact area lookup picks the value the 100 step trapezoid integration picked, except for
+        z scores within the integration's error of a break between two values.
+        """
+        invNorm = self.invNorm
+        limit = stepLimit(invNorm["nSplit"])
+        self.assertAlmostEqual(invNorm["limit"], limit, places=3)
+        values = np.linspace(-3.5, 3.5, 8001)
+        expected = np.array([trapezoidTranslate(value, invNorm["rankData"], invNorm["firstValueIdx"],
+                                                invNorm["nSplit"], limit, invNorm["totalArea"]) for value in values])
+        differ = translateInverseNormal(values, invNorm) != expected
+        self.assertLess(np.count_nonzero(differ), 10)
+        for value in values[differ]:
+            self.assertLess(np.min(np.abs(invNorm["zBreaks"] - value)), 5e-4)
+
+    def test_rounding_at_breaks(self):
+        """
+        A z score on a break takes the next value up, one just below it the value before, and anything
+        at or below the limit (or NaN) the first value over the threshold.
+        """
+        invNorm = self.invNorm
+        rankData = invNorm["rankData"]
+        first = invNorm["firstValueIdx"]
+        zBreaks = invNorm["zBreaks"]
+        self.assertEqual(len(zBreaks), invNorm["nSplit"] - 1)
+        offsets = np.arange(len(zBreaks))
+        np.testing.assert_array_equal(translateInverseNormal(zBreaks, invNorm), rankData[first + offsets + 1])
+        np.testing.assert_array_equal(translateInverseNormal(np.nextafter(zBreaks, -np.inf), invNorm), rankData[first + offsets])
+        np.testing.assert_array_equal(translateInverseNormal([invNorm["limit"], -10.0, np.nan, 10.0], invNorm),
+                                      [rankData[first]] * 3 + [rankData[-1]])
+
+
+class TestResiduals(GeneratorTestCase):
+    def test_fixed_seed_repeats(self):
+        """
+        With randomSeed off two runs write the same file, with it on each run gets its own seed.
+        """
+        model, predictorData = sampleModel()
+        first = self.read(self.generate("first", model, predictorData)[1])
+        self.assertEqual(self.read(self.generate("second", model, predictorData)[1]), first)
+        self.assertEqual(WeatherGenerator.seedEntropy(OPTIONS), WeatherGenerator.fixedSeed)
+        randomOptions = dict(OPTIONS, randomSeed=True)
+        self.assertNotEqual(WeatherGenerator.seedEntropy(randomOptions), WeatherGenerator.seedEntropy(randomOptions))
+
+    def test_residual_modes(self):
+        """
+        Normal residuals have the Irwin-Hall variance (precN / 12, times the standard error squared);
+        Irwin-Hall residuals never go past precN / 2 standard errors either side.
+        """
+        rngs = WeatherGenerator.memberGenerators(WeatherGenerator.fixedSeed, 0, 4)
+        nDays = 50000
+        standardError = np.where(np.arange(nDays) % 2 == 0, 1.0, 3.0)
+        for precN in (6, 12):
+            with self.subTest(precN=precN):
+                normal = WeatherGenerator.residuals(rngs, nDays, standardError, precN, residualMode="normal")
+                irwinHall = WeatherGenerator.residuals(rngs, nDays, standardError, precN)
+                self.assertEqual(normal.shape, (nDays, 4))
+                for values in (normal, irwinHall):
+                    scaled = values / standardError[:, None]
+                    self.assertAlmostEqual(scaled.mean(), 0, delta=0.02)
+                    self.assertAlmostEqual(scaled.var() / (precN / 12.0), 1, delta=0.02)
+                self.assertTrue(np.all(np.abs(irwinHall) <= precN / 2.0 * standardError[:, None]))
+        np.testing.assert_array_equal(WeatherGenerator.residuals(rngs, 10, np.ones(10), 0), np.zeros((10, 4)))
+
+
+class TestCheckpoint(GeneratorTestCase):
+    def test_resumed_run_matches_uninterrupted_run(self):
+        """
+        A run stopped after a checkpoint and resumed gives the same output and statistics as one that
+        was not stopped, and its checkpoint holds the statistics' totals without the kept values.
+        """
+        model, predictorData = sampleModel(autoRegression=True)
+        def sink():
+            return StatisticsSink(START, 5, OPTIONS["globalMissingCode"], ["Mean", "Median", "Percentile", "Skewness"])
+        reference, referencePath = self.generate("reference", model, predictorData, statistics=sink())
+
+        def stop(done, total):
+            if done >= 2 * WeatherGenerator.defaultBlockDays:
+                raise InterruptedError("Cancelled")
+        with self.assertRaises(InterruptedError):
+            self.generate("resumed", model, predictorData, checkpointDays=1, progress=stop, statistics=sink())
+        outFilePath = os.path.join(self.tempDir, "resumed.OUT")
+        self.assertTrue(hasCheckpoint(outFilePath))
+        with open(outFilePath + WeatherGenerator.checkpointExtension, "rb") as f:
+            checkpoint = pickle.load(f)
+        self.assertNotIn("storedValues", checkpoint["statistics"])
+        self.assertGreater(checkpoint["valuesSize"], 0)
+
+        resumed, _ = self.generate("resumed", model, predictorData, checkpointDays=1, resume=True, statistics=sink())
+        self.assertEqual(self.read(outFilePath), self.read(referencePath))
+        self.assertResultsEqual(resumed["statistics"], reference["statistics"])
+        self.assertFalse(hasCheckpoint(outFilePath))
+        self.assertFalse([name for name in os.listdir(self.tempDir) if WeatherGenerator.checkpointExtension in name])
+
+
+class TestProcesses(GeneratorTestCase):
+    def test_output_independent_of_processes(self):
+        """
+        Splitting the members over worker processes gives the same output file as one process.
+        """
+        for autoRegression in (False, True):
+            model, predictorData = sampleModel(autoRegression)
+            single = self.read(self.generate("single", model, predictorData, processes=1)[1])
+            parallel = self.read(self.generate("parallel", model, predictorData, processes=3)[1])
+            self.assertEqual(single, parallel)
+            self.assertEqual(len(single.splitlines()), N_DAYS)
+
+    def test_statistics_independent_of_processes(self):
+        """
+        Every statistic the sink works out is the same whichever worker process had the member.
+        """
+        model, predictorData = sampleModel(autoRegression=True)
+        single, _ = self.generate("single", model, predictorData, processes=1,
+                                  statistics=StatisticsSink(START, 5, OPTIONS["globalMissingCode"], statNames))
+        parallel, _ = self.generate("parallel", model, predictorData, processes=3,
+                                    statistics=StatisticsSink(START, 5, OPTIONS["globalMissingCode"], statNames))
+        self.assertResultsEqual(single["statistics"], parallel["statistics"])
+
+    def test_parallel_progress_and_cancel(self):
+        """
+        Progress is reported while the workers run, and raising from it stops the run.
+        """
+        model, predictorData = sampleModel()
+        reports = []
+        self.generate("progress", model, predictorData, processes=3, progress=lambda done, total: reports.append(done))
+        self.assertEqual(reports[-1], N_DAYS)
+        self.assertEqual(reports, sorted(reports))
+
+        def cancel(done, total):
+            raise InterruptedError("Cancelled")
+        with self.assertRaises(InterruptedError):
+            self.generate("cancelled", model, predictorData, processes=3, progress=cancel)
+        ## The workers' member files are cleaned up
+        self.assertFalse(any(os.path.isdir(os.path.join(self.tempDir, name)) for name in os.listdir(self.tempDir)))
+
+
+if __name__ == "__main__":
+    unittest.main()